@@ -0,0 +1 @@
+"""Benchmarki wydajności klasyfikatora i potoku przetwarzania (działają offline)."""
@@ -0,0 +1,7 @@
+# Uruchomienie benchmarków: python -m benchmarks [--images 64] [--batch-sizes 1,8,16]
+import sys
+
+from benchmarks.bench import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""Benchmark etapów klasyfikacji na syntetycznym korpusie.
+
+Mierzy przepustowość i percentyle opóźnień dekodowania, przygotowania
+obrazów, inferencji i umieszczania plików, a potem przebieg całego potoku
+ImageProcessor dla zadanych rozmiarów partii i liczby wątków/procesów:
+
+    python -m benchmarks --images 64 --batch-sizes 1,8,16 --decode-workers 1,4
+
+Domyślnie używa małego losowego modelu CLIP (bez pobierania), więc działa offline i w CI.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from core.clip_classifier import CLIPClassifier
+from core.file_placement import AVAILABLE_PLACEMENTS, FilePlacer, PLACEMENT_COPY
+from core.image_processor import ImageProcessor
+from core.inference_backends import (AVAILABLE_BACKENDS, AVAILABLE_COMPILE_MODES, AVAILABLE_PRECISIONS,
+                                     BACKEND_PYTORCH, COMPILE_NONE, PRECISION_FP32)
+
+from .corpus import generate_corpus
+from .tiny_clip import TINY_MODEL, build_tiny_clip
+
+# Percentyle raportowane dla opóźnień
+PERCENTILES = (50, 90, 99)
+
+
+def _int_list(text):
+    """Parsuje listę liczb oddzielonych przecinkami"""
+    return [int(value) for value in text.split(",") if value.strip()]
+
+
+def build_parser():
+    """Tworzy parser argumentów benchmarku"""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Benchmark klasyfikacji na syntetycznym korpusie.")
+    parser.add_argument("--images", type=int, default=64, help="liczba obrazów w korpusie (domyślnie 64)")
+    parser.add_argument("--seed", type=int, default=0, help="ziarno korpusu i modelu (domyślnie 0)")
+    parser.add_argument("--batch-sizes", type=_int_list, default=[1, 8, 16],
+                        help="rozmiary partii, np. 1,8,16")
+    parser.add_argument("--decode-workers", type=_int_list, default=[1, 4],
+                        help="liczby wątków dekodujących dla przebiegu potoku, np. 1,4")
+    parser.add_argument("--process-workers", type=_int_list, default=[1],
+                        help="liczby procesów roboczych dla przebiegu potoku, np. 1,2")
+    parser.add_argument("--model", default=TINY_MODEL,
+                        help="model CLIP; 'tiny' = mały losowy model offline (domyślnie)")
+    parser.add_argument("--backend", choices=AVAILABLE_BACKENDS, default=BACKEND_PYTORCH)
+    parser.add_argument("--precision", choices=AVAILABLE_PRECISIONS, default=PRECISION_FP32)
+    parser.add_argument("--compile", choices=AVAILABLE_COMPILE_MODES, default=COMPILE_NONE)
+    parser.add_argument("--placement", choices=AVAILABLE_PLACEMENTS, default=PLACEMENT_COPY)
+    parser.add_argument("--full-decode", action="store_true", help="dekodowanie w pełnej rozdzielczości")
+    parser.add_argument("--work-dir", help="folder roboczy (domyślnie tymczasowy, usuwany po zakończeniu)")
+    parser.add_argument("--json", metavar="PATH", help="zapisz wyniki jako JSON ('-' = stdout)")
+    return parser
+
+
+def summarize(latencies, items):
+    """Zwraca przepustowość i percentyle opóźnień (ms) dla listy czasów w sekundach"""
+    total = float(sum(latencies))
+    summary = {
+        'items': items,
+        'total_seconds': round(total, 4),
+        'throughput': round(items / total, 2) if total > 0 else 0.0
+    }
+    if latencies:
+        values = np.percentile(np.asarray(latencies) * 1000, PERCENTILES)
+        for percentile, value in zip(PERCENTILES, values):
+            summary[f'p{percentile}_ms'] = round(float(value), 3)
+    return summary
+
+
+def bench_stages(classifier, input_folder, filenames, batch_size, placement, output_folder, logger):
+    """Mierzy osobno każdy etap dla jednego rozmiaru partii"""
+    paths = [os.path.join(input_folder, name) for name in filenames]
+
+    # Dekodowanie (per obraz)
+    decode_times = []
+    images = []
+    for path in paths:
+        start = time.perf_counter()
+        images.append(classifier.load_image(path))
+        decode_times.append(time.perf_counter() - start)
+
+    # Przygotowanie: skalowanie i wycinek per obraz, normalizacja per partia
+    preprocess_times = []
+    crops = []
+    for image in images:
+        start = time.perf_counter()
+        crops.append(classifier.preprocessor.resize_and_crop(image))
+        preprocess_times.append(time.perf_counter() - start)
+
+    normalize_times = []
+    classify_times = []
+    for offset in range(0, len(crops), batch_size):
+        batch = crops[offset:offset + batch_size]
+        start = time.perf_counter()
+        classifier.preprocessor.to_pixel_values(batch)
+        normalize_times.append(time.perf_counter() - start)
+
+        # classify_prepared sam normalizuje partię - etap obejmuje normalizację, forward i wynik
+        start = time.perf_counter()
+        classifier.classify_prepared(batch, filenames[offset:offset + batch_size], verbose=False)
+        classify_times.append(time.perf_counter() - start)
+
+    # Umieszczanie plików
+    placer = FilePlacer(placement, logger)
+    os.makedirs(output_folder, exist_ok=True)
+    place_times = []
+    for name, path in zip(filenames, paths):
+        start = time.perf_counter()
+        placer.place(path, os.path.join(output_folder, name))
+        place_times.append(time.perf_counter() - start)
+    if placement == "move":
+        # Przywróć korpus dla kolejnych pomiarów
+        for name, path in zip(filenames, paths):
+            shutil.move(os.path.join(output_folder, name), path)
+    shutil.rmtree(output_folder)
+
+    classify = summarize(classify_times, len(crops))
+    classify['batch_latency'] = True  # percentyle dotyczą całych partii
+    return {
+        'decode': summarize(decode_times, len(paths)),
+        'preprocess': summarize(preprocess_times, len(images)),
+        'normalize': summarize(normalize_times, len(crops)),
+        'classify': classify,
+        'placement': summarize(place_times, len(paths))
+    }
+
+
+def bench_pipeline(classifier, input_folder, work_dir, batch_size, decode_workers, process_workers, placement,
+                   logger):
+    """Mierzy pełny przebieg ImageProcessor.run (bez cache i dziennika)"""
+    output_folder = os.path.join(work_dir, f"out_b{batch_size}_d{decode_workers}_p{process_workers}")
+    copied_input = None
+    if placement == "move":
+        # Przenoszenie opróżnia wejście - każdy pomiar dostaje świeżą kopię korpusu (kopiowanie poza pomiarem)
+        copied_input = os.path.join(work_dir, "corpus_move")
+        shutil.rmtree(copied_input, ignore_errors=True)
+        shutil.copytree(input_folder, copied_input)
+        input_folder = copied_input
+    config = {
+        'input_folder': input_folder,
+        'output_folder': output_folder,
+        'confidence_threshold': 0.6,
+        'verbose_logs': False,
+        'batch_size': batch_size,
+        'decode_workers': decode_workers,
+        'process_workers': process_workers,
+        'placement_mode': placement,
+        'use_cache': False,
+        'resume': False
+    }
+
+    start = time.perf_counter()
+    result = ImageProcessor(logger).run(config, classifier, lambda value, status_text: None)
+    elapsed = time.perf_counter() - start
+    shutil.rmtree(output_folder, ignore_errors=True)
+    if copied_input is not None:
+        shutil.rmtree(copied_input, ignore_errors=True)
+
+    images = result['stats']['total_images'] if result else 0
+    return {
+        'batch_size': batch_size,
+        'decode_workers': decode_workers,
+        'process_workers': process_workers,
+        'images': images,
+        'seconds': round(elapsed, 4),
+        'throughput': round(images / elapsed, 2) if elapsed > 0 else 0.0,
+        'errors': result['stats']['errors'] if result else 0
+    }
+
+
+def print_report(report, stream=None):
+    """Wypisuje wyniki jako czytelne tabele"""
+    stream = stream or sys.stdout
+    stream.write(f"Model: {report['model']}, obrazów: {report['images']}, backend: {report['backend']}\n\n")
+
+    header = f"{'partia':>6} {'etap':<11} {'img/s':>10} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10}\n"
+    stream.write(header)
+    for entry in report['stages']:
+        for stage, values in entry['stages'].items():
+            stream.write(f"{entry['batch_size']:>6} {stage:<11} {values['throughput']:>10.1f} "
+                         f"{values.get('p50_ms', 0):>10.2f} {values.get('p90_ms', 0):>10.2f} "
+                         f"{values.get('p99_ms', 0):>10.2f}\n")
+
+    stream.write(f"\n{'partia':>6} {'dekod.':>7} {'proc.':>6} {'img/s':>10} {'czas s':>10}\n")
+    for entry in report['pipeline']:
+        stream.write(f"{entry['batch_size']:>6} {entry['decode_workers']:>7} {entry['process_workers']:>6} "
+                     f"{entry['throughput']:>10.1f} {entry['seconds']:>10.2f}\n")
+    stream.flush()
+
+
+def run_benchmarks(args, logger):
+    """Generuje korpus, mierzy etapy i potok; zwraca raport jako słownik"""
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="clip_bench_")
+    try:
+        input_folder = os.path.join(work_dir, "corpus")
+        corpus = generate_corpus(input_folder, args.images, seed=args.seed)
+        filenames = [name for name, _ in corpus]
+
+        model_name = args.model
+        if model_name == TINY_MODEL:
+            model_name = build_tiny_clip(os.path.join(work_dir, "tiny_clip"), seed=args.seed)
+
+        classifier = CLIPClassifier(logger, model_name=model_name, backend=args.backend,
+                                    fast_decode=not args.full_decode, precision=args.precision,
+                                    compile_mode=args.compile)
+        classifier.load_model_blocking()
+
+        report = {
+            'model': args.model,
+            'backend': classifier.vision_backend.description if args.backend == BACKEND_PYTORCH else args.backend,
+            'images': len(filenames),
+            'seed': args.seed,
+            'stages': [],
+            'pipeline': []
+        }
+
+        for batch_size in args.batch_sizes:
+            stages = bench_stages(classifier, input_folder, filenames, batch_size, args.placement,
+                                  os.path.join(work_dir, "placed"), logger)
+            report['stages'].append({'batch_size': batch_size, 'stages': stages})
+
+        for batch_size in args.batch_sizes:
+            for decode_workers in args.decode_workers:
+                for process_workers in args.process_workers:
+                    report['pipeline'].append(bench_pipeline(
+                        classifier, input_folder, work_dir, batch_size, decode_workers, process_workers,
+                        args.placement, logger
+                    ))
+
+        return report
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    """Punkt wejścia benchmarku"""
+    args = build_parser().parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    logger = logging.getLogger("benchmarks")
+
+    report = run_benchmarks(args, logger)
+
+    if args.json == "-":
+        sys.stdout.write(json.dumps(report, indent=2) + "\n")
+    else:
+        print_report(report)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+    return 0
@@ -0,0 +1,86 @@
+import os
+import random
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Rozdzielczości typowych screenshotów i zdjęć z telefonu
+DEFAULT_RESOLUTIONS = ((1280, 720), (1920, 1080), (800, 600), (3024, 4032))
+
+# Formaty zapisu: (rozszerzenie, format PIL, parametry zapisu)
+DEFAULT_FORMATS = (("png", "PNG", {}), ("jpg", "JPEG", {'quality': 90}), ("webp", "WEBP", {'quality': 85}))
+
+# Fragmenty "kodu" do renderowania
+_CODE_TOKENS = ["def", "class", "return", "import", "for", "in", "if", "else", "self", "value", "items",
+                "result", "=", "+=", "(", ")", ":", "[", "]", "{", "}", "None", "True", "0", "1", "42",
+                "print", "logger.info", "np.array", "os.path.join", "# TODO", "\"text\"", "lambda", "yield"]
+
+# Motywy edytora: (tło, kolory tokenów)
+_THEMES = [
+    ((30, 30, 30), [(212, 212, 212), (86, 156, 214), (206, 145, 120), (181, 206, 168), (106, 153, 85)]),
+    ((255, 255, 255), [(0, 0, 0), (0, 0, 255), (163, 21, 21), (9, 134, 88), (0, 128, 0)]),
+    ((40, 44, 52), [(171, 178, 191), (198, 120, 221), (152, 195, 121), (229, 192, 123), (97, 175, 239)]),
+    ((0, 0, 0), [(200, 200, 200), (0, 255, 0), (255, 255, 0)])  # terminal
+]
+
+
+def render_code_image(width, height, rng):
+    """Renderuje obraz przypominający screenshot edytora kodu"""
+    background, colors = rng.choice(_THEMES)
+    image = Image.new('RGB', (width, height), background)
+    draw = ImageDraw.Draw(image)
+
+    # Pasek boczny i pasek kart jak w IDE
+    sidebar = rng.randint(0, width // 6)
+    if sidebar:
+        draw.rectangle([0, 0, sidebar, height], fill=tuple(min(255, c + 20) for c in background))
+    draw.rectangle([0, 0, width, 24], fill=tuple(max(0, c - 10) for c in background))
+
+    line_height = rng.choice([14, 16, 18])
+    for y in range(32, height - line_height, line_height):
+        x = sidebar + 8 + 16 * rng.randint(0, 4)  # wcięcie
+        for _ in range(rng.randint(0, 10)):
+            token = rng.choice(_CODE_TOKENS)
+            draw.text((x, y), token, fill=rng.choice(colors))
+            x += 7 * len(token) + 7
+            if x > width - 40:
+                break
+    return image
+
+
+def render_photo_image(width, height, rng):
+    """Renderuje obraz przypominający zdjęcie: gładkie plamy kolorów z szumem"""
+    np_rng = np.random.default_rng(rng.randrange(2 ** 32))
+
+    # Niska rozdzielczość przeskalowana bicubic daje gładkie przejścia
+    coarse = np_rng.integers(0, 256, (rng.randint(3, 8), rng.randint(3, 8), 3), dtype=np.uint8)
+    base = np.asarray(Image.fromarray(coarse).resize((width, height), Image.BICUBIC), dtype=np.float32)
+    noise = np_rng.normal(0, rng.uniform(4, 20), base.shape).astype(np.float32)
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8))
+
+
+def generate_corpus(folder, count, seed=0, resolutions=DEFAULT_RESOLUTIONS, formats=DEFAULT_FORMATS,
+                    code_fraction=0.5):
+    """Tworzy powtarzalny korpus obrazów w folderze i zwraca listę (nazwa_pliku, rodzaj).
+
+    Ten sam seed daje te same pliki; istniejące pliki o tych nazwach są nadpisywane.
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+
+    corpus = []
+    for index in range(count):
+        kind = "code" if rng.random() < code_fraction else "photo"
+        width, height = rng.choice(resolutions)
+        extension, image_format, params = rng.choice(formats)
+
+        if kind == "code":
+            image = render_code_image(width, height, rng)
+        else:
+            image = render_photo_image(width, height, rng)
+
+        filename = f"{index:05d}_{kind}_{width}x{height}.{extension}"
+        image.save(os.path.join(folder, filename), image_format, **params)
+        corpus.append((filename, kind))
+
+    return corpus
@@ -0,0 +1,71 @@
+import json
+import os
+
+# Nazwa podana zamiast modelu z HF Hub, aby użyć małego losowego modelu
+TINY_MODEL = "tiny"
+
+
+def _bytes_to_unicode():
+    """Mapowanie bajtów na znaki Unicode używane przez tokenizer BPE CLIP"""
+    codes = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) \
+        + list(range(ord("®"), ord("ÿ") + 1))
+    chars = list(codes)
+    extra = 0
+    for byte in range(256):
+        if byte not in codes:
+            codes.append(byte)
+            chars.append(256 + extra)
+            extra += 1
+    return [chr(char) for char in chars]
+
+
+def build_tiny_clip(folder, seed=0, image_size=224):
+    """Zapisuje w folderze mały, losowo zainicjalizowany model CLIP z procesorem.
+
+    Folder można podać jako model_name w CLIPClassifier (from_pretrained
+    wczytuje go lokalnie), więc benchmark działa bez pobierania modelu.
+    Architektura zachowuje wejście 224x224 i patch 32 jak ViT-B/32, ale ma
+    tylko 2 małe warstwy - wyniki klasyfikacji są losowe, liczy się czas.
+    """
+    import torch
+    from transformers import CLIPConfig, CLIPModel, CLIPImageProcessor, CLIPProcessor, CLIPTokenizer
+
+    config_path = os.path.join(folder, "config.json")
+    if os.path.exists(config_path):
+        return folder
+
+    os.makedirs(folder, exist_ok=True)
+
+    # Słownik: pojedyncze znaki bajtowe (także z końcówką słowa) i tokeny specjalne, bez scaleń
+    vocab = {}
+    for char in _bytes_to_unicode():
+        vocab[char] = len(vocab)
+    for char in _bytes_to_unicode():
+        vocab[char + "</w>"] = len(vocab)
+    vocab["<|startoftext|>"] = len(vocab)
+    vocab["<|endoftext|>"] = len(vocab)
+
+    vocab_path = os.path.join(folder, "vocab.json")
+    merges_path = os.path.join(folder, "merges.txt")
+    with open(vocab_path, 'w', encoding='utf-8') as f:
+        json.dump(vocab, f)
+    with open(merges_path, 'w', encoding='utf-8') as f:
+        f.write("#version: 0.2\n")
+
+    tokenizer = CLIPTokenizer(vocab_path, merges_path)
+
+    torch.manual_seed(seed)
+    config = CLIPConfig(
+        text_config=dict(vocab_size=len(vocab), hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                         num_attention_heads=2, max_position_embeddings=77,
+                         bos_token_id=vocab["<|startoftext|>"], eos_token_id=vocab["<|endoftext|>"]),
+        vision_config=dict(hidden_size=32, intermediate_size=64, num_hidden_layers=2, num_attention_heads=2,
+                           image_size=image_size, patch_size=32),
+        projection_dim=16
+    )
+    model = CLIPModel(config).eval()
+    processor = CLIPProcessor(image_processor=CLIPImageProcessor(), tokenizer=tokenizer)
+
+    model.save_pretrained(folder)
+    processor.save_pretrained(folder)
+    return folder
@@ -0,0 +1,8 @@
+# Uruchomienie bez GUI: python -m core INPUT OUTPUT
+# (serwer: python -m core serve, przesortowanie: python -m core resort, wykonanie planu: python -m core apply)
+import sys
+
+from core.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import json
+import os
+
+import numpy as np
+
+# Wbudowane kategorie (filtr wstępny rozstrzyga tylko między nimi)
+CATEGORY_CODE = "code"
+CATEGORY_CLEAN = "clean"
+
+# Obrazy poniżej progu pewności trafiają tu niezależnie od kategorii
+UNCERTAIN_KEY = "uncertain_images"
+UNCERTAIN_FOLDER = "uncertain_images"
+UNCERTAIN_LABEL = "NIEPEWNE"
+
+# Opisy klas kodu (IDE, kod, terminal)
+DEFAULT_CODE_PROMPTS = [
+    "a screenshot of code in an IDE or text editor",
+    "a screenshot of programming code",
+    "a terminal or command line interface"
+]
+
+# Opisy klas normalnych obrazów
+DEFAULT_NORMAL_PROMPTS = [
+    "a normal photo or colorful image",
+    "a regular picture or photograph",
+    "a meme or colorful graphic"
+]
+
+DEFAULT_CATEGORIES = (
+    {'name': CATEGORY_CODE, 'prompts': DEFAULT_CODE_PROMPTS},
+    {'name': CATEGORY_CLEAN, 'prompts': DEFAULT_NORMAL_PROMPTS}
+)
+
+# Klucz statystyk, folder i etykieta wbudowanych kategorii (zgodne z wcześniejszymi wersjami)
+_BUILTIN = {
+    CATEGORY_CODE: ('code_images', "code_screenshots", "KOD"),
+    CATEGORY_CLEAN: ('clean_images', "clean_images", "CZYSTE")
+}
+
+# Klucze statystyk, których kategorie nie mogą nadpisać
+_RESERVED_KEYS = {UNCERTAIN_KEY, 'total_images', 'duplicate_images'}
+
+
+class Category:
+    """Kategoria wyniku: nazwa, prompty CLIP i folder wyjściowy (względem folderu wyjściowego)"""
+
+    def __init__(self, name, prompts, folder=None, label=None):
+        if not name or not isinstance(name, str):
+            raise ValueError("Kategoria musi mieć nazwę")
+        if (not isinstance(prompts, (list, tuple)) or not prompts
+                or any(not isinstance(prompt, str) or not prompt for prompt in prompts)):
+            raise ValueError(f"Kategoria {name} musi mieć niepustą listę promptów")
+
+        builtin = _BUILTIN.get(name)
+        self.name = name
+        self.prompts = list(prompts)
+        self.folder = folder or (builtin[1] if builtin else name)
+        self.stat_key = builtin[0] if builtin else f"{name}_images"
+        self.label = label or (builtin[2] if builtin else name.upper())
+
+        if os.path.isabs(self.folder) or ".." in self.folder.replace("\\", "/").split("/"):
+            raise ValueError(f"Folder kategorii {name} musi być ścieżką względną w folderze wyjściowym")
+
+    def to_dict(self):
+        """Ustawienia kategorii jako słownik (do JSON i procesów roboczych)"""
+        return {'name': self.name, 'prompts': list(self.prompts), 'folder': self.folder, 'label': self.label}
+
+
+def build_categories(spec=None):
+    """Tworzy listę kategorii z listy słowników {name, prompts, folder?, label?} (None = domyślne)"""
+    categories = [_to_category(item) for item in (DEFAULT_CATEGORIES if spec is None else spec)]
+    if len(categories) < 2:
+        raise ValueError("Potrzebne są co najmniej dwie kategorie")
+
+    for attribute in ('name', 'folder', 'stat_key'):
+        values = [getattr(category, attribute) for category in categories]
+        duplicates = sorted({value for value in values if values.count(value) > 1})
+        if duplicates:
+            raise ValueError(f"Powtórzone wartości pola {attribute} kategorii: {', '.join(duplicates)}")
+
+    for category in categories:
+        if category.folder == UNCERTAIN_FOLDER or category.stat_key in _RESERVED_KEYS:
+            raise ValueError(f"Nazwa lub folder kategorii {category.name} są zarezerwowane")
+    return categories
+
+
+def _to_category(item):
+    """Kategoria z obiektu Category albo słownika ustawień"""
+    if isinstance(item, Category):
+        return item
+    if not isinstance(item, dict):
+        raise ValueError(f"Kategoria musi być słownikiem, a nie {type(item).__name__}")
+    unknown = set(item) - {'name', 'prompts', 'folder', 'label'}
+    if unknown:
+        raise ValueError(f"Nieznane pola kategorii: {', '.join(sorted(unknown))}")
+    return Category(item.get('name'), item.get('prompts'), item.get('folder'), item.get('label'))
+
+
+def load_categories(value):
+    """Wczytuje definicje kategorii z pliku JSON albo tekstu JSON (None = domyślne)"""
+    if not value:
+        return None
+    if os.path.isfile(value):
+        with open(value, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+class CategoryIndex:
+    """Prompty wszystkich kategorii w jednej macierzy, pogrupowane kolejno według kategorii.
+
+    Prawdopodobieństwo kategorii to maksimum po jej promptach; dzięki ciągłym
+    grupom jest to jedno np.maximum.reduceat dla całej partii, a embeddingi
+    promptów liczone są raz - koszt obrazu nie zależy od liczby kategorii.
+    """
+
+    def __init__(self, categories):
+        self.categories = list(categories)
+        self.names = [category.name for category in self.categories]
+        self.prompts = [prompt for category in self.categories for prompt in category.prompts]
+        sizes = [len(category.prompts) for category in self.categories]
+        self.starts = np.cumsum([0] + sizes[:-1])
+
+    def reduce(self, prompt_probs):
+        """Prawdopodobieństwa promptów (..., P) -> prawdopodobieństwa kategorii (..., C)"""
+        return np.maximum.reduceat(np.asarray(prompt_probs, dtype=np.float32), self.starts, axis=-1)
+
+    def decide(self, category_probs):
+        """Zwraca (indeksy zwycięskich kategorii, ich pewność) dla (..., C)"""
+        winners = np.argmax(category_probs, axis=-1)
+        return winners, np.take_along_axis(category_probs, np.expand_dims(winners, -1), axis=-1)[..., 0]
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# Domyślny limit liczby wpisów w cache
+DEFAULT_MAX_ENTRIES = 500000
+
+# Nazwa pliku bazy tworzonego w folderze wyjściowym
+CACHE_FILENAME = ".classification_cache.sqlite"
+
+
+class ClassificationCache:
+    """Trwały cache wyników klasyfikacji w SQLite.
+
+    Wpisy są kluczowane ścieżką, rozmiarem i czasem modyfikacji pliku
+    (opcjonalnie także skrótem zawartości) i przechowują prawdopodobieństwa
+    promptów oraz embedding obrazu. Zmiana modelu lub promptów (sygnatury)
+    czyści cache, a po przekroczeniu limitu usuwane są najdawniej używane wpisy.
+    """
+
+    # Co ile zapisów zatwierdzać transakcję i sprawdzać limit rozmiaru
+    COMMIT_INTERVAL = 200
+
+    def __init__(self, db_path, signature, logger, max_entries=DEFAULT_MAX_ENTRIES, use_content_hash=False):
+        self.db_path = db_path
+        self.signature = signature
+        self.logger = logger
+        self.max_entries = max(1, int(max_entries))
+        self.use_content_hash = use_content_hash
+
+        self._lock = threading.Lock()
+        self._pending_writes = 0
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, content_hash TEXT, "
+            "probs BLOB, embedding BLOB, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON entries(last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+        self._check_signature()
+
+    def _check_signature(self):
+        """Czyści cache, jeśli został zbudowany innym modelem lub zestawem promptów"""
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+        if row is not None and row[0] == self.signature:
+            return
+
+        if row is not None:
+            self.logger.info("Zmienił się model lub prompty - czyszczenie cache klasyfikacji")
+        self.invalidate()
+
+    def invalidate(self):
+        """Usuwa wszystkie wpisy i zapisuje bieżącą sygnaturę"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('signature', ?)",
+                               (self.signature,))
+            self._conn.commit()
+            self._pending_writes = 0
+
+    def _file_hash(self, file_path):
+        """Liczy skrót zawartości pliku"""
+        digest = hashlib.blake2b(digest_size=16)
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def lookup(self, file_path):
+        """Zwraca zapisany wynik (prompt_probs, embedding) lub None, jeśli plik jest nowy lub zmieniony"""
+        key = os.path.abspath(file_path)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, content_hash, probs, embedding FROM entries WHERE path = ?",
+                (key,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        size, mtime_ns, content_hash, probs, embedding = row
+        if size != stat.st_size:
+            return None
+
+        if mtime_ns != stat.st_mtime_ns:
+            # Plik "dotknięty" bez zmiany treści - porównaj skrót zawartości
+            if not (self.use_content_hash and content_hash and self._file_hash(file_path) == content_hash):
+                return None
+
+        with self._lock:
+            self._conn.execute("UPDATE entries SET mtime_ns = ?, last_used = ? WHERE path = ?",
+                               (stat.st_mtime_ns, time.time(), key))
+            self._after_write()
+
+        return (np.frombuffer(probs, dtype=np.float32).tolist(),
+                np.frombuffer(embedding, dtype=np.float32) if embedding else None)
+
+    def store(self, file_path, prompt_probs, embedding=None):
+        """Zapisuje wynik klasyfikacji pliku"""
+        key = os.path.abspath(file_path)
+        try:
+            stat = os.stat(file_path)
+            content_hash = self._file_hash(file_path) if self.use_content_hash else None
+        except OSError:
+            return
+
+        probs_blob = np.asarray(prompt_probs, dtype=np.float32).tobytes()
+        embedding_blob = np.asarray(embedding, dtype=np.float32).tobytes() if embedding is not None else None
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(path, size, mtime_ns, content_hash, probs, embedding, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, stat.st_size, stat.st_mtime_ns, content_hash, probs_blob, embedding_blob, time.time())
+            )
+            self._after_write()
+
+    def _after_write(self):
+        """Okresowo zatwierdza zmiany i egzekwuje limit rozmiaru (wywoływane pod blokadą)"""
+        self._pending_writes += 1
+        if self._pending_writes >= self.COMMIT_INTERVAL:
+            self._evict()
+            self._conn.commit()
+            self._pending_writes = 0
+
+    def _evict(self):
+        """Usuwa najdawniej używane wpisy ponad limit (wywoływane pod blokadą)"""
+        count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM entries WHERE path IN "
+                "(SELECT path FROM entries ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            self.logger.info(f"Cache klasyfikacji: usunięto {excess} najstarszych wpisów")
+
+    def close(self):
+        """Zatwierdza zaległe zmiany i zamyka bazę"""
+        with self._lock:
+            self._evict()
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,532 @@
+import base64
+import binascii
+import http.client
+import io
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from PIL import Image
+
+from .image_loader import guard_image_size
+from .process_pool import PREFILTER_RESULT
+from .run_profile import measure
+
+# Domyślny adres serwera: "host:port" (tylko lokalnie) albo "unix:/ścieżka/gniazda"
+DEFAULT_SERVER_ADDRESS = "127.0.0.1:8765"
+SERVER_ADDRESS_ENV = "CLIP_FILTER_SERVER"
+_UNIX_PREFIX = "unix:"
+
+# Ograniczenia serwera
+DEFAULT_MAX_CONCURRENCY = 4  # jednocześnie obsługiwane żądania
+DEFAULT_COALESCE_WINDOW = 0.01  # ile sekund czekać na obrazy z innych żądań do wspólnej partii
+DEFAULT_QUEUE_TIMEOUT = 30.0  # ile sekund żądanie czeka na wolne miejsce, zanim dostanie 503
+DEFAULT_BUSY_RETRIES = 5  # ile razy klient ponawia żądanie po 503, zanim zgłosi błąd
+MAX_REQUEST_BYTES = 256 * 1024 * 1024
+
+# Limit czasu sprawdzania, czy serwer działa (brak serwera nie może spowalniać CLI)
+PROBE_TIMEOUT = 0.5
+
+
+def parse_address(address):
+    """Zwraca ('unix', ścieżka) albo ('tcp', (host, port)) dla adresu serwera"""
+    if address.startswith(_UNIX_PREFIX):
+        return 'unix', address[len(_UNIX_PREFIX):]
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Błędny adres serwera: {address} (oczekiwano host:port lub unix:/ścieżka)")
+    return 'tcp', (host, int(port))
+
+
+def default_server_address():
+    """Adres serwera z SERVER_ADDRESS_ENV albo domyślny"""
+    return os.environ.get(SERVER_ADDRESS_ENV) or DEFAULT_SERVER_ADDRESS
+
+
+def server_matches(info, classifier, use_prefilter):
+    """Zwraca None, gdy serwer daje te same wyniki co lokalny klasyfikator, inaczej powód różnicy"""
+    if info.get('signature') != classifier.cache_signature():
+        return "inny model, backend lub prompty"
+    if info.get('fast_decode') != classifier.fast_decode:
+        return "inny tryb dekodowania"
+    if use_prefilter:
+        local = dict(classifier.prefilter.thresholds) if classifier.prefilter else None
+        if info.get('prefilter') != local:
+            return "inne ustawienia filtra wstępnego"
+    return None
+
+
+def _encode_result(result):
+    """Wynik klasyfikacji -> obiekt JSON odpowiedzi"""
+    if result is None:
+        return None
+    is_code, confidence, details = result
+    if details.get('prefilter'):
+        return {'prefilter': [is_code, confidence, details]}
+    if details.get('prompt_probs') is None:
+        return None
+    encoded = {'prompt_probs': list(details['prompt_probs'])}
+    embedding = details.get('embedding')
+    if embedding is not None:
+        encoded['embedding'] = base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode('ascii')
+    return encoded
+
+
+def _decode_result(encoded):
+    """Obiekt JSON odpowiedzi -> wpis w formacie wyników procesów roboczych"""
+    if encoded is None:
+        return None
+    if 'prefilter' in encoded:
+        return PREFILTER_RESULT, tuple(encoded['prefilter'])
+    embedding = None
+    if encoded.get('embedding'):
+        embedding = np.frombuffer(base64.b64decode(encoded['embedding']), dtype=np.float32)
+    return encoded['prompt_probs'], embedding
+
+
+class _BatchCoalescer:
+    """Łączy przygotowane obrazy z wielu żądań w partie o rozmiarze modelu.
+
+    Żądania przekazują obrazy grupami (submit_group). Wątek inferencji
+    zbiera grupy do batch_size obrazów, czekając najwyżej `window` sekund
+    na kolejne, więc małe żądania równoległych klientów dzielą jeden
+    przebieg modelu, a duże dają pełne partie.
+    """
+
+    def __init__(self, classifier, batch_size, window, logger):
+        self.classifier = classifier
+        self.batch_size = max(1, int(batch_size))
+        self.window = window
+        self.logger = logger
+        self.batches = 0
+        self.images = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit_group(self, prepared_list):
+        """Dodaje obrazy jednego żądania razem; zwraca listę Future z wynikami"""
+        group = [(prepared, Future()) for prepared in prepared_list]
+        if group:
+            self._queue.put(group)
+        return [future for _, future in group]
+
+    def close(self):
+        """Kończy wątek inferencji po bieżącej partii"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        """Pętla wątku inferencji"""
+        pending = []
+        stopping = False
+        while pending or not stopping:
+            if not pending:
+                group = self._queue.get()
+                if group is None:
+                    break
+                pending.extend(group)
+
+            # Partia jest domykana po osiągnięciu batch_size albo gdy w oknie nic nie doszło
+            deadline = time.monotonic() + self.window
+            while len(pending) < self.batch_size and not stopping:
+                remaining = deadline - time.monotonic()
+                try:
+                    group = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if group is None:
+                    stopping = True
+                    break
+                pending.extend(group)
+
+            batch, pending = pending[:self.batch_size], pending[self.batch_size:]
+            self._classify(batch)
+
+    def _classify(self, batch):
+        """Jeden przebieg modelu dla partii; wyniki trafiają do Future"""
+        try:
+            results = self.classifier.classify_prepared([prepared for prepared, _ in batch],
+                                                        ["<żądanie>"] * len(batch), verbose=False)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+
+        self.batches += 1
+        self.images += len(batch)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """Obsługa HTTP: GET /info i POST /classify"""
+
+    protocol_version = "HTTP/1.1"  # połączenia keep-alive dla klientów wysyłających wiele partii
+
+    def do_GET(self):
+        if self.path == "/info":
+            self._send_json(200, self.server.app.info())
+        else:
+            self._send_json(404, {'error': "nieznana ścieżka"})
+
+    def do_POST(self):
+        if self.path != "/classify":
+            self._send_json(404, {'error': "nieznana ścieżka"})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_BYTES:
+            self.close_connection = True
+            self._send_json(413, {'error': "żądanie jest za duże"})
+            return
+
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._send_json(400, {'error': f"błędny JSON: {e}"})
+            return
+
+        status, payload = self.server.app.handle_classify(request)
+        self._send_json(status, payload)
+
+    def _send_json(self, status, payload):
+        """Wysyła odpowiedź JSON"""
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.app.logger.debug("serwer: " + format % args)
+
+
+class _TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ClassificationServer:
+    """Lokalny serwer klasyfikacji z modelem załadowanym raz na cały czas działania.
+
+    Żądania (ścieżki plików albo zakodowane obrazy) są dekodowane w puli
+    wątków, a przygotowane obrazy z równoległych żądań łączone w partie
+    modelu. Najwyżej max_concurrency żądań jest obsługiwanych jednocześnie;
+    kolejne czekają do queue_timeout sekund, potem dostają 503.
+    """
+
+    def __init__(self, classifier, logger, address=DEFAULT_SERVER_ADDRESS, batch_size=16,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, coalesce_window=DEFAULT_COALESCE_WINDOW,
+                 decode_workers=None, queue_timeout=DEFAULT_QUEUE_TIMEOUT):
+        self.classifier = classifier
+        self.logger = logger
+        self.address = address
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.queue_timeout = queue_timeout
+        self.requests = 0
+        self.rejected = 0
+        self._stats_lock = threading.Lock()  # liczniki zmieniają wątki obsługi żądań
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._decode_pool = ThreadPoolExecutor(max_workers=decode_workers or min(8, os.cpu_count() or 1))
+        self._coalescer = _BatchCoalescer(classifier, batch_size, coalesce_window, logger)
+        self._unix_path = None
+
+        kind, target = parse_address(address)
+        if kind == 'unix':
+            if os.path.exists(target):
+                os.unlink(target)  # gniazdo po poprzednim, nieczysto zakończonym serwerze
+            self._server = _UnixServer(target, _RequestHandler)
+            os.chmod(target, 0o600)
+            self._unix_path = target
+        else:
+            if target[0] not in ("127.0.0.1", "localhost", "::1"):
+                self.logger.warning(f"Serwer nasłuchuje na {target[0]} - klienci sieciowi mogą czytać "
+                                    f"dowolne pliki dostępne dla tego procesu")
+            self._server = _TCPServer(target, _RequestHandler)
+        self._server.app = self
+
+    def serve_forever(self):
+        """Obsługuje żądania do wywołania shutdown()"""
+        self.logger.info(f"Serwer klasyfikacji nasłuchuje: {self.address}")
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """Zatrzymuje pętlę serve_forever (z innego wątku)"""
+        self._server.shutdown()
+
+    def close(self):
+        """Zwalnia gniazdo, pulę dekodowania i wątek inferencji"""
+        self._server.server_close()
+        self._decode_pool.shutdown(wait=False)
+        self._coalescer.close()
+        if self._unix_path and os.path.exists(self._unix_path):
+            os.unlink(self._unix_path)
+
+    def info(self):
+        """Opis serwera: sygnatura modelu (zgodność z klientem) i liczniki"""
+        options = self.classifier.get_options()
+        return {
+            'signature': self.classifier.cache_signature(),
+            'model': options['model_name'],
+            'backend': options['backend'],
+            'fast_decode': options['fast_decode'],
+            'prefilter': options['prefilter'],
+            'pid': os.getpid(),
+            'max_concurrency': self.max_concurrency,
+            'batch_size': self._coalescer.batch_size,
+            'requests': self.requests,
+            'rejected': self.rejected,
+            'batches': self._coalescer.batches,
+            'images': self._coalescer.images
+        }
+
+    def handle_classify(self, request):
+        """Klasyfikuje obrazy z żądania; zwraca (kod HTTP, odpowiedź)"""
+        if not isinstance(request, dict):
+            return 400, {'error': "treść żądania musi być obiektem JSON"}
+        paths = request.get('paths')
+        images = request.get('images')
+        if (paths is None) == (images is None):
+            return 400, {'error': "podaj dokładnie jedno z pól 'paths' lub 'images'"}
+        field, values = ('paths', paths) if paths is not None else ('images', images)
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            return 400, {'error': f"pole '{field}' musi być listą napisów"}
+
+        if paths is not None:
+            items = paths
+        else:
+            try:
+                items = [base64.b64decode(data, validate=True) for data in images]
+            except (binascii.Error, ValueError, TypeError) as e:
+                return 400, {'error': f"błędne dane base64 w polu 'images': {e}"}
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._stats_lock:
+                self.rejected += 1
+            return 503, {'error': "serwer zajęty"}
+        try:
+            with self._stats_lock:
+                self.requests += 1
+            use_prefilter = bool(request.get('prefilter', True))
+            prepared = [self._decode_pool.submit(self._prepare, item, use_prefilter) for item in items]
+
+            # Zdekodowane obrazy trafiają do koalescera grupami po batch_size, a ostatnia
+            # niepełna grupa po zakończeniu dekodowania (bez jednoobrazowych przebiegów)
+            pending = []
+            group, slots = [], []
+            for future in prepared:
+                try:
+                    values, shortcut = future.result()
+                except Exception as e:
+                    self.logger.error(f"Błąd przygotowania obrazu: {e}")
+                    pending.append(None)
+                    continue
+                pending.append(shortcut)
+                if shortcut is None:
+                    group.append(values)
+                    slots.append(len(pending) - 1)
+                if len(group) >= self._coalescer.batch_size:
+                    self._submit_group(group, slots, pending)
+                    group, slots = [], []
+            self._submit_group(group, slots, pending)
+
+            results = []
+            for item in pending:
+                if isinstance(item, Future):
+                    try:
+                        item = item.result()
+                    except Exception as e:
+                        self.logger.error(f"Błąd klasyfikacji: {e}")
+                        item = None
+                results.append(_encode_result(item))
+            return 200, {'results': results}
+        finally:
+            self._slots.release()
+
+    def _submit_group(self, group, slots, pending):
+        """Wysyła grupę obrazów do koalescera i wstawia Future na ich miejsca w pending"""
+        for slot, future in zip(slots, self._coalescer.submit_group(group)):
+            pending[slot] = future
+
+    def _prepare(self, item, use_prefilter):
+        """Dekoduje i przygotowuje ścieżkę albo bajty obrazu"""
+        if isinstance(item, bytes):
+            with Image.open(io.BytesIO(item)) as image:
+                guard_image_size(image, self.classifier.max_pixels)
+                image.load()
+                return self.classifier.prepare_or_prefilter(image, use_prefilter)
+        return self.classifier.prepare_or_prefilter(item, use_prefilter)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """Połączenie HTTP przez gniazdo uniksowe"""
+
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class ClassificationClient:
+    """Klient serwera klasyfikacji (jedno połączenie keep-alive, nie współdzielić między wątkami)"""
+
+    def __init__(self, address, timeout=None, busy_retries=DEFAULT_BUSY_RETRIES):
+        self.address = address
+        self.timeout = timeout
+        self.busy_retries = busy_retries
+        self._connection = None
+
+    @classmethod
+    def probe(cls, address, timeout=PROBE_TIMEOUT):
+        """Zwraca opis serwera albo None, gdy pod adresem nic nie działa"""
+        client = cls(address, timeout=timeout)
+        try:
+            return client.info()
+        except (OSError, http.client.HTTPException, ValueError):
+            return None
+        finally:
+            client.close()
+
+    def info(self):
+        """Opis serwera (GET /info)"""
+        return self._request("GET", "/info")
+
+    def classify_paths(self, paths, prefilter=True):
+        """Klasyfikuje pliki widoczne dla serwera; wyniki w formacie procesów roboczych"""
+        response = self._request("POST", "/classify",
+                                 {'paths': [os.path.abspath(path) for path in paths], 'prefilter': prefilter})
+        return [_decode_result(entry) for entry in response['results']]
+
+    def classify_images(self, images, prefilter=True):
+        """Klasyfikuje obrazy przekazane jako bajty plików (np. PNG, JPEG)"""
+        encoded = [base64.b64encode(data).decode('ascii') for data in images]
+        response = self._request("POST", "/classify", {'images': encoded, 'prefilter': prefilter})
+        return [_decode_result(entry) for entry in response['results']]
+
+    def close(self):
+        """Zamyka połączenie"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _connect(self):
+        """Tworzy połączenie do serwera"""
+        kind, target = parse_address(self.address)
+        if kind == 'unix':
+            return _UnixHTTPConnection(target, timeout=self.timeout)
+        return http.client.HTTPConnection(target[0], target[1], timeout=self.timeout)
+
+    def _request(self, method, path, payload=None):
+        """Wysyła żądanie; ponawia przy zerwanym połączeniu keep-alive i najwyżej busy_retries razy przy 503"""
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {'Content-Type': "application/json"} if body is not None else {}
+        delay = 0.1
+        busy_retries = 0
+        reconnected = False
+        while True:
+            if self._connection is None:
+                self._connection = self._connect()
+            try:
+                self._connection.request(method, path, body=body, headers=headers)
+                response = self._connection.getresponse()
+                data = response.read()
+            except (ConnectionError, http.client.RemoteDisconnected, http.client.CannotSendRequest):
+                self.close()
+                if reconnected:
+                    raise
+                reconnected = True
+                continue
+
+            if response.status == 503 and busy_retries < self.busy_retries:
+                busy_retries += 1
+                time.sleep(delay)
+                delay = min(2.0, delay * 2)
+                continue
+            result = json.loads(data or b"{}")
+            if response.status != 200:
+                raise RuntimeError(f"Serwer klasyfikacji: HTTP {response.status}: {result.get('error')}")
+            return result
+
+
+class RemoteClassifierPool:
+    """Klient serwera z interfejsem ProcessPoolClassifier (submit / get_result / close).
+
+    `concurrency` wątków wysyła shardy równolegle - serwer łączy ich obrazy
+    w partie modelu.
+    """
+
+    def __init__(self, address, logger, concurrency=DEFAULT_MAX_CONCURRENCY, use_prefilter=True, profiler=None):
+        self.address = address
+        self.logger = logger
+        self.concurrency = max(1, int(concurrency))
+        self.use_prefilter = use_prefilter
+        self.profiler = profiler
+        self._task_queue = queue.Queue(maxsize=self.concurrency * 2)
+        self._result_queue = queue.Queue()
+        self._threads = []
+
+    def start(self):
+        """Uruchamia wątki wysyłające"""
+        for _ in range(self.concurrency):
+            thread = threading.Thread(target=self._sender)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, shard_id, paths, timeout=None):
+        """Wysyła fragment listy plików do klasyfikacji (blokuje, gdy kolejka jest pełna)"""
+        self._task_queue.put((shard_id, list(paths)), timeout=timeout)
+
+    def get_result(self, timeout=0.5):
+        """Zwraca (shard_id, wyniki) lub None po upływie limitu czasu"""
+        try:
+            shard_id, results, error = self._result_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if error is not None:
+            raise RuntimeError(f"Błąd serwera klasyfikacji {self.address}: {error}")
+        return shard_id, results
+
+    def close(self):
+        """Zatrzymuje wątki wysyłające"""
+        for _ in self._threads:
+            self._task_queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _sender(self):
+        """Wątek wysyłający shardy przez własne połączenie"""
+        client = ClassificationClient(self.address)
+        try:
+            while True:
+                task = self._task_queue.get()
+                if task is None:
+                    break
+                shard_id, paths = task
+                try:
+                    with measure(self.profiler, 'server_request', len(paths)):
+                        results = client.classify_paths(paths, prefilter=self.use_prefilter)
+                    self._result_queue.put((shard_id, results, None))
+                except Exception as e:
+                    self._result_queue.put((shard_id, None, f"{type(e).__name__}: {e}"))
+        finally:
+            client.close()
@@ -0,0 +1,618 @@
+"""Tryb wiersza poleceń - klasyfikacja bez interfejsu graficznego.
+
+Moduł nie importuje Tkinter ani sv_ttk, więc działa na serwerach bez ekranu:
+
+    python -m core INPUT OUTPUT [--threshold 0.6] [--batch-size 16] [--summary-json -]
+
+Serwer z modelem załadowanym raz (kolejne wywołania CLI używają go automatycznie):
+
+    python -m core serve [--listen 127.0.0.1:8765 | --listen unix:/tmp/clip.sock]
+
+Przesortowanie wyników poprzedniego przebiegu z nowym progiem (bez modelu):
+
+    python -m core resort OUTPUT --threshold 0.7 [--map code=kod]
+
+Najpierw plan umieszczenia plików, potem jego wykonanie (np. na innym komputerze):
+
+    python -m core INPUT OUTPUT --plan plan.jsonl
+    python -m core apply plan.jsonl [--input-folder X] [--output-folder Y] [--io-workers 16]
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import signal
+import sys
+import time
+
+from utils.logger import setup_logging
+
+from .classification_server import (DEFAULT_COALESCE_WINDOW, DEFAULT_MAX_CONCURRENCY, SERVER_ADDRESS_ENV,
+                                    ClassificationClient, ClassificationServer, default_server_address,
+                                    server_matches)
+from .categories import load_categories
+from .clip_classifier import CLIPClassifier, DEFAULT_MODEL_NAME
+from .dedup import DEFAULT_MAX_DISTANCE
+from .directory_scanner import DEFAULT_SCAN_BUFFER, SYMLINK_POLICIES, SYMLINKS_FILES
+from .file_placement import AVAILABLE_PLACEMENTS, PLACEMENT_COPY
+from .folder_watcher import (DEFAULT_DEBOUNCE, DEFAULT_POLL_INTERVAL, WATCH_AUTO, WATCH_BACKENDS,
+                             FolderWatcher)
+from .image_loader import DEFAULT_MAX_PIXELS
+from .placement_plan import apply_plan
+from .progress import ProgressChannel
+from .results_store import RESULTS_DIRNAME, resort
+from .run_profile import DEFAULT_TRACE_IMAGES, PROFILE_FILENAME, TRACE_KINDS
+from .inference_backends import (AVAILABLE_BACKENDS, AVAILABLE_COMPILE_MODES, AVAILABLE_PRECISIONS,
+                                 BACKEND_PYTORCH, COMPILE_NONE, PRECISION_FP32)
+from .image_processor import ImageProcessor, DEFAULT_DECODE_WORKERS, DEFAULT_IO_WORKERS
+
+# Kody wyjścia
+EXIT_OK = 0
+EXIT_FILE_ERRORS = 1  # przebieg zakończony, ale część plików nie została przetworzona
+EXIT_USAGE = 2  # błędne argumenty (zgodnie z argparse)
+EXIT_MODEL_ERROR = 3
+EXIT_NO_IMAGES = 4
+EXIT_PROCESSING_ERROR = 5
+EXIT_BACKEND_CHECK_FAILED = 6
+
+# Co ile sekund wypisywać postęp na konsolę
+CONSOLE_PROGRESS_INTERVAL = 0.5
+
+# Logger komunikatów trybu obserwacji - na konsoli także bez --verbose
+WATCH_LOGGER = "core.watch"
+
+
+def build_parser():
+    """Tworzy parser argumentów wiersza poleceń"""
+    parser = argparse.ArgumentParser(
+        prog="python -m core",
+        description="Klasyfikuje obrazy na screenshoty kodu i zwykłe obrazy modelem CLIP."
+    )
+    parser.add_argument("input_folder", help="folder ze screenshotami")
+    parser.add_argument("output_folder", help="folder na posortowane wyniki")
+    parser.add_argument("--threshold", type=float, default=0.6,
+                        help="próg pewności 0.0-1.0 (domyślnie 0.6)")
+    parser.add_argument("--batch-size", type=int, default=16,
+                        help="liczba obrazów na jeden przebieg modelu (domyślnie 16)")
+    parser.add_argument("--decode-workers", type=int, default=DEFAULT_DECODE_WORKERS,
+                        help=f"wątki dekodujące obrazy (domyślnie {DEFAULT_DECODE_WORKERS})")
+    parser.add_argument("--io-workers", type=int, default=DEFAULT_IO_WORKERS,
+                        help=f"wątki kopiujące pliki (domyślnie {DEFAULT_IO_WORKERS})")
+    parser.add_argument("--process-workers", type=int, default=1,
+                        help="liczba procesów z własną kopią modelu (domyślnie 1 = bez procesów)")
+    parser.add_argument("--threads-per-worker", type=int, default=0,
+                        help="wątki PyTorch na proces roboczy (domyślnie rdzenie / procesy)")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME,
+                        help=f"nazwa modelu CLIP (domyślnie {DEFAULT_MODEL_NAME})")
+    parser.add_argument("--backend", choices=AVAILABLE_BACKENDS, default=BACKEND_PYTORCH,
+                        help="backend wieży wizyjnej (domyślnie pytorch)")
+    parser.add_argument("--no-quantize", action="store_true",
+                        help="backend onnx: nie kwantyzuj wag do int8")
+    parser.add_argument("--lean", action="store_true",
+                        help="ładuj tylko wieżę wizyjną; embeddingi promptów z pliku w cache modeli "
+                             "(mniej pamięci i szybszy start)")
+    parser.add_argument("--precision", choices=AVAILABLE_PRECISIONS, default=PRECISION_FP32,
+                        help="backend pytorch: bf16 = autocast bfloat16 na CPU ze wsparciem bf16 (domyślnie fp32)")
+    parser.add_argument("--compile", choices=AVAILABLE_COMPILE_MODES, default=COMPILE_NONE,
+                        help="backend pytorch: trace = TorchScript zapisywany w cache modeli, "
+                             "compile = torch.compile (domyślnie none)")
+    parser.add_argument("--max-pixels", type=int, default=DEFAULT_MAX_PIXELS, metavar="N",
+                        help="odrzucaj obrazy większe niż N pikseli, zanim zostaną zdekodowane "
+                             f"(0 = bez limitu; domyślnie {DEFAULT_MAX_PIXELS})")
+    parser.add_argument("--max-in-flight", type=int, default=0, metavar="N",
+                        help="najwięcej obrazów jednocześnie w dekodowaniu i inferencji "
+                             "(domyślnie kilka partii)")
+    parser.add_argument("--scan-buffer", type=int, default=DEFAULT_SCAN_BUFFER, metavar="N",
+                        help=f"najwięcej ścieżek buforowanych przed potokiem (domyślnie {DEFAULT_SCAN_BUFFER})")
+    parser.add_argument("--verify-backend", type=int, default=0, metavar="N",
+                        help="przed sortowaniem porównaj decyzje backendu (lub bf16 / kompilacji) "
+                             "z PyTorch fp32 na N obrazach")
+    parser.add_argument("--min-agreement", type=float, default=0.98,
+                        help="minimalna zgodność decyzji w teście backendu (domyślnie 0.98)")
+    parser.add_argument("--full-decode", action="store_true",
+                        help="dekoduj obrazy w pełnej rozdzielczości (wolniej)")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="rozstrzygaj oczywiste zdjęcia i screenshoty kodu tanią kaskadą bez CLIP")
+    parser.add_argument("--prefilter-config", metavar="JSON",
+                        help="progi filtra wstępnego jako JSON (ścieżka do pliku lub tekst)")
+    parser.add_argument("--categories", metavar="JSON",
+                        help="kategorie jako plik JSON lub tekst JSON: lista {name, prompts, folder?, label?} "
+                             "(domyślnie code i clean)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="klasyfikuj tylko jeden obraz z każdej grupy duplikatów")
+    parser.add_argument("--dedup-distance", type=int, default=DEFAULT_MAX_DISTANCE,
+                        help=f"maksymalna odległość Hamminga skrótów percepcyjnych "
+                             f"(domyślnie {DEFAULT_MAX_DISTANCE})")
+    parser.add_argument("--duplicates-folder", action="store_true",
+                        help="przy --dedup przenoś dokładne duplikaty do folderu duplicates")
+    parser.add_argument("--include", action="append", default=[], metavar="GLOB",
+                        help="przetwarzaj tylko pliki pasujące do wzorca (nazwa lub ścieżka względna)")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="pomijaj pliki i foldery pasujące do wzorca")
+    parser.add_argument("--symlinks", choices=SYMLINK_POLICIES, default=SYMLINKS_FILES,
+                        help="dowiązania symboliczne: ignore, files (tylko do plików, domyślnie) lub follow")
+    parser.add_argument("--max-depth", type=int, default=None,
+                        help="maksymalna głębokość podfolderów (0 = tylko folder główny)")
+    parser.add_argument("--placement", choices=AVAILABLE_PLACEMENTS, default=PLACEMENT_COPY,
+                        help="sposób umieszczania plików: kopia, przeniesienie, dowiązanie twarde, "
+                             "reflink (copy-on-write) lub symboliczne (domyślnie copy)")
+    parser.add_argument("--plan", metavar="PATH",
+                        help="nie umieszczaj plików - zapisz plan (JSONL) do wykonania poleceniem apply")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="nie używaj trwałego cache wyników")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="nie wznawiaj przerwanego przebiegu")
+    parser.add_argument("--no-results", action="store_true",
+                        help=f"nie zapisuj prawdopodobieństw i embeddingów ({RESULTS_DIRNAME}) "
+                             "potrzebnych do przesortowania")
+    parser.add_argument("--no-profile", action="store_true",
+                        help=f"nie zapisuj profilu czasów etapów ({PROFILE_FILENAME}) w folderze wyjściowym")
+    parser.add_argument("--trace", choices=TRACE_KINDS,
+                        help="zapisz ślad cProfile lub torch.profiler dla próbki obrazów")
+    parser.add_argument("--trace-images", type=int, default=DEFAULT_TRACE_IMAGES,
+                        help=f"liczba obrazów w próbce śladu (domyślnie {DEFAULT_TRACE_IMAGES})")
+    parser.add_argument("--watch", action="store_true",
+                        help="obserwuj folder wejściowy i klasyfikuj nowe obrazy do przerwania (Ctrl+C)")
+    parser.add_argument("--watch-backend", choices=WATCH_BACKENDS, default=WATCH_AUTO,
+                        help="źródło zmian w trybie obserwacji: inotify (Linux) lub odpytywanie (domyślnie auto)")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f"co ile sekund sprawdzać zmiany przy odpytywaniu (domyślnie {DEFAULT_POLL_INTERVAL})")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE,
+                        help="ile sekund plik musi być niezmieniony przed klasyfikacją "
+                             f"(domyślnie {DEFAULT_DEBOUNCE})")
+    parser.add_argument("--skip-existing", action="store_true",
+                        help="w trybie obserwacji pomiń obrazy obecne w folderze przy starcie")
+    parser.add_argument("--server", metavar="ADDR",
+                        help="adres serwera klasyfikacji (host:port lub unix:/ścieżka; domyślnie "
+                             f"${SERVER_ADDRESS_ENV} albo {default_server_address()})")
+    parser.add_argument("--no-server", action="store_true",
+                        help="nie używaj serwera klasyfikacji, nawet jeśli działa")
+    parser.add_argument("--summary-json", default="-", metavar="PATH",
+                        help="gdzie zapisać podsumowanie JSON ('-' = stdout, domyślnie)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="loguj wynik każdego obrazu na konsolę")
+    parser.add_argument("--quiet", action="store_true",
+                        help="nie pokazuj postępu na stderr")
+    return parser
+
+
+def build_server_parser():
+    """Tworzy parser argumentów trybu serwera"""
+    parser = argparse.ArgumentParser(
+        prog="python -m core serve",
+        description="Lokalny serwer klasyfikacji - model ładowany raz, żądania łączone w partie."
+    )
+    parser.add_argument("--listen", default=default_server_address(), metavar="ADDR",
+                        help="adres nasłuchu: host:port lub unix:/ścieżka (domyślnie "
+                             f"${SERVER_ADDRESS_ENV} albo {default_server_address()})")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME,
+                        help=f"model CLIP z HuggingFace (domyślnie {DEFAULT_MODEL_NAME})")
+    parser.add_argument("--backend", choices=AVAILABLE_BACKENDS, default=BACKEND_PYTORCH,
+                        help="backend inferencji wieży wizyjnej (domyślnie pytorch)")
+    parser.add_argument("--no-quantize", action="store_true",
+                        help="backend onnx bez kwantyzacji int8")
+    parser.add_argument("--lean", action="store_true",
+                        help="ładuj tylko wieżę wizyjną (jak w trybie klasyfikacji)")
+    parser.add_argument("--precision", choices=AVAILABLE_PRECISIONS, default=PRECISION_FP32,
+                        help="precyzja backendu pytorch (jak w trybie klasyfikacji)")
+    parser.add_argument("--compile", choices=AVAILABLE_COMPILE_MODES, default=COMPILE_NONE,
+                        help="kompilacja wieży wizyjnej (jak w trybie klasyfikacji)")
+    parser.add_argument("--max-pixels", type=int, default=DEFAULT_MAX_PIXELS, metavar="N",
+                        help=f"odrzucaj obrazy większe niż N pikseli (0 = bez limitu; domyślnie {DEFAULT_MAX_PIXELS})")
+    parser.add_argument("--full-decode", action="store_true",
+                        help="dekoduj obrazy w pełnej rozdzielczości")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="włącz filtr wstępny dla żądań, które o niego proszą")
+    parser.add_argument("--prefilter-config", metavar="JSON",
+                        help="progi filtra wstępnego: plik JSON lub tekst JSON")
+    parser.add_argument("--categories", metavar="JSON",
+                        help="kategorie jako plik JSON lub tekst JSON (jak w trybie klasyfikacji)")
+    parser.add_argument("--batch-size", type=int, default=16,
+                        help="największa partia modelu łączona z żądań (domyślnie 16)")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help=f"jednocześnie obsługiwane żądania (domyślnie {DEFAULT_MAX_CONCURRENCY})")
+    parser.add_argument("--coalesce-ms", type=float, default=DEFAULT_COALESCE_WINDOW * 1000,
+                        help="ile ms czekać na obrazy z innych żądań do wspólnej partii "
+                             f"(domyślnie {DEFAULT_COALESCE_WINDOW * 1000:g})")
+    parser.add_argument("--decode-workers", type=int, default=DEFAULT_DECODE_WORKERS,
+                        help=f"wątki dekodujące obrazy (domyślnie {DEFAULT_DECODE_WORKERS})")
+    return parser
+
+
+class ConsoleProgress:
+    """Wypisuje stan kanału postępu na stderr (częstotliwość ogranicza kanał)"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+
+    def __call__(self, snapshot):
+        """Wypisuje jeden wiersz postępu"""
+        self.stream.write(f"[{snapshot.percent:5.1f}%] {snapshot.status_text()}\n")
+        self.stream.flush()
+
+
+def build_summary(status, args, result=None, elapsed_time=None, error=None, backend_check=None, server=None):
+    """Buduje podsumowanie przebiegu w formie słownika gotowego do JSON"""
+    summary = {
+        'status': status,
+        'input_folder': os.path.abspath(args.input_folder),
+        'output_folder': os.path.abspath(args.output_folder),
+        'confidence_threshold': args.threshold,
+        'model': args.model,
+        'backend': args.backend
+    }
+
+    if result is not None:
+        stats = result['stats']
+        elapsed_time = result['elapsed_time']
+        summary['stats'] = stats
+        summary['folders'] = {key: os.path.abspath(path) for key, path in result['folders'].items()}
+        if result.get('plan_path'):
+            summary['plan'] = result['plan_path']
+        if result.get('profile_path'):
+            summary['profile'] = os.path.abspath(result['profile_path'])
+        summary['images_per_second'] = stats['total_images'] / elapsed_time if elapsed_time > 0 else 0.0
+        if stats['total_images']:
+            summary['prefiltered_fraction'] = stats.get('prefiltered', 0) / stats['total_images']
+
+    if elapsed_time is not None:
+        summary['elapsed_seconds'] = round(elapsed_time, 3)
+
+    if backend_check is not None:
+        summary['backend_check'] = backend_check
+
+    if server is not None:
+        summary['server'] = server
+
+    if error is not None:
+        summary['error'] = error
+
+    return summary
+
+
+def write_summary(summary, destination):
+    """Zapisuje podsumowanie JSON do pliku lub na stdout"""
+    text = json.dumps(summary, indent=2, ensure_ascii=False)
+    if destination == "-":
+        sys.stdout.write(text + "\n")
+        sys.stdout.flush()
+    else:
+        with open(destination, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+
+
+def load_prefilter_config(args):
+    """Zwraca progi filtra wstępnego z argumentów (None = filtr wyłączony)"""
+    if not args.prefilter and not args.prefilter_config:
+        return None
+    if not args.prefilter_config:
+        return {}
+
+    if os.path.isfile(args.prefilter_config):
+        with open(args.prefilter_config, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return json.loads(args.prefilter_config)
+
+
+def find_server(args, classifier, logger):
+    """Zwraca adres działającego serwera klasyfikacji zgodnego z argumentami albo None"""
+    if args.no_server or args.verify_backend > 0 or args.trace:
+        return None
+
+    address = args.server or default_server_address()
+    info = ClassificationClient.probe(address)
+    if info is None:
+        if args.server:
+            logger.warning(f"Serwer klasyfikacji {address} nie odpowiada - model zostanie załadowany lokalnie")
+        return None
+
+    reason = server_matches(info, classifier, classifier.prefilter is not None)
+    if reason is not None:
+        logger.warning(f"Serwer klasyfikacji {address} pominięty: {reason}")
+        return None
+
+    logger.info(f"Klasyfikacja przez serwer {address} (model {info['model']}, pid {info['pid']})")
+    return address
+
+
+def _folder_mapping(text):
+    """Parsuje mapowanie NAZWA=FOLDER"""
+    name, separator, folder = text.partition("=")
+    if not separator or not name or not folder:
+        raise argparse.ArgumentTypeError(f"oczekiwano NAZWA=FOLDER, a nie {text!r}")
+    return name, folder
+
+
+def build_resort_parser():
+    """Tworzy parser argumentów przesortowania"""
+    parser = argparse.ArgumentParser(
+        prog="python -m core resort",
+        description="Przenosi pliki w folderze wyjściowym według nowego progu lub mapowania kategorii, "
+                    f"korzystając z zapisanych wyników ({RESULTS_DIRNAME}) - bez ponownej inferencji."
+    )
+    parser.add_argument("output_folder", help="folder wyjściowy poprzedniego przebiegu")
+    parser.add_argument("--threshold", type=float, default=0.6,
+                        help="nowy próg pewności (domyślnie 0.6)")
+    parser.add_argument("--map", type=_folder_mapping, action="append", default=[], metavar="NAZWA=FOLDER",
+                        help="folder kategorii względem folderu wyjściowego; kategorie mogą dzielić folder")
+    parser.add_argument("--summary-json", default="-", metavar="PATH",
+                        help="gdzie zapisać podsumowanie JSON ('-' = stdout, domyślnie)")
+    return parser
+
+
+def run_resort(args, logger):
+    """Przesortowuje folder wyjściowy według argumentów i zwraca kod wyjścia"""
+    start_time = time.time()
+    summary = {
+        'status': 'resorted',
+        'output_folder': os.path.abspath(args.output_folder),
+        'confidence_threshold': args.threshold
+    }
+    try:
+        stats = resort(args.output_folder, args.threshold, logger, folder_map=dict(args.map))
+    except FileNotFoundError as e:
+        logger.error(str(e))
+        summary.update(status='no_results', error=str(e))
+        write_summary(summary, args.summary_json)
+        return EXIT_NO_IMAGES
+    except ValueError as e:
+        logger.error(f"Błędne mapowanie kategorii: {e}")
+        summary.update(status='usage_error', error=str(e))
+        write_summary(summary, args.summary_json)
+        return EXIT_USAGE
+
+    summary['stats'] = stats
+    summary['elapsed_seconds'] = round(time.time() - start_time, 3)
+    write_summary(summary, args.summary_json)
+    return EXIT_OK
+
+
+def build_apply_parser():
+    """Tworzy parser argumentów wykonania planu"""
+    parser = argparse.ArgumentParser(
+        prog="python -m core apply",
+        description="Wykonuje plan umieszczenia plików zapisany opcją --plan."
+    )
+    parser.add_argument("plan", help="plik planu (JSONL)")
+    parser.add_argument("--input-folder", help="folder wejściowy (domyślnie z planu)")
+    parser.add_argument("--output-folder", help="folder wyjściowy (domyślnie z planu)")
+    parser.add_argument("--placement", choices=AVAILABLE_PLACEMENTS,
+                        help="sposób umieszczania plików (domyślnie z planu)")
+    parser.add_argument("--io-workers", type=int, default=8,
+                        help="wątki umieszczające pliki (domyślnie 8)")
+    parser.add_argument("--summary-json", default="-", metavar="PATH",
+                        help="gdzie zapisać podsumowanie JSON ('-' = stdout, domyślnie)")
+    return parser
+
+
+def run_apply(args, logger):
+    """Wykonuje plan umieszczenia plików i zwraca kod wyjścia"""
+    start_time = time.time()
+    summary = {'status': 'applied', 'plan': os.path.abspath(args.plan)}
+    try:
+        stats = apply_plan(args.plan, logger, input_folder=args.input_folder, output_folder=args.output_folder,
+                           placement=args.placement, io_workers=args.io_workers)
+    except (OSError, ValueError) as e:
+        logger.error(f"Nie można wykonać planu: {e}")
+        summary.update(status='usage_error', error=str(e))
+        write_summary(summary, args.summary_json)
+        return EXIT_USAGE
+
+    summary['stats'] = stats
+    summary['elapsed_seconds'] = round(time.time() - start_time, 3)
+    if stats['errors']:
+        summary['status'] = 'completed_with_errors'
+    write_summary(summary, args.summary_json)
+    return EXIT_OK if stats['errors'] == 0 else EXIT_FILE_ERRORS
+
+
+def run_cli(args, logger):
+    """Wykonuje klasyfikację według argumentów i zwraca kod wyjścia"""
+    start_time = time.time()
+
+    if args.plan and args.watch:
+        logger.error("Opcja --plan nie działa w trybie obserwacji")
+        write_summary(build_summary('usage_error', args, error="--plan cannot be combined with --watch"),
+                      args.summary_json)
+        return EXIT_USAGE
+
+    if not os.path.isdir(args.input_folder):
+        logger.error(f"Folder wejściowy nie istnieje: {args.input_folder}")
+        write_summary(build_summary('input_error', args, error="input folder not found"), args.summary_json)
+        return EXIT_NO_IMAGES
+
+    try:
+        classifier = CLIPClassifier(logger, model_name=args.model, backend=args.backend,
+                                    onnx_quantize=not args.no_quantize, fast_decode=not args.full_decode,
+                                    prefilter=load_prefilter_config(args),
+                                    categories=load_categories(args.categories), lean=args.lean,
+                                    max_pixels=args.max_pixels, precision=args.precision,
+                                    compile_mode=args.compile)
+    except ValueError as e:
+        logger.error(f"Błędna konfiguracja filtra wstępnego lub kategorii: {e}")
+        write_summary(build_summary('usage_error', args, error=str(e)), args.summary_json)
+        return EXIT_USAGE
+
+    config = {
+        'input_folder': args.input_folder,
+        'output_folder': args.output_folder,
+        'confidence_threshold': args.threshold,
+        'verbose_logs': args.verbose,
+        'batch_size': args.batch_size,
+        'decode_workers': args.decode_workers,
+        'io_workers': args.io_workers,
+        'process_workers': args.process_workers,
+        'max_in_flight': args.max_in_flight or None,
+        'scan_buffer': args.scan_buffer,
+        'threads_per_worker': args.threads_per_worker or None,
+        'placement_mode': args.placement,
+        'plan_path': args.plan,
+        'dedup': args.dedup,
+        'dedup_distance': args.dedup_distance,
+        'duplicates_folder': args.duplicates_folder,
+        'include_patterns': args.include,
+        'exclude_patterns': args.exclude,
+        'symlinks': args.symlinks,
+        'max_depth': args.max_depth,
+        'use_cache': not args.no_cache,
+        'resume': not args.no_resume,
+        'save_results': not args.no_results,
+        'write_profile': not args.no_profile,
+        'profile_trace': args.trace,
+        'profile_trace_images': args.trace_images
+    }
+
+    # Listowanie folderu (np. dysk sieciowy) trwa w tle równolegle z ładowaniem modelu
+    processor = ImageProcessor(logger)
+    scan = None if args.watch else processor.start_scan(config)
+
+    # Działający serwer ma model już w pamięci - wtedy nie ładujemy go lokalnie
+    server = find_server(args, classifier, logger)
+    config['classification_server'] = server
+
+    # W trybie wieloprocesowym model ładują tylko procesy robocze (obserwacja klasyfikuje lokalnie)
+    needs_local_model = server is None and (args.process_workers <= 1 or args.verify_backend > 0 or args.watch)
+    try:
+        if needs_local_model:
+            classifier.load_model_blocking()
+    except Exception as e:
+        logger.error(f"Błąd ładowania modelu: {e}")
+        write_summary(build_summary('model_error', args, elapsed_time=time.time() - start_time, error=str(e)),
+                      args.summary_json)
+        return EXIT_MODEL_ERROR
+
+    # Test zgodności szybkiego backendu z PyTorch przed sortowaniem
+    backend_check = None
+    if args.verify_backend > 0 and (args.backend != BACKEND_PYTORCH or classifier.uses_fast_path()):
+        sample = itertools.islice(processor.create_scanner(config).scan(args.input_folder), args.verify_backend)
+        backend_check = classifier.verify_backend(
+            [os.path.join(args.input_folder, name) for name in sample],
+            batch_size=args.batch_size, confidence_threshold=args.threshold
+        )
+        if backend_check['decision_agreement'] < args.min_agreement:
+            logger.error(f"Zgodność backendu {backend_check['decision_agreement']:.2%} "
+                         f"poniżej progu {args.min_agreement:.2%}")
+            write_summary(build_summary('backend_check_failed', args, elapsed_time=time.time() - start_time,
+                                        backend_check=backend_check), args.summary_json)
+            return EXIT_BACKEND_CHECK_FAILED
+
+    progress = ProgressChannel(listener=None if args.quiet else ConsoleProgress(),
+                               min_interval=CONSOLE_PROGRESS_INTERVAL)
+
+    if args.watch:
+        return run_watch(args, processor, classifier, config, progress, logger, start_time, backend_check)
+
+    try:
+        result = processor.run(config, classifier, progress, scan=scan)
+    except Exception as e:
+        logger.error(f"Wystąpił błąd podczas klasyfikacji: {e}")
+        write_summary(build_summary('processing_error', args, elapsed_time=time.time() - start_time,
+                                    error=str(e)), args.summary_json)
+        return EXIT_PROCESSING_ERROR
+
+    if result is None:
+        write_summary(build_summary('no_images', args, elapsed_time=time.time() - start_time),
+                      args.summary_json)
+        return EXIT_NO_IMAGES
+
+    errors = result['stats']['errors']
+    write_summary(build_summary('ok' if errors == 0 else 'completed_with_errors', args, result,
+                                backend_check=backend_check, server=server), args.summary_json)
+    return EXIT_OK if errors == 0 else EXIT_FILE_ERRORS
+
+
+def run_watch(args, processor, classifier, config, progress, logger, start_time, backend_check=None):
+    """Tryb obserwacji: klasyfikuje nowe obrazy do Ctrl+C, potem zapisuje zsumowane statystyki"""
+    # Komunikaty trybu obserwacji są na poziomie INFO; main() pokazuje je na konsoli bez --verbose
+    watch_logger = logging.getLogger(WATCH_LOGGER)
+
+    def report_batch(result, totals):
+        stats = result['stats']
+        watch_logger.info(f"Sklasyfikowano {stats['total_images']} nowych obrazów "
+                       f"(łącznie {totals['total_images']}, błędy: {totals['errors']})")
+
+    watcher = FolderWatcher(processor, classifier, config, logger, progress_callback=progress,
+                            poll_interval=args.poll_interval, debounce=args.debounce, backend=args.watch_backend,
+                            process_existing=not args.skip_existing, on_batch=report_batch)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watch_logger.info("Zakończono obserwację folderu")
+    except Exception as e:
+        logger.error(f"Błąd trybu obserwacji: {e}")
+        write_summary(build_summary('processing_error', args, elapsed_time=time.time() - start_time,
+                                    error=str(e)), args.summary_json)
+        return EXIT_PROCESSING_ERROR
+
+    summary = build_summary('watch_stopped', args, elapsed_time=time.time() - start_time,
+                            backend_check=backend_check)
+    summary['stats'] = dict(watcher.totals)
+    write_summary(summary, args.summary_json)
+    return EXIT_OK if watcher.totals['errors'] == 0 else EXIT_FILE_ERRORS
+
+
+def serve(args, logger):
+    """Tryb serwera: ładuje model i obsługuje żądania do Ctrl+C"""
+    try:
+        classifier = CLIPClassifier(logger, model_name=args.model, backend=args.backend,
+                                    onnx_quantize=not args.no_quantize, fast_decode=not args.full_decode,
+                                    prefilter=load_prefilter_config(args),
+                                    categories=load_categories(args.categories), lean=args.lean,
+                                    max_pixels=args.max_pixels, precision=args.precision,
+                                    compile_mode=args.compile)
+        classifier.load_model_blocking()
+    except ValueError as e:
+        logger.error(f"Błędna konfiguracja filtra wstępnego lub kategorii: {e}")
+        return EXIT_USAGE
+    except Exception as e:
+        logger.error(f"Błąd ładowania modelu: {e}")
+        return EXIT_MODEL_ERROR
+
+    try:
+        server = ClassificationServer(classifier, logger, address=args.listen, batch_size=args.batch_size,
+                                      max_concurrency=args.max_concurrency,
+                                      coalesce_window=args.coalesce_ms / 1000,
+                                      decode_workers=args.decode_workers)
+    except (OSError, ValueError) as e:
+        logger.error(f"Nie można uruchomić serwera na {args.listen}: {e}")
+        return EXIT_USAGE
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # SIGTERM (np. od menedżera usług) zamyka serwer tak samo jak Ctrl+C
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Zatrzymywanie serwera klasyfikacji")
+    finally:
+        server.close()
+    return EXIT_OK
+
+
+def main(argv=None):
+    """Punkt wejścia trybu wiersza poleceń"""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ["serve"]:
+        args = build_server_parser().parse_args(argv[1:])
+        logger = setup_logging(console_level=logging.INFO)
+        logger.info("=== CLIP Screenshot Filter Server Started ===")
+        return serve(args, logger)
+    if argv[:1] == ["apply"]:
+        args = build_apply_parser().parse_args(argv[1:])
+        logger = setup_logging(console_level=logging.INFO)
+        return run_apply(args, logger)
+    if argv[:1] == ["resort"]:
+        args = build_resort_parser().parse_args(argv[1:])
+        logger = setup_logging(console_level=logging.INFO)
+        return run_resort(args, logger)
+
+    args = build_parser().parse_args(argv)
+
+    logger = setup_logging(console_level=logging.INFO if args.verbose else logging.WARNING,
+                           console_info_loggers=(WATCH_LOGGER,) if args.watch else ())
+    logger.info("=== CLIP Screenshot Filter Started (CLI) ===")
+
+    return run_cli(args, logger)
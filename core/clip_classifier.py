@@ -1,40 +1,128 @@
+import hashlib
+import json
 import os
 import threading
 
 from PIL import Image
 
+from .categories import CATEGORY_CLEAN, CATEGORY_CODE, CategoryIndex, build_categories
+from .image_loader import (DEFAULT_MAX_PIXELS, DEFAULT_OVERSAMPLE, DEFAULT_TARGET_SIZE, guard_image_size,
+                           load_image_fast, reduce_image)
+from .prefilter import PrefilterCascade
+from .run_profile import measure
+from .preprocessing import ClipImagePreprocessor
+from .inference_backends import (BACKEND_PYTORCH, BACKEND_ONNX, COMPILE_NONE, PRECISION_BF16, PRECISION_FP32,
+                                 SELF_TEST_MIN_COSINE, TorchVisionBackend, compare_backends, cpu_supports_bf16,
+                                 create_backend, vision_image_size)
+from .prompt_embeddings import (encode_prompts, load_prompt_embeddings, prompt_embeddings_path,
+                                save_prompt_embeddings)
+
+# Domyślny model CLIP
+DEFAULT_MODEL_NAME = "openai/clip-vit-base-patch32"
+
+# Rozmiar próbnej partii testu startowego (inny niż partia śledzenia TorchScript)
+SELF_TEST_BATCH = 3
 
 class CLIPClassifier:
-    def __init__(self, logger):
+    def __init__(self, logger, model_name=DEFAULT_MODEL_NAME, backend=BACKEND_PYTORCH,
+                 onnx_quantize=True, model_cache_dir=None, num_threads=0, fast_decode=True,
+                 prefilter=None, categories=None, lean=False, max_pixels=DEFAULT_MAX_PIXELS,
+                 precision=PRECISION_FP32, compile_mode=COMPILE_NONE):
         self.logger = logger
+        self.model_name = model_name
+        self.backend_name = backend
+        self.onnx_quantize = onnx_quantize
+        self.model_cache_dir = model_cache_dir
+        self.num_threads = num_threads  # 0 = domyślna liczba wątków bibliotek
+        self.fast_decode = fast_decode  # dekodowanie w zmniejszonej rozdzielczości
+        # Tryb oszczędny: tylko wieża wizyjna + zapisane embeddingi promptów (bez wieży tekstowej)
+        self.lean = lean
+        # Szybka ścieżka PyTorch: precyzja (fp32 / bf16) i kompilacja wieży wizyjnej;
+        # po nieudanym teście startowym wracają do fp32 eager
+        self.precision = precision
+        self.compile_mode = compile_mode
+        # Limit pikseli z nagłówka - większe obrazy nie są dekodowane (None = bez limitu)
+        self.max_pixels = max_pixels
+        # Kaskada filtra wstępnego (None = wyłączona, dict = progi nadpisujące domyślne)
+        self.prefilter = PrefilterCascade(prefilter) if prefilter is not None else None
+        # Opcjonalny RunProfiler mierzący etapy ścieżki obrazu
+        self.profiler = None
+        self.vision_backend = None
         self.clip_model = None
         self.clip_processor = None
+        self.preprocessor = None
         self._model_loaded = False
 
+        # Kategorie (prompty pogrupowane kolejno) i cache znormalizowanych embeddingów promptów
+        self.categories = build_categories(categories)
+        self.category_index = CategoryIndex(self.categories)
+        self._text_embeddings = None
+        self._logit_scale = None
+        self._text_embeddings_lock = threading.Lock()
+
     def is_loaded(self):
         """Sprawdza czy model jest załadowany"""
         return self._model_loaded
 
-    def load_model(self, success_callback, error_callback):
-        """Ładuje model CLIP w osobnym wątku"""
+    @property
+    def prompts(self):
+        """Zwraca pełną listę promptów pogrupowaną według kategorii"""
+        return self.category_index.prompts
 
-        def load_model_thread():
-            try:
-                self.logger.info("Rozpoczęcie ładowania modelu CLIP...")
+    def cache_signature(self):
+        """Zwraca skrót modelu i promptów - zmiana unieważnia zapisane wyniki"""
+        backend = self.backend_name
+        if backend == BACKEND_ONNX and self.onnx_quantize:
+            backend += "-int8"
+        elif backend == BACKEND_PYTORCH and self.precision != PRECISION_FP32:
+            backend += f"-{self.precision}"
+        payload = json.dumps({'model': self.model_name, 'backend': backend, 'prompts': self.prompts},
+                             sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
 
-                # Import bibliotek (może zająć chwilę przy pierwszym uruchomieniu)
-                import torch
-                from transformers import CLIPProcessor, CLIPModel
+    def get_options(self):
+        """Zwraca ustawienia potrzebne do odtworzenia klasyfikatora w innym procesie"""
+        return {
+            'model_name': self.model_name,
+            'backend': self.backend_name,
+            'onnx_quantize': self.onnx_quantize,
+            'model_cache_dir': self.model_cache_dir,
+            'fast_decode': self.fast_decode,
+            'lean': self.lean,
+            'precision': self.precision,
+            'compile_mode': self.compile_mode,
+            'max_pixels': self.max_pixels,
+            'prefilter': dict(self.prefilter.thresholds) if self.prefilter else None,
+            'categories': [category.to_dict() for category in self.categories]
+        }
+
+    def set_categories(self, categories):
+        """Ustawia nowe kategorie i unieważnia cache embeddingów tekstowych"""
+        categories = build_categories(categories)
 
-                self.logger.info("Biblioteki załadowane, ładowanie modelu...")
+        with self._text_embeddings_lock:
+            self.categories = categories
+            self.category_index = CategoryIndex(categories)
+            self._text_embeddings = None
 
-                # Ładuj model (przy pierwszym uruchomieniu pobiera ~1.7GB)
-                model_name = "openai/clip-vit-base-patch32"
-                self.clip_model = CLIPModel.from_pretrained(model_name)
-                self.clip_processor = CLIPProcessor.from_pretrained(model_name)
+        self.logger.info(f"Kategorie: {', '.join(self.category_index.names)} "
+                         f"({len(self.prompts)} promptów), cache embeddingów tekstowych unieważniony")
 
-                self._model_loaded = True
-                self.logger.info("Model CLIP załadowany pomyślnie!")
+    def set_prompts(self, code_prompts, normal_prompts):
+        """Ustawia prompty dwóch wbudowanych kategorii (kod / normalne obrazy)"""
+        self.set_categories([{'name': CATEGORY_CODE, 'prompts': code_prompts},
+                             {'name': CATEGORY_CLEAN, 'prompts': normal_prompts}])
+
+    def prefilter_supported(self):
+        """Kaskada rozstrzyga tylko kod / zwykły obraz - przy innych kategoriach jest pomijana"""
+        return sorted(self.category_index.names) == sorted([CATEGORY_CODE, CATEGORY_CLEAN])
+
+    def load_model(self, success_callback, error_callback):
+        """Ładuje model CLIP w osobnym wątku"""
+
+        def load_model_thread():
+            try:
+                self.load_model_blocking()
 
                 # Wywołaj callback sukcesu w głównym wątku
                 if success_callback:
@@ -57,50 +145,350 @@ class CLIPClassifier:
         thread.daemon = True
         thread.start()
 
+    def load_model_blocking(self):
+        """Ładuje model CLIP w bieżącym wątku (błędy są zgłaszane jako wyjątki)"""
+        self.logger.info("Rozpoczęcie ładowania modelu CLIP...")
+
+        # Import bibliotek (może zająć chwilę przy pierwszym uruchomieniu)
+        import torch
+        from transformers import (CLIPConfig, CLIPImageProcessor, CLIPModel, CLIPProcessor,
+                                  CLIPVisionModelWithProjection)
+
+        self.logger.info("Biblioteki załadowane, ładowanie modelu...")
+
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+
+        # Ładuj model (przy pierwszym uruchomieniu pobiera ~1.7GB)
+        if self.lean:
+            # Tylko wieża wizyjna z projekcją (te same atrybuty vision_model / visual_projection
+            # co CLIPModel); wagi wieży tekstowej i tokenizer nie są wczytywane
+            config = CLIPConfig.from_pretrained(self.model_name)
+            vision_config = config.vision_config
+            # Wymiar projekcji obowiązuje ten z konfiguracji głównej (jak w CLIPModel)
+            vision_config.projection_dim = config.projection_dim
+            self.clip_model = CLIPVisionModelWithProjection.from_pretrained(self.model_name, config=vision_config)
+            self.clip_processor = None
+            image_processor = CLIPImageProcessor.from_pretrained(self.model_name)
+        else:
+            self.clip_model = CLIPModel.from_pretrained(self.model_name)
+            self.clip_processor = CLIPProcessor.from_pretrained(self.model_name)
+            image_processor = self.clip_processor.image_processor
+        self.clip_model.eval()
+        self.preprocessor = ClipImagePreprocessor.from_processor(image_processor)
+
+        # Backend wieży wizyjnej (domyślnie PyTorch, opcjonalnie ONNX Runtime)
+        fast_path = self.uses_fast_path()
+        if fast_path and self.precision == PRECISION_BF16 and not cpu_supports_bf16():
+            self.logger.warning("CPU bez wsparcia bf16 - obliczenia w fp32")
+            self.precision = PRECISION_FP32
+        try:
+            self.vision_backend = create_backend(self.backend_name, self.clip_model, self.model_name, self.logger,
+                                                 cache_dir=self.model_cache_dir, quantize=self.onnx_quantize,
+                                                 num_threads=self.num_threads, precision=self.precision,
+                                                 compile_mode=self.compile_mode)
+        except (RuntimeError, OSError) as e:
+            if not fast_path:
+                raise
+            self._disable_fast_path(f"błąd przygotowania: {e}")
+
+        # Zakoduj prompty raz - wieża tekstowa nie jest potrzebna per obraz
+        self._get_text_embeddings()
+
+        if self.uses_fast_path():
+            self._self_test_fast_path()
+        elif self.backend_name != BACKEND_PYTORCH and (self.precision != PRECISION_FP32
+                                                       or self.compile_mode != COMPILE_NONE):
+            self.logger.info("Precyzja i kompilacja dotyczą tylko backendu PyTorch - pominięte")
+        description = getattr(self.vision_backend, 'description', self.vision_backend.signature)
+        self.logger.info(f"Backend inferencji: {description}")
+
+        self._model_loaded = True
+        self.logger.info("Model CLIP załadowany pomyślnie!")
+
+    def uses_fast_path(self):
+        """Czy backend PyTorch ma działać w bf16 lub ze skompilowaną wieżą"""
+        return self.backend_name == BACKEND_PYTORCH and (self.precision != PRECISION_FP32
+                                                         or self.compile_mode != COMPILE_NONE)
+
+    def _self_test_fast_path(self):
+        """Porównuje szybką ścieżkę z fp32 eager na próbnej partii i wyłącza ją przy rozbieżności"""
+        import torch
+
+        size = self._input_size()
+        generator = torch.Generator().manual_seed(0)
+        # Szum w zakresie znormalizowanych pikseli CLIP
+        probe = torch.rand(SELF_TEST_BATCH, 3, size, size, generator=generator) * 4 - 2
+        try:
+            report = compare_backends(TorchVisionBackend(self.clip_model), self.vision_backend, [probe],
+                                      self._text_embeddings, self._logit_scale, self.category_index)
+        except Exception as e:
+            self._disable_fast_path(f"błąd testu startowego: {e}")
+            return
+
+        cosine = report['min_embedding_cosine']
+        if cosine < SELF_TEST_MIN_COSINE:
+            self._disable_fast_path(f"podobieństwo embeddingów {cosine:.4f} < {SELF_TEST_MIN_COSINE}")
+            return
+        self.logger.info(f"Test startowy szybkiej ścieżki zaliczony (podobieństwo embeddingów {cosine:.4f}, "
+                         f"max różnica prawdopodobieństw {report['max_prob_diff']:.2e})")
+
+    def _disable_fast_path(self, reason):
+        """Wraca do referencyjnej ścieżki fp32 eager"""
+        self.logger.warning(f"Szybka ścieżka PyTorch ({self.precision}, {self.compile_mode}) wyłączona - "
+                            f"{reason}; obliczenia w fp32 eager")
+        self.precision = PRECISION_FP32
+        self.compile_mode = COMPILE_NONE
+        self.vision_backend = TorchVisionBackend(self.clip_model)
+
+    def _get_text_embeddings(self):
+        """Zwraca znormalizowaną macierz embeddingów promptów, licząc ją tylko raz"""
+        with self._text_embeddings_lock:
+            if self._text_embeddings is None:
+                import torch
+
+                path = prompt_embeddings_path(self.clip_model, self.model_name, self.prompts,
+                                              self.model_cache_dir)
+                stored = load_prompt_embeddings(path, self.prompts) if self.clip_processor is None else None
+                if stored is not None:
+                    embeddings, self._logit_scale = stored
+                    self._text_embeddings = torch.from_numpy(embeddings)
+                    self.logger.info(f"Wczytano embeddingi {len(self.prompts)} promptów: {path}")
+                else:
+                    if self.clip_processor is None:
+                        self._text_embeddings, self._logit_scale = self._encode_prompts_once()
+                    else:
+                        self._text_embeddings, self._logit_scale = encode_prompts(
+                            self.clip_model, self.clip_processor, self.prompts)
+                    self.logger.info(f"Zakodowano {len(self.prompts)} promptów tekstowych")
+                    self._store_text_embeddings(path)
+
+            return self._text_embeddings
+
+    def _encode_prompts_once(self):
+        """Tryb oszczędny bez zapisanych embeddingów: wczytuje pełny model tylko na czas kodowania promptów"""
+        from transformers import CLIPModel, CLIPProcessor
+
+        self.logger.info("Brak zapisanych embeddingów promptów - jednorazowe ładowanie wieży tekstowej...")
+        clip_model = CLIPModel.from_pretrained(self.model_name).eval()
+        try:
+            return encode_prompts(clip_model, CLIPProcessor.from_pretrained(self.model_name), self.prompts)
+        finally:
+            del clip_model
+
+    def _store_text_embeddings(self, path):
+        """Zapisuje embeddingi promptów dla trybu oszczędnego (błąd zapisu nie przerywa pracy)"""
+        try:
+            save_prompt_embeddings(path, self.prompts, self._text_embeddings.numpy(), self._logit_scale)
+        except OSError as e:
+            self.logger.warning(f"Nie udało się zapisać embeddingów promptów: {e}")
+
+    def _input_size(self):
+        """Zwraca rozmiar wejścia wieży wizyjnej"""
+        if self.clip_model is not None:
+            return vision_image_size(self.clip_model)
+        return DEFAULT_TARGET_SIZE
+
+    def load_image(self, image_path):
+        """Wczytuje obraz z dysku jako RGB"""
+        if self.fast_decode:
+            return load_image_fast(image_path, self._input_size(), profiler=self.profiler,
+                                   max_pixels=self.max_pixels)
+
+        with measure(self.profiler, 'open'):
+            image = Image.open(image_path)
+        with image, measure(self.profiler, 'decode'):
+            return guard_image_size(image, self.max_pixels).convert('RGB')
+
     def classify_image(self, image_path, verbose=True):
         """Klasyfikuje obraz używając modelu CLIP"""
+        return self.classify_batch([image_path], batch_size=1, verbose=verbose)[0]
+
+    def prepare_image(self, image):
+        """Wczytuje (jeśli trzeba) obraz, skaluje go i wycina środek jako tablicę uint8.
+
+        Nie korzysta z modelu, więc może działać równolegle w wątkach roboczych.
+        Normalizacja odbywa się dla całej partii w classify_prepared.
+        """
+        image = self._load_for_model(image)
+        with measure(self.profiler, 'preprocess'):
+            return self.preprocessor.resize_and_crop(image)
+
+    def prepare_or_prefilter(self, image, use_prefilter=True):
+        """Jak prepare_image, ale najpierw uruchamia kaskadę filtra wstępnego.
+
+        Zwraca (prepared, None) albo (None, wynik) - gdy kaskada rozstrzygnęła
+        obraz bez udziału CLIP.
+        """
+        image = self._load_for_model(image)
+        if use_prefilter and self.prefilter is not None and self.prefilter_supported():
+            with measure(self.profiler, 'prefilter'):
+                result = self.prefilter.classify(image)
+            if result is not None:
+                return None, result
+        with measure(self.profiler, 'preprocess'):
+            return self.preprocessor.resize_and_crop(image), None
+
+    def _load_for_model(self, image):
+        """Zwraca obraz RGB (z pliku lub obiektu PIL), zmniejszony przy szybkim dekodowaniu"""
+        if isinstance(image, str):
+            image = self.load_image(image)
+        else:
+            if self.fast_decode:
+                image = reduce_image(image, self._input_size() * DEFAULT_OVERSAMPLE)
+            image = image.convert('RGB')
+        return image
+
+    def classify_batch(self, images, batch_size=16, verbose=True, names=None):
+        """Klasyfikuje listę obrazów (ścieżki lub obiekty PIL) w partiach.
+
+        Zwraca listę krotek (is_code, confidence, details) w kolejności wejścia.
+        Błąd pojedynczego pliku daje wynik (False, 0.0, {}) tylko dla tego pliku.
+        """
+        if not self._model_loaded:
+            raise RuntimeError("Model CLIP nie został załadowany")
+
+        batch_size = max(1, int(batch_size))
+        if names is None:
+            names = [item if isinstance(item, str) else f"<obraz {i}>" for i, item in enumerate(images)]
+
+        results = [(False, 0.0, {})] * len(images)
+
+        for start in range(0, len(images), batch_size):
+            # Przygotuj obrazy partii, pomijając uszkodzone pliki i rozstrzygnięte przez filtr wstępny
+            indices = []
+            prepared = []
+            for index in range(start, min(start + batch_size, len(images))):
+                try:
+                    values, shortcut = self.prepare_or_prefilter(images[index])
+                    if shortcut is not None:
+                        results[index] = shortcut
+                        if verbose:
+                            self.log_prefiltered(names[index], shortcut)
+                        continue
+                    prepared.append(values)
+                    indices.append(index)
+                except Exception as e:
+                    self.logger.error(f"Błąd klasyfikacji {names[index]}: {e}")
+
+            if not prepared:
+                continue
+
+            batch_results = self.classify_prepared(prepared, [names[i] for i in indices], verbose)
+            for index, result in zip(indices, batch_results):
+                results[index] = result
+
+        return results
+
+    def classify_prepared(self, prepared, names, verbose=True):
+        """Klasyfikuje partię wyników prepare_image jednym przebiegiem modelu"""
         if not self._model_loaded:
             raise RuntimeError("Model CLIP nie został załadowany")
 
         try:
-            import torch
+            with measure(self.profiler, 'normalize', len(prepared)):
+                pixel_values = self.preprocessor.to_pixel_values(prepared)
+            with measure(self.profiler, 'forward', len(prepared)):
+                probs, embeddings = self._compute_probs(pixel_values)
+            probs = probs.numpy()
+            rows = list(zip(probs, self.category_index.reduce(probs), embeddings))
+        except Exception as e:
+            # Awaria całej partii - klasyfikuj pojedynczo, aby odizolować zły plik
+            self.logger.warning(f"Błąd partii ({e}), klasyfikacja pojedyncza...")
+            rows = []
+            for name, values in zip(names, prepared):
+                try:
+                    probs, embeddings = self._compute_probs(self.preprocessor.to_pixel_values([values]))
+                    probs = probs.numpy()
+                    rows.append((probs[0], self.category_index.reduce(probs[0]), embeddings[0]))
+                except Exception as single_error:
+                    self.logger.error(f"Błąd klasyfikacji {name}: {single_error}")
+                    rows.append(None)
 
-            # Wczytaj obraz
-            image = Image.open(image_path).convert('RGB')
+        with measure(self.profiler, 'postprocess', len(rows)):
+            return [self._build_result(row[0].tolist(), row[1], name, verbose, row[2].numpy())
+                    if row is not None else (False, 0.0, {})
+                    for row, name in zip(rows, names)]
 
-            # Teksty opisujące klasy
-            texts = [
-                "a screenshot of code in an IDE or text editor",
-                "a screenshot of programming code",
-                "a terminal or command line interface",
-                "a normal photo or colorful image",
-                "a regular picture or photograph",
-                "a meme or colorful graphic"
-            ]
+    def log_prefiltered(self, name, result):
+        """Loguje wynik rozstrzygnięty przez filtr wstępny"""
+        _, confidence, details = result
+        self.logger.info(f"{os.path.basename(name)}: filtr wstępny, "
+                         f"klasyfikacja={details['category']}, pewność={confidence:.3f}")
 
-            # Przetwórz przez CLIP
-            inputs = self.clip_processor(text=texts, images=image, return_tensors="pt", padding=True)
+    def result_from_probs(self, prompt_probs, name, verbose=True, embedding=None):
+        """Odtwarza wynik klasyfikacji z zapisanych prawdopodobieństw promptów (np. z cache)"""
+        return self._build_result(list(prompt_probs), self.category_index.reduce(prompt_probs), name, verbose,
+                                  embedding)
 
-            with torch.no_grad():
-                outputs = self.clip_model(**inputs)
-                logits_per_image = outputs.logits_per_image
-                probs = logits_per_image.softmax(dim=1)
+    def _compute_probs(self, pixel_values):
+        """Liczy prawdopodobieństwa promptów i embeddingi dla tensora obrazów (jeden forward pass)"""
+        import torch
 
-            # Prawdopodobieństwa dla każdej klasy
-            code_prob = max(probs[0][0].item(), probs[0][1].item(), probs[0][2].item())  # IDE, kod, terminal
-            normal_prob = max(probs[0][3].item(), probs[0][4].item(), probs[0][5].item())  # normalne zdjęcia
+        text_embeds = self._get_text_embeddings()
 
-            confidence = max(code_prob, normal_prob)
-            is_code = code_prob > normal_prob
+        # Tylko wieża wizyjna + iloczyn z zapamiętanymi embeddingami promptów
+        with torch.inference_mode():
+            image_embeds = self.vision_backend.encode(pixel_values)
+            image_embeds = image_embeds / image_embeds.norm(p=2, dim=-1, keepdim=True)
+            logits_per_image = self._logit_scale * image_embeds @ text_embeds.t()
+            probs = logits_per_image.softmax(dim=1)
 
-            if verbose:
-                self.logger.info(f"{os.path.basename(image_path)}: "
-                                 f"kod={code_prob:.3f}, normalne={normal_prob:.3f}, "
-                                 f"klasyfikacja={'KOD' if is_code else 'NORMALNE'}, "
-                                 f"pewność={confidence:.3f}")
+        return probs, image_embeds
 
-            return is_code, confidence, {'code_prob': code_prob, 'normal_prob': normal_prob}
+    def _build_result(self, probs, category_probs, name, verbose, embedding=None):
+        """Zamienia prawdopodobieństwa promptów i kategorii na wynik (is_code, confidence, details)"""
+        winner, confidence = self.category_index.decide(category_probs)
+        category = self.category_index.names[int(winner)]
+        confidence = float(confidence)
+        scores = dict(zip(self.category_index.names, category_probs.tolist()))
 
-        except Exception as e:
-            self.logger.error(f"Błąd klasyfikacji {image_path}: {e}")
-            return False, 0.0, {}
+        if verbose:
+            self.logger.info(f"{os.path.basename(name)}: "
+                             + ", ".join(f"{key}={value:.3f}" for key, value in scores.items())
+                             + f", klasyfikacja={category}, pewność={confidence:.3f}")
+
+        details = {
+            'category': category,
+            'category_probs': scores,
+            'prompt_probs': probs,
+            'embedding': embedding
+        }
+        # Zgodność z wynikami filtra wstępnego i starszymi odbiorcami
+        if CATEGORY_CODE in scores and CATEGORY_CLEAN in scores:
+            details['code_prob'] = scores[CATEGORY_CODE]
+            details['normal_prob'] = scores[CATEGORY_CLEAN]
+
+        return category == CATEGORY_CODE, confidence, details
+
+    def verify_backend(self, image_paths, batch_size=16, confidence_threshold=0.6):
+        """Porównuje decyzje aktywnego backendu z referencyjnym PyTorch fp32 eager na próbce obrazów"""
+        if not self._model_loaded:
+            raise RuntimeError("Model CLIP nie został załadowany")
+        if self.vision_backend.name == BACKEND_PYTORCH and not self.uses_fast_path():
+            raise ValueError("Aktywny backend to PyTorch fp32 eager - nie ma z czym porównywać")
+
+        def pixel_batches():
+            batch = []
+            for path in image_paths:
+                try:
+                    batch.append(self.prepare_image(path))
+                except Exception as e:
+                    self.logger.warning(f"Pomijam {path} w teście backendu: {e}")
+                    continue
+                if len(batch) >= batch_size:
+                    yield self.preprocessor.to_pixel_values(batch)
+                    batch = []
+            if batch:
+                yield self.preprocessor.to_pixel_values(batch)
+
+        text_embeds = self._get_text_embeddings()
+        report = compare_backends(
+            TorchVisionBackend(self.clip_model), self.vision_backend, pixel_batches(),
+            text_embeds, self._logit_scale,
+            self.category_index, confidence_threshold
+        )
+        report['backend'] = self.vision_backend.signature
+        self.logger.info(f"Test backendu {report['backend']}: zgodność decyzji "
+                         f"{report['decision_agreement']:.2%} na {report['images']} obrazach")
+        return report
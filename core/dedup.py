@@ -0,0 +1,199 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .image_loader import load_image_fast
+
+# Rozmiar dHash (hash_size x hash_size bitów) i domyślna maksymalna odległość Hamminga
+DEFAULT_HASH_SIZE = 8
+DEFAULT_MAX_DISTANCE = 4
+
+# Potwierdzenie kandydatów z dHash: korelacja miniatur w skali szarości. Różne screenshoty
+# w tym samym motywie edytora mają bliski dHash, ale różnią się układem linii tekstu.
+CONFIRM_SIZE = 256
+MIN_CONFIRM_CORRELATION = 0.9
+
+
+def file_digest(path):
+    """Liczy skrót zawartości pliku (dokładne duplikaty)"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dhash(image, hash_size=DEFAULT_HASH_SIZE):
+    """Liczy percepcyjny skrót różnicowy (dHash) obrazu PIL jako liczbę całkowitą"""
+    gray = np.asarray(image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR))
+    bits = np.packbits(gray[:, :-1] > gray[:, 1:])
+    return int.from_bytes(bits.tobytes(), 'big')
+
+
+def confirm_thumbnail(image, size=CONFIRM_SIZE):
+    """Znormalizowana (średnia 0, odchylenie 1) miniatura obrazu do potwierdzania duplikatów"""
+    gray = np.asarray(image.convert('L').resize((size, size), Image.BOX), dtype=np.float32)
+    return (gray - gray.mean()) / (gray.std() + 1e-3)
+
+
+def thumbnail_correlation(a, b):
+    """Korelacja dwóch miniatur z confirm_thumbnail (1.0 - identyczne)"""
+    return float(np.mean(a * b))
+
+
+def hamming_distance(a, b):
+    """Liczba różniących się bitów dwóch skrótów"""
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """Drzewo BK dla skrótów percepcyjnych - wyszukiwanie w promieniu odległości Hamminga"""
+
+    def __init__(self):
+        self._root = None  # (hash, wartość, {odległość: węzeł})
+
+    def add(self, hash_value, item):
+        """Dodaje skrót z powiązaną wartością"""
+        node = (hash_value, item, {})
+        if self._root is None:
+            self._root = node
+            return
+
+        current = self._root
+        while True:
+            distance = hamming_distance(hash_value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def find(self, hash_value, max_distance):
+        """Zwraca (odległość, wartość) najbliższego skrótu w promieniu max_distance albo None"""
+        matches = self.find_all(hash_value, max_distance)
+        return matches[0] if matches else None
+
+    def find_all(self, hash_value, max_distance):
+        """Zwraca wszystkie (odległość, wartość) w promieniu max_distance, od najbliższych"""
+        if self._root is None:
+            return []
+
+        matches = []
+        stack = [self._root]
+        while stack:
+            node_hash, item, children = stack.pop()
+            distance = hamming_distance(hash_value, node_hash)
+            if distance <= max_distance:
+                matches.append((distance, item))
+
+            # Nierówność trójkąta - tylko te poddrzewa mogą zawierać trafienia
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+class DuplicateGroups:
+    """Wynik deduplikacji: reprezentanci do klasyfikacji i przypisane do nich duplikaty"""
+
+    def __init__(self):
+        self.representatives = []
+        self.duplicates = {}  # nazwa reprezentanta -> [(nazwa, ścieżka, czy_dokładny)]
+
+    @property
+    def group_count(self):
+        """Liczba grup z co najmniej jednym duplikatem"""
+        return len(self.duplicates)
+
+    @property
+    def duplicate_count(self):
+        """Liczba plików, które przejmą wynik reprezentanta"""
+        return sum(len(items) for items in self.duplicates.values())
+
+    @property
+    def exact_count(self):
+        """Liczba dokładnych (bajtowo identycznych) duplikatów"""
+        return sum(1 for items in self.duplicates.values() for _, _, exact in items if exact)
+
+
+def find_duplicates(image_files, input_folder, logger, max_distance=DEFAULT_MAX_DISTANCE,
+                    hash_size=DEFAULT_HASH_SIZE, workers=4, min_correlation=MIN_CONFIRM_CORRELATION):
+    """Grupuje dokładne i prawie identyczne obrazy.
+
+    Najpierw porównywane są skróty zawartości plików, a dla pozostałych
+    obrazów - dHash liczony z mocno zmniejszonego dekodowania i wyszukiwany
+    w drzewie BK (osobnym dla każdych proporcji obrazu). Kandydat z drzewa
+    jest duplikatem dopiero, gdy korelacja miniatur CONFIRM_SIZE px wynosi co
+    najmniej min_correlation. Kolejność reprezentantów odpowiada kolejności image_files.
+    Pliki, których nie da się odczytać, zostają reprezentantami (błąd zgłosi
+    etap klasyfikacji).
+    """
+    paths = [os.path.join(input_folder, filename) for filename in image_files]
+
+    def exact_key(path):
+        try:
+            return file_digest(path)
+        except OSError:
+            return None
+
+    def perceptual_key(path):
+        try:
+            image = load_image_fast(path, target_size=hash_size * 4, oversample=1)
+        except Exception:
+            return None
+        # Proporcje obrazu oddzielają np. jednolite tło od ciemnego screenshota o podobnym dHash
+        return round(image.width / image.height, 1), dhash(image, hash_size)
+
+    thumbnails = {}  # ścieżka -> miniatura do potwierdzania (tylko dla kandydatów)
+
+    def thumbnail(path):
+        if path not in thumbnails:
+            try:
+                thumbnails[path] = confirm_thumbnail(load_image_fast(path, target_size=CONFIRM_SIZE))
+            except Exception:
+                thumbnails[path] = None
+        return thumbnails[path]
+
+    def confirmed(path, other_path):
+        a, b = thumbnail(path), thumbnail(other_path)
+        return a is not None and b is not None and thumbnail_correlation(a, b) >= min_correlation
+
+    groups = DuplicateGroups()
+    by_digest = {}
+    unique = []
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for filename, path, digest in zip(image_files, paths, pool.map(exact_key, paths)):
+            representative = by_digest.get(digest) if digest is not None else None
+            if representative is not None:
+                groups.duplicates.setdefault(representative, []).append((filename, path, True))
+                continue
+            if digest is not None:
+                by_digest[digest] = filename
+            unique.append((filename, path))
+
+        trees = {}  # proporcje -> BKTree
+        keys = pool.map(perceptual_key, [path for _, path in unique])
+        for (filename, path), key in zip(unique, keys):
+            # Zerowy dHash (jednolity kolor, gładki gradient) nie niesie informacji - bez grupowania
+            if key is None or key[1] == 0:
+                groups.representatives.append(filename)
+                continue
+
+            aspect, hash_value = key
+            tree = trees.setdefault(aspect, BKTree())
+            match = next((item for _, item in tree.find_all(hash_value, max_distance)
+                          if confirmed(path, item[1])), None)
+            if match is not None:
+                groups.duplicates.setdefault(match[0], []).append((filename, path, False))
+                continue
+            tree.add(hash_value, (filename, path))
+            groups.representatives.append(filename)
+
+    logger.info(f"Deduplikacja: {groups.group_count} grup, {groups.duplicate_count} duplikatów "
+                f"(w tym {groups.exact_count} dokładnych), {len(groups.representatives)} do klasyfikacji")
+    return groups
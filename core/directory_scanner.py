@@ -0,0 +1,198 @@
+import fnmatch
+import os
+import queue
+import threading
+
+# Obsługa dowiązań symbolicznych podczas skanowania
+SYMLINKS_IGNORE = "ignore"  # pomijaj wszystkie dowiązania
+SYMLINKS_FILES = "files"  # dowiązania do plików tak, do katalogów nie
+SYMLINKS_FOLLOW = "follow"  # wchodź także do katalogów (z ochroną przed pętlami)
+SYMLINK_POLICIES = (SYMLINKS_IGNORE, SYMLINKS_FILES, SYMLINKS_FOLLOW)
+
+# Znacznik końca skanowania w kolejce skanowania w tle
+_SCAN_DONE = object()
+
+# Ile znalezionych ścieżek może czekać na przetworzenie (skanowanie dalej czeka na potok)
+DEFAULT_SCAN_BUFFER = 10000
+
+
+class DirectoryScanner:
+    """Rekurencyjny skaner folderu oparty o os.scandir.
+
+    Zwraca ścieżki względem folderu wejściowego strumieniowo (generator),
+    więc przetwarzanie może ruszyć przed końcem listowania. Wzorce include
+    i exclude (fnmatch) sprawdzane są zarówno dla nazwy pliku, jak i ścieżki
+    względnej; exclude dotyczy też katalogów. max_depth=0 oznacza tylko
+    folder główny, None - bez ograniczeń.
+    """
+
+    def __init__(self, extensions, include=None, exclude=None, symlinks=SYMLINKS_FILES,
+                 max_depth=None, skip_dirs=None, logger=None):
+        if symlinks not in SYMLINK_POLICIES:
+            raise ValueError(f"Nieznana obsługa dowiązań: {symlinks} (dostępne: {', '.join(SYMLINK_POLICIES)})")
+        self.extensions = {ext.lower() for ext in extensions}
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        self.symlinks = symlinks
+        self.max_depth = max_depth
+        self.skip_dirs = {os.path.realpath(path) for path in (skip_dirs or [])}
+        self.logger = logger
+
+    def scan(self, root, start="", depth=0, on_dir=None):
+        """Generator ścieżek względnych obrazów w folderze root.
+
+        `start` pozwala zacząć od podfolderu (ścieżka względna na głębokości
+        `depth`). `on_dir(path, rel_path, depth)` jest wywoływane dla każdego
+        akceptowanego podfolderu i decyduje, czy do niego wejść.
+        """
+        visited = set()
+        stack = [(os.path.join(root, start) if start else root, start, depth)]
+
+        while stack:
+            folder, relative, depth = stack.pop()
+            try:
+                entries = os.scandir(folder)
+            except OSError as e:
+                self._warn(f"Nie można odczytać folderu {folder}: {e}")
+                continue
+
+            subfolders = []
+            with entries:
+                for entry in entries:
+                    rel_path = os.path.join(relative, entry.name) if relative else entry.name
+                    try:
+                        is_link = entry.is_symlink()
+                        if is_link and self.symlinks == SYMLINKS_IGNORE:
+                            continue
+
+                        if entry.is_dir(follow_symlinks=True):
+                            if (self._accept_dir(entry, rel_path, depth, is_link, visited)
+                                    and (on_dir is None or on_dir(entry.path, rel_path, depth + 1))):
+                                subfolders.append((entry.path, rel_path, depth + 1))
+                        elif entry.is_file(follow_symlinks=True) and self.accepts_file(entry.name, rel_path):
+                            yield rel_path
+                    except OSError as e:
+                        self._warn(f"Pominięto {entry.path}: {e}")
+
+            # Odwrócona kolejność na stosie - podfoldery przetwarzane w kolejności listowania
+            stack.extend(reversed(subfolders))
+
+    def _accept_dir(self, entry, rel_path, depth, is_link, visited):
+        """Sprawdza, czy wejść do podfolderu"""
+        if self.max_depth is not None and depth >= self.max_depth:
+            return False
+        if is_link and self.symlinks != SYMLINKS_FOLLOW:
+            return False
+        if self._matches(self.exclude, entry.name, rel_path):
+            return False
+
+        real_path = os.path.realpath(entry.path)
+        if real_path in self.skip_dirs:
+            return False
+
+        if is_link or self.symlinks == SYMLINKS_FOLLOW:
+            # Ochrona przed pętlami dowiązań
+            stat = entry.stat(follow_symlinks=True)
+            key = (stat.st_dev, stat.st_ino)
+            if key in visited:
+                return False
+            visited.add(key)
+        return True
+
+    def accepts_dir(self, path, rel_path, depth):
+        """Sprawdza pojedynczy podfolder na głębokości depth (np. nowy katalog w trybie obserwacji)"""
+        try:
+            return self._accept_dir(_PathEntry(path), rel_path, depth, os.path.islink(path), set())
+        except OSError:
+            return False
+
+    def accepts_file(self, name, rel_path):
+        """Sprawdza rozszerzenie i wzorce include/exclude pliku"""
+        if os.path.splitext(name.lower())[1] not in self.extensions:
+            return False
+        if self.include and not self._matches(self.include, name, rel_path):
+            return False
+        return not self._matches(self.exclude, name, rel_path)
+
+    @staticmethod
+    def _matches(patterns, name, rel_path):
+        """Czy nazwa lub ścieżka względna pasuje do któregoś wzorca"""
+        normalized = rel_path.replace(os.sep, '/')
+        return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(normalized, pattern)
+                   for pattern in patterns)
+
+    def _warn(self, message):
+        """Loguje ostrzeżenie, jeśli skaner ma logger"""
+        if self.logger is not None:
+            self.logger.warning(message)
+
+
+class _PathEntry:
+    """Minimalny odpowiednik os.DirEntry dla ścieżki spoza os.scandir"""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+
+    def stat(self, follow_symlinks=True):
+        """stat() ścieżki"""
+        return os.stat(self.path, follow_symlinks=follow_symlinks)
+
+
+class BackgroundScan:
+    """Skanowanie w osobnym wątku - listowanie trwa równolegle z ładowaniem modelu i inferencją.
+
+    Obiekt jest iterowalny jednokrotnie; błąd skanowania jest zgłaszany
+    w wątku, który iteruje. Kolejka ścieżek jest ograniczona (max_buffered),
+    więc lista plików dużego archiwum nie trafia w całości do pamięci.
+    """
+
+    def __init__(self, scanner, root, max_buffered=DEFAULT_SCAN_BUFFER):
+        self.root = root
+        self.found = 0
+        self.finished = threading.Event()
+        self._queue = queue.Queue(maxsize=max(1, max_buffered))
+        self._stopped = threading.Event()
+        self._error = None
+
+        self._thread = threading.Thread(target=self._run, args=(scanner,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, scanner):
+        """Wątek skanujący - przekazuje znalezione ścieżki do kolejki"""
+        try:
+            for rel_path in scanner.scan(self.root):
+                self.found += 1
+                if not self._put(rel_path):
+                    return
+        except Exception as e:
+            self._error = e
+        finally:
+            self.finished.set()
+            self._put(_SCAN_DONE)
+
+    def _put(self, item):
+        """Wstawia element do kolejki, czekając na miejsce do zatrzymania skanowania"""
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self):
+        """Zatrzymuje skanowanie, jeśli nikt już nie odbiera ścieżek"""
+        self._stopped.set()
+
+    def __iter__(self):
+        """Zwraca ścieżki w miarę ich znajdowania (blokuje do końca skanowania)"""
+        while True:
+            item = self._queue.get()
+            if item is _SCAN_DONE:
+                break
+            yield item
+
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,109 @@
+import errno
+import os
+import shutil
+import threading
+
+# Sposoby umieszczania plików w folderach docelowych
+PLACEMENT_COPY = "copy"
+PLACEMENT_MOVE = "move"
+PLACEMENT_HARDLINK = "hardlink"
+PLACEMENT_REFLINK = "reflink"
+PLACEMENT_SYMLINK = "symlink"
+AVAILABLE_PLACEMENTS = (PLACEMENT_COPY, PLACEMENT_MOVE, PLACEMENT_HARDLINK, PLACEMENT_REFLINK, PLACEMENT_SYMLINK)
+
+# ioctl FICLONE (Linux: Btrfs, XFS, bcachefs...) - klon copy-on-write całego pliku
+_FICLONE = 0x40049409
+
+# Błędy oznaczające brak obsługi danego sposobu (a nie problem z konkretnym plikiem)
+_UNSUPPORTED_ERRORS = {errno.EXDEV, errno.EPERM, errno.EINVAL, errno.ENOTTY, errno.EMLINK,
+                       getattr(errno, 'EOPNOTSUPP', errno.EINVAL), getattr(errno, 'ENOTSUP', errno.EINVAL)}
+
+
+class FilePlacer:
+    """Umieszcza sklasyfikowane pliki w folderach docelowych wybranym sposobem.
+
+    Dowiązania twarde i przeniesienie przez rename działają tylko w obrębie
+    jednego urządzenia, a reflink dodatkowo wymaga obsługi w systemie plików.
+    Para (urządzenie źródła, urządzenie celu), dla której sposób zawiódł,
+    jest zapamiętywana i kolejne pliki od razu używają kopii (copy2), więc
+    niepowodzenie jest logowane tylko raz.
+    """
+
+    def __init__(self, mode, logger):
+        if mode not in AVAILABLE_PLACEMENTS:
+            raise ValueError(f"Nieznany sposób umieszczania plików: {mode} "
+                             f"(dostępne: {', '.join(AVAILABLE_PLACEMENTS)})")
+        self.mode = mode
+        self.logger = logger
+        self._unsupported = set()  # (st_dev źródła, st_dev celu)
+        self._lock = threading.Lock()
+
+    def place(self, src, dest):
+        """Umieszcza plik src pod ścieżką dest i zwraca faktycznie użyty sposób"""
+        if self.mode == PLACEMENT_COPY:
+            shutil.copy2(src, dest)
+            return PLACEMENT_COPY
+
+        if self.mode == PLACEMENT_SYMLINK:
+            self._remove_existing(dest)
+            os.symlink(os.path.abspath(src), dest)
+            return PLACEMENT_SYMLINK
+
+        devices = (os.stat(src).st_dev, os.stat(os.path.dirname(dest) or '.').st_dev)
+        same_device = devices[0] == devices[1]
+
+        if self.mode == PLACEMENT_MOVE:
+            if same_device:
+                os.replace(src, dest)
+            else:
+                shutil.move(src, dest)
+            return PLACEMENT_MOVE
+
+        if same_device and devices not in self._unsupported:
+            try:
+                if self.mode == PLACEMENT_HARDLINK:
+                    self._remove_existing(dest)
+                    os.link(src, dest)
+                else:
+                    _reflink(src, dest)
+                return self.mode
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRORS:
+                    raise
+                self._mark_unsupported(devices, str(e))
+        elif not same_device:
+            self._mark_unsupported(devices, "różne urządzenia")
+
+        shutil.copy2(src, dest)
+        return PLACEMENT_COPY
+
+    def _mark_unsupported(self, devices, reason):
+        """Zapamiętuje parę urządzeń bez obsługi wybranego sposobu (log tylko raz)"""
+        with self._lock:
+            if devices in self._unsupported:
+                return
+            self._unsupported.add(devices)
+        self.logger.warning(f"Tryb '{self.mode}' niedostępny ({reason}) - używam kopiowania")
+
+    @staticmethod
+    def _remove_existing(dest):
+        """Usuwa istniejący plik docelowy (jak nadpisanie przy kopiowaniu)"""
+        if os.path.lexists(dest):
+            os.remove(dest)
+
+
+def _reflink(src, dest):
+    """Tworzy klon copy-on-write pliku (FICLONE) z zachowaniem metadanych jak copy2"""
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError(errno.EOPNOTSUPP, "reflink nie jest obsługiwany na tym systemie")
+
+    with open(src, 'rb') as source, open(dest, 'wb') as target:
+        try:
+            fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.remove(dest)
+            raise
+    shutil.copystat(src, dest)
@@ -0,0 +1,501 @@
+import ctypes
+import ctypes.util
+import errno
+import itertools
+import os
+import select
+import struct
+import threading
+import time
+
+from .categories import UNCERTAIN_KEY
+from .progress import ProgressChannel
+
+# Domyślne parametry trybu obserwacji
+DEFAULT_POLL_INTERVAL = 2.0  # co ile sekund sprawdzać zmiany (tryb odpytywania)
+DEFAULT_DEBOUNCE = 1.0  # ile sekund rozmiar i czas modyfikacji muszą być stałe
+DEFAULT_BATCH_WINDOW = 0.5  # ile sekund czekać na kolejne pliki przed klasyfikacją
+DEFAULT_FULL_RESCAN_INTERVAL = 300.0  # pełne skanowanie (pliki nadpisane w miejscu, zgubione zdarzenia)
+DEFAULT_MAX_BATCH = 256  # najwięcej plików w jednym przebiegu
+
+# Źródła zmian
+WATCH_AUTO = "auto"
+WATCH_INOTIFY = "inotify"
+WATCH_POLL = "poll"
+WATCH_BACKENDS = (WATCH_AUTO, WATCH_INOTIFY, WATCH_POLL)
+
+# Maski zdarzeń inotify (linux/inotify.h)
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = (_IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+               | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _file_state(path):
+    """(rozmiar, czas modyfikacji w ns) pliku albo None, jeśli pliku nie ma"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class _PollingSource:
+    """Wykrywa zmiany przez odpytywanie czasów modyfikacji katalogów.
+
+    Pełne listowanie jest potrzebne tylko przy starcie; później w każdym
+    cyklu wystarczy stat() każdego katalogu, a listowane są ponownie tylko
+    katalogi, których czas modyfikacji się zmienił (dodanie, usunięcie lub
+    zmiana nazwy pliku). Zawartość nadpisana w miejscu nie zmienia katalogu -
+    wyłapuje ją okresowe pełne skanowanie.
+    """
+
+    name = WATCH_POLL
+
+    def __init__(self, scanner, root, stop_event):
+        self.scanner = scanner
+        self.root = root
+        self.stop_event = stop_event
+        self.dirs = {}  # ścieżka względna katalogu -> (mtime_ns, głębokość)
+
+    def full_scan(self):
+        """Listuje cały folder i odbudowuje indeks katalogów; zwraca ścieżki plików"""
+        self.dirs = {"": (self._dir_mtime(self.root), 0)}
+        return set(self.scanner.scan(self.root, on_dir=self._on_dir))
+
+    def wait(self, timeout):
+        """Czeka do `timeout` sekund i zwraca (kandydaci, gotowe); gotowe są zawsze puste"""
+        self.stop_event.wait(timeout)
+        return self._changed(), set()
+
+    def close(self):
+        """Źródło nie trzyma zasobów"""
+
+    def _changed(self):
+        """Ponownie listuje katalogi o zmienionym czasie modyfikacji"""
+        candidates = set()
+        for relative, (mtime, depth) in list(self.dirs.items()):
+            if relative not in self.dirs:
+                continue  # usunięty razem z nadrzędnym
+            current = self._dir_mtime(os.path.join(self.root, relative) if relative else self.root)
+            if current is None:
+                self._forget(relative)
+                continue
+            if current == mtime:
+                continue
+
+            # Zapisz czas przed listowaniem - zmiana w trakcie zostanie wykryta w następnym cyklu
+            self.dirs[relative] = (current, depth)
+            candidates.update(self.scanner.scan(self.root, start=relative, depth=depth, on_dir=self._on_new_dir))
+        return candidates
+
+    def _on_dir(self, path, relative, depth):
+        """Rejestruje katalog przy pełnym skanowaniu"""
+        self.dirs[relative] = (self._dir_mtime(path), depth)
+        return True
+
+    def _on_new_dir(self, path, relative, depth):
+        """Wchodzi tylko do nowych katalogów - znane mają własny wpis w indeksie"""
+        if relative in self.dirs:
+            return False
+        return self._on_dir(path, relative, depth)
+
+    def _forget(self, relative):
+        """Usuwa katalog i jego podkatalogi z indeksu"""
+        prefix = relative + os.sep
+        for known in [known for known in self.dirs if known == relative or known.startswith(prefix)]:
+            del self.dirs[known]
+
+    @staticmethod
+    def _dir_mtime(path):
+        """Czas modyfikacji katalogu w ns albo None"""
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+
+class _InotifySource:
+    """Zdarzenia inotify (Linux) przez ctypes - bez dodatkowych zależności.
+
+    Plik zamknięty po zapisie (IN_CLOSE_WRITE) lub przeniesiony do folderu
+    (IN_MOVED_TO) jest od razu gotowy; utworzenie i modyfikacja tylko
+    oznaczają kandydata, który przechodzi sprawdzenie stabilności. Nowe
+    katalogi są obserwowane i listowane (pliki mogły powstać przed dodaniem
+    obserwacji). Przepełnienie kolejki zdarzeń wymusza pełne skanowanie.
+    """
+
+    name = WATCH_INOTIFY
+
+    def __init__(self, scanner, root, stop_event):
+        if not hasattr(os, 'O_CLOEXEC'):
+            raise OSError(errno.ENOSYS, "inotify niedostępne na tej platformie")
+        libc_name = ctypes.util.find_library('c')
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify niedostępne w bibliotece C")
+
+        self._libc = libc
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+
+        self.scanner = scanner
+        self.root = root
+        self.stop_event = stop_event
+        self.watches = {}  # deskryptor obserwacji -> (ścieżka względna, głębokość)
+        self.rescan_needed = False
+
+    def full_scan(self):
+        """Listuje cały folder, dodając obserwację każdego katalogu; zwraca ścieżki plików"""
+        self._add_watch(self.root, "", 0)
+        return set(self.scanner.scan(self.root, on_dir=self._add_watch))
+
+    def wait(self, timeout):
+        """Czeka na zdarzenia do `timeout` sekund i zwraca (kandydaci, gotowe)"""
+        candidates = set()
+        complete = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return candidates, complete
+
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            self._parse(data, candidates, complete)
+
+        return candidates, complete
+
+    def close(self):
+        """Zamyka deskryptor inotify"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def _parse(self, data, candidates, complete):
+        """Zamienia bufor zdarzeń na ścieżki kandydatów"""
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & _IN_Q_OVERFLOW:
+                self.rescan_needed = True
+                continue
+            if mask & _IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            if wd not in self.watches or not name:
+                continue
+
+            relative, depth = self.watches[wd]
+            rel_path = os.path.join(relative, name) if relative else name
+            path = os.path.join(self.root, rel_path)
+
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO):
+                    candidates.update(self._scan_new_dir(path, rel_path, depth))
+                continue
+            if not mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_MODIFY):
+                continue
+            if not self.scanner.accepts_file(name, rel_path):
+                continue
+
+            candidates.add(rel_path)
+            if mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+                complete.add(rel_path)
+            else:
+                complete.discard(rel_path)
+
+    def _scan_new_dir(self, path, rel_path, parent_depth):
+        """Obserwuje nowy katalog (z podkatalogami) i zwraca pliki, które już w nim są"""
+        if not self.scanner.accepts_dir(path, rel_path, parent_depth):
+            return set()
+        if not self._add_watch(path, rel_path, parent_depth + 1):
+            return set()
+        return set(self.scanner.scan(self.root, start=rel_path, depth=parent_depth + 1, on_dir=self._add_watch))
+
+    def _add_watch(self, path, relative, depth):
+        """Dodaje obserwację katalogu; przy braku limitu obserwacji wymusza odpytywanie"""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            if code == errno.ENOSPC:
+                raise OSError(code, "przekroczono limit obserwacji inotify (fs.inotify.max_user_watches)")
+            return False
+        self.watches[wd] = (relative, depth)
+        return True
+
+
+class FolderWatcher:
+    """Tryb obserwacji: klasyfikuje nowe i zmienione obrazy w miarę ich pojawiania się.
+
+    Model pozostaje załadowany; źródło zmian (inotify albo odpytywanie
+    katalogów) zgłasza kandydatów, którzy czekają, aż rozmiar i czas
+    modyfikacji przestaną się zmieniać (plik dopisywany przez inny program
+    nie trafia do klasyfikacji w połowie zapisu). Gotowe pliki zbierane są
+    w mikropartie - klasyfikacja rusza po zebraniu batch_size plików albo
+    po batch_window sekund od pojawienia się pierwszego. Każda mikropartia
+    to zwykły przebieg ImageProcessor.run na liście ścieżek, więc działają
+    cache, filtry wstępne i tryby umieszczania plików.
+    """
+
+    def __init__(self, processor, classifier, config, logger, progress_callback=None,
+                 poll_interval=DEFAULT_POLL_INTERVAL, debounce=DEFAULT_DEBOUNCE,
+                 batch_window=DEFAULT_BATCH_WINDOW, full_rescan_interval=DEFAULT_FULL_RESCAN_INTERVAL,
+                 backend=WATCH_AUTO, process_existing=True, on_batch=None):
+        if backend not in WATCH_BACKENDS:
+            raise ValueError(f"Nieznane źródło zmian: {backend} (dostępne: {', '.join(WATCH_BACKENDS)})")
+        self.processor = processor
+        self.classifier = classifier
+        self.logger = logger
+        self.progress_callback = progress_callback or (lambda value, status_text: None)
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.batch_window = batch_window
+        self.full_rescan_interval = full_rescan_interval
+        self.backend = backend
+        self.process_existing = process_existing
+        self.on_batch = on_batch
+
+        # Każda mikropartia to krótki przebieg: bez dziennika wznawiania, profilu i procesów roboczych
+        self.config = dict(config, resume=False, write_profile=False, profile_trace=None, process_workers=1)
+        self.batch_size = max(1, int(config.get('batch_size', 16)))
+        self.max_batch = max(self.batch_size, int(config.get('watch_max_batch', DEFAULT_MAX_BATCH)))
+
+        self.stop_event = threading.Event()
+        self.totals = {'batches': 0, 'total_images': 0, 'errors': 0}
+        for category in classifier.categories:
+            self.totals[category.stat_key] = 0
+        self.totals[UNCERTAIN_KEY] = 0
+
+        self._processed = {}  # ścieżka względna -> (rozmiar, mtime_ns) w chwili klasyfikacji
+        self._pending = {}  # ścieżka względna -> (rozmiar, mtime_ns, od kiedy stabilny)
+        self._ready = {}  # ścieżka względna -> czas gotowości (kolejność wstawiania)
+
+    def stop(self):
+        """Prosi pętlę obserwacji o zakończenie (po bieżącej mikropartii)"""
+        self.stop_event.set()
+
+    def run(self):
+        """Obserwuje folder wejściowy do wywołania stop(); zwraca zsumowane statystyki"""
+        input_folder = self.config['input_folder']
+        scanner = self.processor.create_scanner(self.config)
+        source = self._open_source(scanner, input_folder)
+        try:
+            existing = source.full_scan()
+            self._register_existing(input_folder, existing)
+            self.logger.info(f"Obserwacja folderu {input_folder} ({source.name}, "
+                             f"{len(existing)} istniejących obrazów)")
+
+            last_full_scan = time.monotonic()
+            while not self.stop_event.is_set():
+                candidates, complete = source.wait(self._wait_timeout())
+
+                if getattr(source, 'rescan_needed', False) or \
+                        time.monotonic() - last_full_scan >= self.full_rescan_interval:
+                    source.rescan_needed = False
+                    candidates |= self._full_rescan(source)
+                    last_full_scan = time.monotonic()
+
+                self._add_candidates(input_folder, candidates, complete)
+                self._check_pending(input_folder)
+                if self._batch_due():
+                    self._process_batch()
+
+            return dict(self.totals)
+        finally:
+            source.close()
+
+    def _open_source(self, scanner, input_folder):
+        """Wybiera źródło zmian: inotify, gdy dostępne, w przeciwnym razie odpytywanie"""
+        if self.backend in (WATCH_AUTO, WATCH_INOTIFY):
+            try:
+                source = _InotifySource(scanner, input_folder, self.stop_event)
+                return _FallbackSource(source, _PollingSource(scanner, input_folder, self.stop_event),
+                                       self.logger)
+            except (OSError, AttributeError) as e:
+                if self.backend == WATCH_INOTIFY:
+                    raise
+                self.logger.info(f"inotify niedostępne ({e}), sprawdzanie zmian co {self.poll_interval} s")
+        return _PollingSource(scanner, input_folder, self.stop_event)
+
+    def _register_existing(self, input_folder, existing):
+        """Istniejące pliki: do klasyfikacji albo od razu oznaczone jako przetworzone"""
+        if self.process_existing:
+            self._add_candidates(input_folder, existing, set())
+            return
+        for rel_path in existing:
+            state = _file_state(os.path.join(input_folder, rel_path))
+            if state is not None:
+                self._processed[rel_path] = state
+
+    def _full_rescan(self, source):
+        """Pełne skanowanie: zwraca wszystkie pliki i zapomina usunięte"""
+        existing = source.full_scan()
+        for rel_path in [rel_path for rel_path in self._processed if rel_path not in existing]:
+            del self._processed[rel_path]
+        return existing
+
+    def _add_candidates(self, input_folder, candidates, complete):
+        """Nowe lub zmienione pliki trafiają do oczekujących albo od razu do gotowych"""
+        now = time.monotonic()
+        for rel_path in candidates:
+            state = _file_state(os.path.join(input_folder, rel_path))
+            if state is None:
+                self._pending.pop(rel_path, None)
+                self._ready.pop(rel_path, None)
+                continue
+            if self._processed.get(rel_path) == state:
+                continue
+
+            if rel_path in complete:
+                self._pending.pop(rel_path, None)
+                self._ready.setdefault(rel_path, now)
+                continue
+
+            self._ready.pop(rel_path, None)
+            pending = self._pending.get(rel_path)
+            if pending is None or pending[:2] != state:
+                self._pending[rel_path] = (*state, now)
+
+    def _check_pending(self, input_folder):
+        """Przenosi do gotowych pliki, których stan nie zmienił się przez `debounce` sekund"""
+        now = time.monotonic()
+        for rel_path, (size, mtime, since) in list(self._pending.items()):
+            if now - since < self.debounce:
+                continue
+            state = _file_state(os.path.join(input_folder, rel_path))
+            if state is None:
+                del self._pending[rel_path]
+            elif state != (size, mtime):
+                self._pending[rel_path] = (*state, now)
+            else:
+                del self._pending[rel_path]
+                self._ready[rel_path] = now
+
+    def _batch_due(self):
+        """Czy zebrano pełną partię albo minęło okno oczekiwania na kolejne pliki"""
+        if not self._ready:
+            return False
+        if len(self._ready) >= self.batch_size:
+            return True
+        return time.monotonic() - next(iter(self._ready.values())) >= self.batch_window
+
+    def _wait_timeout(self):
+        """Jak długo czekać na zdarzenia, aby nie spóźnić debounce ani okna partii"""
+        timeout = self.poll_interval
+        now = time.monotonic()
+        if self._ready:
+            timeout = min(timeout, max(0.0, next(iter(self._ready.values())) + self.batch_window - now))
+        if self._pending:
+            oldest = min(since for _, _, since in self._pending.values())
+            timeout = min(timeout, max(0.0, oldest + self.debounce - now))
+        return max(0.05, timeout)
+
+    def _process_batch(self):
+        """Klasyfikuje mikropartię gotowych plików"""
+        input_folder = self.config['input_folder']
+        batch = list(itertools.islice(self._ready, self.max_batch))
+        states = {}
+        for rel_path in batch:
+            del self._ready[rel_path]
+            state = _file_state(os.path.join(input_folder, rel_path))
+            if state is not None:
+                states[rel_path] = state
+        batch = [rel_path for rel_path in batch if rel_path in states]
+        if not batch:
+            return
+
+        self.logger.info(f"Nowe obrazy do klasyfikacji: {len(batch)}")
+        if isinstance(self.progress_callback, ProgressChannel):
+            # Prędkość i ETA liczone tylko dla tej mikropartii, bez bezczynności między partiami
+            self.progress_callback.reset()
+        try:
+            result = self.processor.run(self.config, self.classifier, self.progress_callback, scan=batch)
+        except Exception as e:
+            self.logger.error(f"Błąd klasyfikacji mikropartii: {e}")
+            result = None
+
+        # Pliki oznaczone stanem sprzed klasyfikacji - ponowna zmiana wywoła ponowną klasyfikację
+        self._processed.update(states)
+
+        if result is None:
+            return
+        self.totals['batches'] += 1
+        for key in self.totals:
+            if key != 'batches':
+                self.totals[key] += result['stats'].get(key, 0)
+        if self.on_batch is not None:
+            self.on_batch(result, dict(self.totals))
+
+
+class _FallbackSource:
+    """Źródło inotify, które przy przekroczeniu limitu obserwacji przechodzi na odpytywanie"""
+
+    def __init__(self, primary, fallback, logger):
+        self.source = primary
+        self.fallback = fallback
+        self.logger = logger
+
+    @property
+    def name(self):
+        return self.source.name
+
+    @property
+    def rescan_needed(self):
+        return getattr(self.source, 'rescan_needed', False)
+
+    @rescan_needed.setter
+    def rescan_needed(self, value):
+        self.source.rescan_needed = value
+
+    def full_scan(self):
+        """Pełne skanowanie bieżącym źródłem (z przejściem na odpytywanie przy błędzie)"""
+        try:
+            return self.source.full_scan()
+        except OSError as e:
+            self._switch(e)
+            return self.source.full_scan()
+
+    def wait(self, timeout):
+        """Zdarzenia z bieżącego źródła"""
+        try:
+            return self.source.wait(timeout)
+        except OSError as e:
+            self._switch(e)
+            return self.source.full_scan(), set()
+
+    def close(self):
+        """Zamyka bieżące źródło"""
+        self.source.close()
+
+    def _switch(self, error):
+        """Przechodzi na odpytywanie katalogów"""
+        if self.source is self.fallback:
+            raise error
+        self.logger.warning(f"inotify: {error} - przejście na sprawdzanie zmian przez odpytywanie")
+        self.source.close()
+        self.source = self.fallback
+
@@ -0,0 +1,84 @@
+from PIL import Image
+
+from .run_profile import measure
+
+# Rozmiar wejścia modelu CLIP (krótszy bok po przeskalowaniu)
+DEFAULT_TARGET_SIZE = 224
+
+# Dekoduj z zapasem względem rozmiaru docelowego, aby końcowe skalowanie
+# bicubic dawało praktycznie ten sam wynik co z pełnej rozdzielczości
+DEFAULT_OVERSAMPLE = 2
+
+# Limit pikseli obrazu przed dekodowaniem (ochrona przed "bombami dekompresyjnymi");
+# 64 Mpx RGB to ~190 MB w pamięci na jeden dekodowany obraz
+DEFAULT_MAX_PIXELS = 64_000_000
+
+# Tryby obsługiwane przez Image.reduce
+_REDUCIBLE_MODES = {'L', 'LA', 'La', 'RGB', 'RGBA', 'RGBa', 'RGBX', 'CMYK', 'YCbCr', 'I', 'F'}
+
+
+class ImageTooLargeError(ValueError):
+    """Obraz przekracza limit pikseli i nie da się go zdekodować w mniejszej skali"""
+
+
+def guard_image_size(image, max_pixels=DEFAULT_MAX_PIXELS, allow_draft=True):
+    """Sprawdza wymiary z nagłówka otwartego (jeszcze niezdekodowanego) obrazu.
+
+    JPEG ponad limitem jest dekodowany w mniejszej skali (draft 1/2 - 1/8),
+    jeśli to wystarcza; inne formaty zgłaszają ImageTooLargeError.
+    """
+    if not max_pixels:
+        return image
+
+    width, height = image.size
+    if width * height <= max_pixels:
+        return image
+
+    if allow_draft and image.format == 'JPEG':
+        for scale in (2, 4, 8):
+            if -(-width // scale) * -(-height // scale) <= max_pixels:
+                image.draft('RGB', (width // scale, height // scale))
+                return image
+
+    raise ImageTooLargeError(f"obraz {width}x{height} przekracza limit {max_pixels} pikseli")
+
+
+def load_image_fast(path, target_size=DEFAULT_TARGET_SIZE, oversample=DEFAULT_OVERSAMPLE, profiler=None,
+                    max_pixels=DEFAULT_MAX_PIXELS):
+    """Wczytuje obraz jako RGB, dekodując go w rozdzielczości zbliżonej do docelowej.
+
+    JPEG jest dekodowany od razu w zmniejszonej skali (draft - skalowanie DCT),
+    pozostałe formaty są po dekodowaniu redukowane całkowitym współczynnikiem
+    (reduce), zanim powstanie kopia RGB. Z plików wieloklatkowych (GIF, TIFF)
+    brana jest tylko pierwsza klatka. Obraz większy niż max_pixels (po skalowaniu
+    JPEG) nie jest dekodowany. Opcjonalny profiler mierzy etapy 'open'
+    (otwarcie i nagłówek) oraz 'decode'.
+    """
+    min_side = target_size * oversample
+
+    with measure(profiler, 'open'):
+        image = Image.open(path)
+
+    with image:
+        with measure(profiler, 'decode'):
+            if getattr(image, 'n_frames', 1) > 1:
+                image.seek(0)
+
+            if image.format == 'JPEG':
+                # Dekoder wybiera największą redukcję, przy której oba boki >= min_side
+                image.draft('RGB', (min_side, min_side))
+            guard_image_size(image, max_pixels, allow_draft=False)
+
+            return reduce_image(image, min_side).convert('RGB')
+
+
+def reduce_image(image, min_side):
+    """Zmniejsza obraz całkowitym współczynnikiem tak, by krótszy bok pozostał >= min_side"""
+    factor = min(image.size) // min_side
+    if factor < 2:
+        return image
+
+    if image.mode not in _REDUCIBLE_MODES:
+        image = image.convert('RGB')
+
+    return image.reduce(factor)
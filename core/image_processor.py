@@ -1,7 +1,40 @@
+import itertools
 import os
-import shutil
+import queue
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .categories import CATEGORY_CLEAN, CATEGORY_CODE, UNCERTAIN_FOLDER, UNCERTAIN_KEY, UNCERTAIN_LABEL
+from .classification_server import DEFAULT_MAX_CONCURRENCY, RemoteClassifierPool
+from .classification_cache import ClassificationCache, CACHE_FILENAME, DEFAULT_MAX_ENTRIES
+from .dedup import DEFAULT_MAX_DISTANCE, find_duplicates
+from .directory_scanner import BackgroundScan, DEFAULT_SCAN_BUFFER, DirectoryScanner, SYMLINKS_FILES
+from .file_placement import FilePlacer, PLACEMENT_COPY
+from .placement_plan import PlacementPlan
+from .progress import as_progress_channel
+from .results_store import ResultsStore, plan_results_folder
+from .run_profile import (DEFAULT_TRACE_IMAGES, PROFILE_FILENAME, RunProfiler, capture_trace, measure,
+                          system_info, write_profile)
+from .process_pool import ProcessPoolClassifier, PREFILTER_RESULT
+from .run_journal import RunJournal
+
+# Znacznik końca strumienia w kolejkach potoku
+_END_OF_STREAM = object()
+
+# Ustawienia zapisywane w profilu przebiegu
+_PROFILED_CONFIG_KEYS = ('batch_size', 'decode_workers', 'io_workers', 'process_workers', 'threads_per_worker',
+                         'placement_mode', 'use_cache', 'dedup', 'confidence_threshold')
+
+# Nazwy wbudowanych kategorii w podsumowaniu: (statystyki, foldery)
+_CATEGORY_TITLES = {CATEGORY_CLEAN: ("Czyste obrazy", "Czyste"), CATEGORY_CODE: ("Screenshoty kodu", "Kod")}
+
+# Domyślna liczba wątków dekodujących i kopiujących
+DEFAULT_DECODE_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_IO_WORKERS = 4
+
+# Domyślny limit obrazów w toku (zdekodowanych lub w shardach) jako wielokrotność partii
+DEFAULT_IN_FLIGHT_BATCHES = 4
 
 
 class ImageProcessor:
@@ -23,123 +56,720 @@ class ImageProcessor:
 
     def _process_images_thread(self, config, classifier, progress_callback, complete_callback):
         """Główna logika przetwarzania obrazów"""
+        try:
+            result = self.run(config, classifier, progress_callback)
+
+            if result is None:
+                complete_callback("Nie znaleziono obrazów w wybranym folderze!")
+                return
+
+            # Przygotuj podsumowanie
+            result_message = self._create_summary_message(
+                result['stats'], result['elapsed_time'], result['folders'], classifier.categories
+            )
+            complete_callback(result_message)
+
+        except Exception as e:
+            error_msg = f"Wystąpił błąd podczas klasyfikacji: {str(e)}"
+            self.logger.error(error_msg)
+            complete_callback(error_msg)
+
+    def run(self, config, classifier, progress_callback, scan=None):
+        """Przetwarza obrazy w bieżącym wątku.
+
+        `progress_callback` to ProgressChannel albo funkcja (value, status_text).
+        `scan` to opcjonalne skanowanie uruchomione wcześniej przez start_scan
+        (np. równolegle z ładowaniem modelu). Zwraca słownik z kluczami 'stats',
+        'elapsed_time' i 'folders' albo None, jeśli w folderze wejściowym nie ma obrazów.
+        Klucze 'folders' i liczniki w 'stats' to stat_key kategorii klasyfikatora
+        oraz 'uncertain_images'. Przy config['plan_path'] pliki nie są umieszczane -
+        przebieg zapisuje plan do późniejszego wykonania (apply_plan).
+        """
+        cache = None
+        journal = None
+        results = None
+        plan = None
+        previous_profiler = getattr(classifier, 'profiler', None)
         try:
             start_time = time.time()
             input_folder = config['input_folder']
             output_folder = config['output_folder']
             confidence_threshold = config['confidence_threshold']
-            verbose_logs = config['verbose_logs']
 
             self.logger.info(f"Rozpoczęcie klasyfikacji w folderze: {input_folder}")
             self.logger.info(f"Folder wyjściowy: {output_folder}")
             self.logger.info(f"Próg pewności: {confidence_threshold}")
-
-            # Utwórz foldery wyjściowe
-            clean_folder = os.path.join(output_folder, "clean_images")
-            code_folder = os.path.join(output_folder, "code_screenshots")
-            uncertain_folder = os.path.join(output_folder, "uncertain_images")
-
-            for folder in [clean_folder, code_folder, uncertain_folder]:
-                if not os.path.exists(folder):
-                    os.makedirs(folder)
-                    self.logger.info(f"Utworzono folder: {folder}")
-
-            # Znajdź wszystkie pliki obrazów
-            image_files = self._find_image_files(input_folder)
-
-            if not image_files:
-                error_msg = "Nie znaleziono obrazów w wybranym folderze!"
-                self.logger.warning(error_msg)
-                complete_callback(error_msg)
-                return
-
-            self.logger.info(f"Znaleziono {len(image_files)} obrazów do klasyfikacji")
+            self.logger.info(f"Rozmiar partii: {config.get('batch_size', 16)}")
+            self.logger.info(f"Sposób umieszczania plików: {config.get('placement_mode', PLACEMENT_COPY)}")
+
+            # Utwórz foldery wyjściowe - po jednym na kategorię i wspólny na niepewne
+            folders = {category.stat_key: os.path.join(output_folder, category.folder)
+                       for category in classifier.categories}
+            folders[UNCERTAIN_KEY] = os.path.join(output_folder, UNCERTAIN_FOLDER)
+
+            # Opcjonalny folder na dokładne duplikaty
+            if config.get('dedup', False) and config.get('duplicates_folder', False):
+                folders['duplicate_images'] = os.path.join(output_folder, "duplicates")
+
+            # Tryb planowania: foldery wyjściowe tworzy dopiero wykonanie planu
+            plan_path = config.get('plan_path')
+            if plan_path:
+                plan = PlacementPlan(plan_path, input_folder, output_folder,
+                                     config.get('placement_mode', PLACEMENT_COPY), self.logger)
+            else:
+                for folder in folders.values():
+                    if not os.path.exists(folder):
+                        os.makedirs(folder)
+                        self.logger.info(f"Utworzono folder: {folder}")
+
+            # Profil przebiegu: czasy etapów ścieżki obrazu i opcjonalny ślad próbki
+            system_start = system_info()
+            trace_path = self._capture_trace(config, classifier)
+            profiler = RunProfiler() if config.get('write_profile', True) else None
+            classifier.profiler = profiler
+
+            # Strumień plików obrazów - przetwarzanie rusza przed końcem listowania
+            if scan is None:
+                scan = self.start_scan(config)
+            image_files = iter(scan)
+
+            # Dziennik przebiegu - pomiń pliki gotowe w przerwanym przebiegu
+            resume_state = {'skipped': 0}
+            if config.get('resume', True) and plan is None:
+                journal = RunJournal(input_folder, output_folder, self.logger)
+                if journal.load():
+                    image_files = self._skip_completed(image_files, input_folder, journal, resume_state)
+
+            # Cache wyników - inferencja tylko dla nowych lub zmienionych plików
+            cache = self._open_cache(config, classifier)
+
+            # Zapis prawdopodobieństw i embeddingów - późniejsze przesortowanie bez inferencji
+            results = self._open_results(config, classifier)
 
             # Przetwórz obrazy
             stats = self._classify_and_move_images(
-                image_files, input_folder, clean_folder, code_folder, uncertain_folder,
-                classifier, confidence_threshold, verbose_logs, progress_callback
+                image_files, input_folder, folders, classifier, config, progress_callback, cache, journal, profiler,
+                results, plan
             )
+            stats['resumed'] = resume_state['skipped']
+
+            if stats['total_images'] == 0 and stats['resumed'] == 0:
+                self.logger.warning("Nie znaleziono obrazów w wybranym folderze!")
+                if journal is not None:
+                    journal.finish()
+                    journal = None
+                return None
+
+            # Przebieg zakończony - dziennik nie jest już potrzebny
+            if journal is not None:
+                journal.finish()
+                journal = None
+            if plan is not None:
+                plan.finish()
 
-            # Przygotuj podsumowanie
             elapsed_time = time.time() - start_time
-            result_message = self._create_summary_message(stats, elapsed_time,
-                                                          clean_folder, code_folder, uncertain_folder)
-
-            self._log_summary(stats, elapsed_time)
-            complete_callback(result_message)
+            self._log_summary(stats, elapsed_time, classifier.categories)
+
+            result = {'stats': stats, 'elapsed_time': elapsed_time, 'folders': folders}
+            if plan is not None:
+                result['plan_path'] = plan.path
+            if profiler is not None:
+                result['profile_path'] = self._write_run_profile(
+                    config, classifier, stats, elapsed_time, profiler, system_start, trace_path
+                )
+            return result
+
+        finally:
+            classifier.profiler = previous_profiler
+            if cache is not None:
+                cache.close()
+            if results is not None:
+                results.close()
+            if journal is not None:
+                journal.close()
+            if plan is not None:
+                plan.close()
+            if isinstance(scan, BackgroundScan):
+                scan.close()
+
+    def _capture_trace(self, config, classifier):
+        """Opcjonalnie zapisuje ślad cProfile / torch.profiler dla próbki obrazów"""
+        kind = config.get('profile_trace')
+        if not kind:
+            return None
+        if not classifier.is_loaded():
+            self.logger.warning("Ślad wykonania pominięty - model nie jest załadowany w tym procesie")
+            return None
+
+        count = int(config.get('profile_trace_images', DEFAULT_TRACE_IMAGES))
+        sample = itertools.islice(self.create_scanner(config).scan(config['input_folder']), count)
+        paths = [os.path.join(config['input_folder'], filename) for filename in sample]
+        if not paths:
+            return None
 
+        try:
+            return capture_trace(kind, classifier, paths, int(config.get('batch_size', 16)),
+                                 self._state_folder(config), self.logger)
         except Exception as e:
-            error_msg = f"Wystąpił błąd podczas klasyfikacji: {str(e)}"
-            self.logger.error(error_msg)
-            complete_callback(error_msg)
+            self.logger.warning(f"Nie udało się zapisać śladu wykonania: {e}")
+            return None
+
+    def _write_run_profile(self, config, classifier, stats, elapsed_time, profiler, system_start, trace_path):
+        """Zapisuje profil przebiegu (JSON) w folderze wyjściowym i zwraca jego ścieżkę"""
+        options = classifier.get_options()
+        system = system_start
+        if 'load_average' in system:
+            system['load_average_end'] = system_info().get('load_average')
+
+        profile = {
+            'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'elapsed_s': round(elapsed_time, 3),
+            'images_per_second': round(stats['total_images'] / elapsed_time, 3) if elapsed_time > 0 else 0.0,
+            'stats': stats,
+            'config': {key: config.get(key) for key in _PROFILED_CONFIG_KEYS if key in config},
+            'classifier': {key: options.get(key) for key in ('model_name', 'backend', 'onnx_quantize',
+                                                             'fast_decode')},
+            'system': system,
+            'stages': profiler.snapshot(),
+            'trace': trace_path
+        }
 
-    def _find_image_files(self, folder):
-        """Znajduje wszystkie pliki obrazów w folderze"""
-        image_files = []
+        path = os.path.join(self._state_folder(config), PROFILE_FILENAME)
         try:
-            for file in os.listdir(folder):
-                if os.path.splitext(file.lower())[1] in self.image_extensions:
-                    image_files.append(file)
+            write_profile(path, profile)
+        except OSError as e:
+            self.logger.warning(f"Nie można zapisać profilu przebiegu: {e}")
+            return None
+        self.logger.info(f"Profil przebiegu: {path}")
+        return path
+
+    @staticmethod
+    def _state_folder(config):
+        """Folder na cache i profil: wyjściowy, a w trybie planowania - folder pliku planu"""
+        if config.get('plan_path'):
+            return os.path.dirname(os.path.abspath(config['plan_path']))
+        return config['output_folder']
+
+    def _open_cache(self, config, classifier):
+        """Otwiera trwały cache klasyfikacji (domyślnie w folderze wyjściowym)"""
+        if not config.get('use_cache', True):
+            return None
+
+        cache_path = config.get('cache_path') or os.path.join(self._state_folder(config), CACHE_FILENAME)
+        try:
+            cache = ClassificationCache(
+                cache_path,
+                classifier.cache_signature(),
+                self.logger,
+                max_entries=config.get('cache_max_entries', DEFAULT_MAX_ENTRIES),
+                use_content_hash=config.get('cache_content_hash', False)
+            )
+            self.logger.info(f"Cache klasyfikacji: {cache_path}")
+            return cache
         except Exception as e:
-            self.logger.error(f"Błąd podczas przeszukiwania folderu {folder}: {e}")
-
-        return image_files
-
-    def _classify_and_move_images(self, image_files, input_folder, clean_folder,
-                                  code_folder, uncertain_folder, classifier,
-                                  confidence_threshold, verbose_logs, progress_callback):
-        """Klasyfikuje i przenosi obrazy do odpowiednich folderów"""
-        stats = {
-            'clean_images': 0,
-            'code_images': 0,
-            'uncertain_images': 0,
-            'total_images': len(image_files),
-            'errors': 0
-        }
+            self.logger.warning(f"Nie można otworzyć cache klasyfikacji ({e}), praca bez cache")
+            return None
+
+    def _open_results(self, config, classifier):
+        """Otwiera kolumnowy zapis wyników przebiegu w folderze wyjściowym (w trybie planowania - obok planu)"""
+        if not config.get('save_results', True):
+            return None
+
+        # Wyniki planu trafiają do folderu wyjściowego dopiero przy jego wykonaniu (merge_plan_results)
+        plan_path = config.get('plan_path')
+        results = ResultsStore(config['output_folder'], classifier.categories, classifier.cache_signature(),
+                               self.logger, folder=plan_results_folder(plan_path) if plan_path else None)
+        try:
+            # Plan opisuje jeden przebieg - wyniki poprzedniego planu o tej nazwie są zastępowane
+            results.open(fresh=bool(plan_path))
+            return results
+        except OSError as e:
+            results.close()
+            self.logger.warning(f"Nie można zapisywać wyników przebiegu ({e}), praca bez zapisu")
+            return None
+
+    def create_scanner(self, config):
+        """Tworzy skaner folderu wejściowego według konfiguracji"""
+        return DirectoryScanner(
+            self.image_extensions,
+            include=config.get('include_patterns'),
+            exclude=config.get('exclude_patterns'),
+            symlinks=config.get('symlinks', SYMLINKS_FILES),
+            max_depth=config.get('max_depth'),
+            # Folder wyjściowy wewnątrz wejściowego nie może trafić do skanowania
+            skip_dirs=[config['output_folder']] if config.get('output_folder') else None,
+            logger=self.logger
+        )
 
-        for i, filename in enumerate(image_files):
+    def start_scan(self, config):
+        """Rozpoczyna skanowanie folderu wejściowego w tle"""
+        return BackgroundScan(self.create_scanner(config), config['input_folder'],
+                              max_buffered=int(config.get('scan_buffer') or DEFAULT_SCAN_BUFFER))
+
+    def _find_image_files(self, folder, config=None):
+        """Znajduje wszystkie pliki obrazów w folderze (ścieżki względne)"""
+        config = dict(config or {}, input_folder=folder)
+        return list(self.create_scanner(config).scan(folder))
+
+    def _skip_completed(self, image_files, input_folder, journal, resume_state):
+        """Pomija pliki zapisane w dzienniku przerwanego przebiegu"""
+        for filename in image_files:
+            if journal.is_completed(filename, os.path.join(input_folder, filename)):
+                resume_state['skipped'] += 1
+                continue
+            yield filename
+
+    def _classify_and_move_images(self, image_files, input_folder, folders, classifier,
+                                  config, progress_callback, cache=None, journal=None, profiler=None, results=None,
+                                  plan=None):
+        """Klasyfikuje i kopiuje obrazy potokiem: dekodowanie -> inferencja -> zapis.
+
+        Etapy połączone są ograniczonymi kolejkami: pula wątków dekoduje obrazy
+        z wyprzedzeniem, bieżący wątek wykonuje inferencję partiami, a osobna
+        pula wątków umieszcza pliki, więc dysk i model pracują jednocześnie.
+        Przy process_workers > 1 dekodowanie i inferencję wykonują procesy robocze,
+        a przy classification_server - lokalny serwer z załadowanym modelem.
+        """
+        batch_size = max(1, int(config.get('batch_size', 16)))
+        decode_workers = max(1, int(config.get('decode_workers', DEFAULT_DECODE_WORKERS)))
+        io_workers = max(1, int(config.get('io_workers', DEFAULT_IO_WORKERS)))
+        process_workers = max(1, int(config.get('process_workers', 1)))
+
+        # Limit obrazów w toku - nie mniejszy niż partia, inaczej inferencja czekałaby w nieskończoność.
+        # Procesy robocze i serwer potrzebują ~3 shardów na wykonawcę (2 w kolejce, 1 w trakcie)
+        parallel = DEFAULT_MAX_CONCURRENCY if config.get('classification_server') else process_workers
+        default_in_flight = batch_size * max(DEFAULT_IN_FLIGHT_BATCHES, 3 * parallel)
+        max_in_flight = max(batch_size, int(config.get('max_in_flight') or default_in_flight))
+
+        stats = {category.stat_key: 0 for category in classifier.categories}
+        stats.update({
+            UNCERTAIN_KEY: 0,
+            'total_images': 0,
+            'errors': 0,
+            'cache_hits': 0,
+            'prefiltered': 0,
+            'duplicate_groups': 0,
+            'duplicates': 0,
+            'exact_duplicates': 0,
+            'duplicate_images': 0
+        })
+        run = _PipelineRun(config, classifier, folders, stats, as_progress_channel(progress_callback), cache,
+                           journal, batch_size, max_in_flight)
+        run.profiler = profiler
+        run.results = results
+        run.plan = plan
+        run.use_prefilter = self._prefilter_enabled(classifier, config['confidence_threshold'])
+        run.placer = FilePlacer(config.get('placement_mode', PLACEMENT_COPY), self.logger)
+        image_files = run.count_files(image_files)
+
+        # Deduplikacja - klasyfikowany jest tylko jeden reprezentant każdej grupy
+        if config.get('dedup', False):
+            self.logger.info("Deduplikacja wymaga pełnej listy plików - oczekiwanie na koniec skanowania")
+            groups = find_duplicates(
+                list(image_files), input_folder, self.logger,
+                max_distance=int(config.get('dedup_distance', DEFAULT_MAX_DISTANCE)),
+                workers=decode_workers
+            )
+            image_files = groups.representatives
+            run.duplicates = groups.duplicates
+            stats['duplicate_groups'] = groups.group_count
+            stats['duplicates'] = groups.duplicate_count
+            stats['exact_duplicates'] = groups.exact_count
+
+        placers = []
+        for _ in range(io_workers):
+            placer = threading.Thread(target=self._placement_worker, args=(run,))
+            placer.daemon = True
+            placers.append(placer)
+
+        for placer in placers:
+            placer.start()
+
+        try:
+            server = config.get('classification_server')
+            if server:
+                self.logger.info(f"Potok: serwer klasyfikacji {server}, {io_workers} wątków zapisu")
+                pool = RemoteClassifierPool(server, self.logger, use_prefilter=run.use_prefilter,
+                                            profiler=run.profiler)
+                self._run_remote_stage(run, image_files, input_folder, pool)
+            elif process_workers > 1:
+                self.logger.info(f"Potok: {process_workers} procesów roboczych, {io_workers} wątków zapisu")
+                self._run_remote_stage(run, image_files, input_folder,
+                                       self._create_process_pool(run, process_workers))
+            else:
+                self.logger.info(f"Potok: {decode_workers} wątków dekodujących, {io_workers} wątków zapisu")
+                self._run_thread_stage(run, image_files, input_folder, decode_workers)
+        finally:
+            # Przy błędzie zatrzymaj pozostałe etapy; zapis zawsze kończy zaległe zadania
+            run.stop_event.set()
+            for _ in placers:
+                run.end_markers += 1
+                run.place_queue.put(_END_OF_STREAM)
+            for placer in placers:
+                placer.join()
+
+        # Końcowy stan zawsze trafia do odbiorcy, niezależnie od ograniczenia częstotliwości
+        run.progress.publish(run.done, stats['total_images'], True, force=True)
+        return stats
+
+    def _prefilter_enabled(self, classifier, confidence_threshold):
+        """Sprawdza, czy kaskada filtra wstępnego może być użyta w tym przebiegu"""
+        prefilter = getattr(classifier, 'prefilter', None)
+        if prefilter is None:
+            return False
+
+        # Kaskada rozstrzyga tylko kod / zwykły obraz - inne kategorie zostałyby pominięte
+        if not classifier.prefilter_supported():
+            self.logger.warning(f"Filtr wstępny wyłączony: działa tylko z kategoriami "
+                                f"'{CATEGORY_CODE}' i '{CATEGORY_CLEAN}'")
+            return False
+
+        # Decyzje kaskady poniżej progu trafiłyby do niepewnych - wtedy lepiej zapytać CLIP
+        if prefilter.confidence < confidence_threshold:
+            self.logger.warning(f"Filtr wstępny wyłączony: jego pewność ({prefilter.confidence:.2f}) "
+                                f"jest niższa niż próg pewności ({confidence_threshold:.2f})")
+            return False
+
+        self.logger.info("Filtr wstępny włączony - oczywiste obrazy pomijają CLIP")
+        return True
+
+    def _run_thread_stage(self, run, image_files, input_folder, decode_workers):
+        """Dekodowanie w puli wątków i inferencja partiami w bieżącym wątku"""
+        decode_queue = queue.Queue(maxsize=run.max_in_flight)
+        run.backlog_sources['decode'] = decode_queue.qsize
+        decode_pool = ThreadPoolExecutor(max_workers=decode_workers)
+        feed = {'error': None}
+
+        feeder = threading.Thread(
+            target=self._feed_decoder,
+            args=(run, image_files, input_folder, decode_pool, decode_queue, feed)
+        )
+        feeder.daemon = True
+        feeder.start()
+
+        try:
+            self._run_inference_stage(run, decode_queue)
+            # Błąd skanowania lub cache w wątku zasilającym przerywa przebieg w wątku głównym
+            if feed['error'] is not None:
+                raise feed['error']
+        finally:
+            run.stop_event.set()
+            feeder.join()
+            decode_pool.shutdown(wait=True)
+
+    def _put(self, target_queue, item, stop_event):
+        """Wstawia element do kolejki, przerywając oczekiwanie po zatrzymaniu potoku"""
+        while not stop_event.is_set():
             try:
+                target_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _feed_decoder(self, run, image_files, input_folder, decode_pool, decode_queue, feed):
+        """Etap 1: zleca dekodowanie obrazów w puli wątków, zachowując kolejność.
+
+        Błąd zapisuje w feed['error']; znacznik końca trafia do kolejki zawsze,
+        inaczej etap inferencji czekałby w nieskończoność.
+        """
+        try:
+            for filename in image_files:
                 file_path = os.path.join(input_folder, filename)
 
-                # Aktualizuj progress bar
-                progress_value = (i + 1) / stats['total_images'] * 100
-                progress_callback(progress_value, f"Przetwarzanie: {i + 1}/{stats['total_images']}")
+                # Trafienie w cache - plik nie wymaga dekodowania ani inferencji
+                cached = self._lookup_cache(run, file_path)
+                future = None
+                if cached is None:
+                    # Backpressure: nowe dekodowanie dopiero, gdy inferencja zwolni miejsce
+                    if not run.acquire_slot():
+                        return
+                    future = decode_pool.submit(run.classifier.prepare_or_prefilter, file_path,
+                                                run.use_prefilter)
+
+                if not self._put(decode_queue, (filename, file_path, future, cached), run.stop_event):
+                    if future is not None:
+                        future.cancel()
+                    return
+        except Exception as e:
+            feed['error'] = e
+        finally:
+            self._put(decode_queue, _END_OF_STREAM, run.stop_event)
+
+    def _run_inference_stage(self, run, decode_queue):
+        """Etap 2: zbiera zdekodowane obrazy w partie i uruchamia model"""
+        batch = []
+        while True:
+            item = decode_queue.get()
+            if item is _END_OF_STREAM:
+                break
+
+            filename, file_path, future, cached = item
+            if cached is not None:
+                self._place_cached(run, filename, file_path, cached)
+                continue
+
+            batch.append((filename, file_path, future))
+            if len(batch) >= run.batch_size:
+                self._classify_and_release(run, batch)
+                batch = []
 
-                # Klasyfikuj przez CLIP
-                is_code, confidence, details = classifier.classify_image(file_path, verbose_logs)
+        if batch:
+            self._classify_and_release(run, batch)
 
-                # Zdecyduj o klasyfikacji na podstawie pewności
-                if confidence >= confidence_threshold:
-                    if is_code:
-                        dest_folder = code_folder
-                        stats['code_images'] += 1
-                        category = "KOD"
-                    else:
-                        dest_folder = clean_folder
-                        stats['clean_images'] += 1
-                        category = "CZYSTE"
-                else:
-                    dest_folder = uncertain_folder
-                    stats['uncertain_images'] += 1
-                    category = "NIEPEWNE"
+    def _classify_and_release(self, run, batch):
+        """Klasyfikuje partię i zwalnia jej miejsca w limicie obrazów w toku"""
+        try:
+            self._classify_pipeline_batch(run, batch)
+        finally:
+            run.release_slots(len(batch))
+
+    def _lookup_cache(self, run, file_path):
+        """Szuka wyniku pliku w cache (None przy braku cache lub trafienia)"""
+        if run.cache is None:
+            return None
+        with measure(run.profiler, 'cache_lookup'):
+            return run.cache.lookup(file_path)
+
+    def _place_cached(self, run, filename, file_path, cached):
+        """Przekazuje do zapisu plik, którego wynik pochodzi z cache"""
+        prompt_probs, embedding = cached
+        result = run.classifier.result_from_probs(prompt_probs, file_path, run.config['verbose_logs'], embedding)
+        with run.stats_lock:
+            run.stats['cache_hits'] += 1
+        self._enqueue_placement(run, filename, file_path, result)
+
+    def _classify_pipeline_batch(self, run, batch):
+        """Klasyfikuje jedną partię i przekazuje pliki do etapu zapisu"""
+        results = [(False, 0.0, {})] * len(batch)
+
+        indices = []
+        prepared = []
+        for index, (filename, file_path, future) in enumerate(batch):
+            try:
+                # Czas oczekiwania na dekodowanie - wysoki oznacza, że inferencja czeka na dysk/CPU
+                with measure(run.profiler, 'decode_wait'):
+                    values, shortcut = future.result()
+            except Exception as e:
+                self.logger.error(f"Błąd klasyfikacji {file_path}: {e}")
+                continue
 
-                # Skopiuj plik
-                dest_path = os.path.join(dest_folder, filename)
-                shutil.copy2(file_path, dest_path)
+            if shortcut is not None:
+                # Rozstrzygnięte przez filtr wstępny - bez inferencji i bez zapisu w cache
+                results[index] = self._count_prefiltered(run, file_path, shortcut)
+                continue
+
+            prepared.append(values)
+            indices.append(index)
+
+        if prepared:
+            names = [batch[index][1] for index in indices]
+            batch_results = run.classifier.classify_prepared(prepared, names, run.config['verbose_logs'])
+            for index, result in zip(indices, batch_results):
+                results[index] = result
+                self._store_in_cache(run, batch[index][1], result)
+
+        for (filename, file_path, _), result in zip(batch, results):
+            self._enqueue_placement(run, filename, file_path, result)
+
+    def _count_prefiltered(self, run, file_path, result):
+        """Zlicza (i opcjonalnie loguje) wynik rozstrzygnięty przez filtr wstępny"""
+        if run.config['verbose_logs']:
+            run.classifier.log_prefiltered(file_path, result)
+        with run.stats_lock:
+            run.stats['prefiltered'] += 1
+        return result
+
+    def _store_in_cache(self, run, file_path, result):
+        """Zapisuje świeży wynik klasyfikacji w cache"""
+        details = result[2]
+        if run.cache is not None and details.get('prompt_probs') is not None:
+            run.cache.store(file_path, details['prompt_probs'], details.get('embedding'))
+
+    def _create_process_pool(self, run, process_workers):
+        """Tworzy pulę procesów roboczych z ustawieniami klasyfikatora"""
+        options = run.classifier.get_options()
+        if not run.use_prefilter:
+            options['prefilter'] = None
+
+        return ProcessPoolClassifier(
+            options, process_workers, self.logger,
+            threads_per_worker=run.config.get('threads_per_worker'),
+            profiler=run.profiler
+        )
 
-                if not verbose_logs:  # Krótkie logi jeśli verbose wyłączone
-                    if i % 50 == 0 or i == stats['total_images'] - 1:  # Co 50 plików lub ostatni
-                        self.logger.info(f"Przetworzono {i + 1}/{stats['total_images']} obrazów...")
+    def _run_remote_stage(self, run, image_files, input_folder, pool):
+        """Rozdziela pliki na shardy między procesy robocze (lub serwer) i odbiera ich wyniki"""
+        pool.start()
 
+        shards = {}
+        run.backlog_sources['inference'] = lambda: sum(len(items) for items in list(shards.values()))
+        dispatch = {'sent': 0, 'error': None}
+        dispatched = threading.Event()
+
+        def dispatcher():
+            try:
+                pending = []
+                for filename in image_files:
+                    if run.stop_event.is_set():
+                        return
+                    file_path = os.path.join(input_folder, filename)
+
+                    cached = self._lookup_cache(run, file_path)
+                    if cached is not None:
+                        self._place_cached(run, filename, file_path, cached)
+                        continue
+
+                    if not run.acquire_slot():
+                        return
+                    pending.append((filename, file_path))
+                    if len(pending) >= run.batch_size:
+                        self._submit_shard(run, pool, shards, dispatch, pending)
+                        pending = []
+
+                if pending:
+                    self._submit_shard(run, pool, shards, dispatch, pending)
             except Exception as e:
-                self.logger.error(f"Błąd przetwarzania {filename}: {e}")
-                stats['errors'] += 1
+                dispatch['error'] = e
+            finally:
+                dispatched.set()
+
+        dispatcher_thread = threading.Thread(target=dispatcher)
+        dispatcher_thread.daemon = True
+        dispatcher_thread.start()
+
+        try:
+            received = 0
+            while not (dispatched.is_set() and received >= dispatch['sent']):
+                message = pool.get_result(timeout=0.5)
+                if message is None:
+                    continue
+
+                shard_id, payload = message
+                items = shards.pop(shard_id)
+                run.release_slots(len(items))
+                for (filename, file_path), raw in zip(items, payload):
+                    if raw is None:
+                        self.logger.error(f"Błąd klasyfikacji {file_path}")
+                        result = (False, 0.0, {})
+                    elif raw[0] == PREFILTER_RESULT:
+                        result = self._count_prefiltered(run, file_path, raw[1])
+                    else:
+                        prompt_probs, embedding = raw
+                        result = run.classifier.result_from_probs(prompt_probs, file_path,
+                                                                  run.config['verbose_logs'], embedding)
+                        self._store_in_cache(run, file_path, result)
+                    self._enqueue_placement(run, filename, file_path, result)
+                received += 1
+
+            if dispatch['error'] is not None:
+                raise dispatch['error']
+        finally:
+            run.stop_event.set()
+            dispatcher_thread.join()
+            pool.close()
+
+    def _submit_shard(self, run, pool, shards, dispatch, items):
+        """Wysyła shard do procesów roboczych, czekając na miejsce w kolejce"""
+        shard_id = dispatch['sent']
+        shards[shard_id] = items
+        while not run.stop_event.is_set():
+            try:
+                pool.submit(shard_id, [file_path for _, file_path in items], timeout=0.1)
+                dispatch['sent'] += 1
+                return
+            except queue.Full:
                 continue
+        shards.pop(shard_id, None)
+
+    def _enqueue_placement(self, run, filename, file_path, result):
+        """Przekazuje sklasyfikowany plik do etapu zapisu"""
+        stat_key, category = self._choose_category(run, result)
+        job = (filename, file_path, run.folders[stat_key], stat_key, category, result)
+        self._put(run.place_queue, job, run.stop_event)
+
+        # Duplikaty przejmują wynik reprezentanta; dokładne mogą trafić do osobnego folderu
+        for duplicate_name, duplicate_path, exact in run.duplicates.get(filename, ()):
+            if exact and 'duplicate_images' in run.folders:
+                job = (duplicate_name, duplicate_path, run.folders['duplicate_images'], 'duplicate_images',
+                       "DUPLIKAT", None)
+            else:
+                job = (duplicate_name, duplicate_path, run.folders[stat_key], stat_key, category, result)
+            self._put(run.place_queue, job, run.stop_event)
+
+    def _choose_category(self, run, result):
+        """Zwraca klucz statystyk i etykietę kategorii dla wyniku klasyfikacji"""
+        is_code, confidence, details = result
+        name = details.get('category') or (CATEGORY_CODE if is_code else CATEGORY_CLEAN)
+        category = run.categories.get(name)
+
+        # Zdecyduj o klasyfikacji na podstawie pewności
+        if category is not None and confidence >= run.config['confidence_threshold']:
+            return category.stat_key, category.label
+        return UNCERTAIN_KEY, UNCERTAIN_LABEL
+
+    def _placement_worker(self, run):
+        """Etap 3: umieszcza sklasyfikowane pliki w folderach docelowych (kopia, link lub przeniesienie)"""
+        verbose_logs = run.config['verbose_logs']
+        stats = run.stats
+
+        while True:
+            job = run.place_queue.get()
+            if job is _END_OF_STREAM:
+                break
+
+            filename, file_path, dest_folder, stat_key, category, result = job
+            try:
+                with run.stats_lock:
+                    stats[stat_key] += 1
 
-        return stats
+                dest_path = os.path.join(dest_folder, filename)
+                if run.plan is not None:
+                    # Tryb planowania - tylko wpis w planie, bez operacji na plikach
+                    run.plan.add(filename, dest_path, stat_key, category, result[1] if result is not None else 1.0)
+                    self._record_result(run, filename, dest_path, result)
+                else:
+                    self._place_file(run, filename, file_path, dest_path, category, result)
 
-    def _create_summary_message(self, stats, elapsed_time, clean_folder, code_folder, uncertain_folder):
+            except Exception as e:
+                self.logger.error(f"Błąd przetwarzania {filename}: {e}")
+                with run.stats_lock:
+                    stats['errors'] += 1
+
+            with run.stats_lock:
+                run.done += 1
+                done = run.done
+                total = stats['total_images']
+
+            # Tylko zapis stanu - interfejs odczytuje go we własnym tempie
+            run.progress.publish(done, total, run.listing_done, run.backlog())
+
+            if not verbose_logs:  # Krótkie logi jeśli verbose wyłączone
+                if done % 50 == 1 or done == total:  # Co 50 plików lub ostatni
+                    self.logger.info(f"Przetworzono {done}/{total} obrazów...")
+
+    def _place_file(self, run, filename, file_path, dest_path, category, result):
+        """Umieszcza plik wybranym sposobem, zachowując podfoldery względem folderu wejściowego"""
+        if os.path.dirname(filename):
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        with measure(run.profiler, 'place'):
+            run.placer.place(file_path, dest_path)
+
+        # Zapisz postęp - po awarii plik nie będzie przetwarzany ponownie
+        if run.journal is not None:
+            with measure(run.profiler, 'journal'):
+                run.journal.record(filename, file_path, dest_path, category)
+
+        self._record_result(run, filename, dest_path, result)
+
+    def _record_result(self, run, filename, dest_path, result):
+        """Dopisuje wynik pliku do zapisu wyników przebiegu"""
+        # Dokładne duplikaty w osobnym folderze nie biorą udziału w przesortowaniu
+        if run.results is not None and result is not None:
+            with measure(run.profiler, 'results'):
+                run.results.append(filename, dest_path, result)
+
+    def _create_summary_message(self, stats, elapsed_time, folders, categories):
         """Tworzy wiadomość podsumowującą"""
         speed = stats['total_images'] / elapsed_time if elapsed_time > 0 else 0
 
@@ -147,35 +777,124 @@ class ImageProcessor:
             f"✅ Klasyfikacja AI zakończona!\n\n"
             f"📊 STATYSTYKI:\n"
             f"• Przetworzono: {stats['total_images']} obrazów\n"
-            f"• Czyste obrazy: {stats['clean_images']}\n"
-            f"• Screenshoty kodu: {stats['code_images']}\n"
-            f"• Niepewne (niska pewność): {stats['uncertain_images']}\n"
         )
+        for category in categories:
+            title = _CATEGORY_TITLES.get(category.name, (category.name, category.name))[0]
+            message += f"• {title}: {stats[category.stat_key]}\n"
+        message += f"• Niepewne (niska pewność): {stats[UNCERTAIN_KEY]}\n"
 
         if stats['errors'] > 0:
             message += f"• Błędy: {stats['errors']}\n"
 
+        if stats.get('cache_hits', 0) > 0:
+            message += f"• Z cache (bez inferencji): {stats['cache_hits']}\n"
+
+        if stats.get('duplicates', 0) > 0:
+            message += (f"• Duplikaty (wynik z reprezentanta): {stats['duplicates']} "
+                        f"w {stats['duplicate_groups']} grupach\n")
+
+        if stats.get('duplicate_images', 0) > 0:
+            message += f"• Dokładne duplikaty w osobnym folderze: {stats['duplicate_images']}\n"
+
+        if stats.get('prefiltered', 0) > 0:
+            share = stats['prefiltered'] / stats['total_images'] * 100
+            message += f"• Filtr wstępny (bez CLIP): {stats['prefiltered']} ({share:.0f}%)\n"
+
+        if stats.get('resumed', 0) > 0:
+            message += f"• Pominięte (gotowe w przerwanym przebiegu): {stats['resumed']}\n"
+
+        message += f"• Czas: {elapsed_time:.1f}s ({speed:.1f} img/s)\n\n📁 FOLDERY:\n"
+        for category in categories:
+            title = _CATEGORY_TITLES.get(category.name, (category.name, category.name))[1]
+            message += f"• {title}: {folders[category.stat_key]}\n"
         message += (
-            f"• Czas: {elapsed_time:.1f}s ({speed:.1f} img/s)\n\n"
-            f"📁 FOLDERY:\n"
-            f"• Czyste: {clean_folder}\n"
-            f"• Kod: {code_folder}\n"
-            f"• Niepewne: {uncertain_folder}\n\n"
-            f"💡 TIP: Sprawdź folder 'uncertain_images'\n"
+            f"• Niepewne: {folders[UNCERTAIN_KEY]}\n\n"
+            f"💡 TIP: Sprawdź folder '{UNCERTAIN_FOLDER}'\n"
             f"jeśli chcesz ręcznie sklasyfikować obrazy\n"
             f"o niskiej pewności AI."
         )
 
         return message
 
-    def _log_summary(self, stats, elapsed_time):
+    def _log_summary(self, stats, elapsed_time, categories):
         """Loguje podsumowanie przetwarzania"""
         self.logger.info("=== PODSUMOWANIE KLASYFIKACJI ===")
         self.logger.info(f"Czas przetwarzania: {elapsed_time:.2f} sekund")
-        self.logger.info(f"Prędkość: {stats['total_images'] / elapsed_time:.1f} obrazów/sekundę")
+        speed = stats['total_images'] / elapsed_time if elapsed_time > 0 else 0
+        self.logger.info(f"Prędkość: {speed:.1f} obrazów/sekundę")
         self.logger.info(f"Całkowite obrazy: {stats['total_images']}")
-        self.logger.info(f"Czyste obrazy: {stats['clean_images']}")
-        self.logger.info(f"Screenshoty kodu: {stats['code_images']}")
-        self.logger.info(f"Niepewne: {stats['uncertain_images']}")
+        for category in categories:
+            title = _CATEGORY_TITLES.get(category.name, (category.name, category.name))[0]
+            self.logger.info(f"{title}: {stats[category.stat_key]}")
+        self.logger.info(f"Niepewne: {stats[UNCERTAIN_KEY]}")
         if stats['errors'] > 0:
             self.logger.info(f"Błędy: {stats['errors']}")
+        if stats.get('cache_hits', 0) > 0:
+            self.logger.info(f"Wyniki z cache: {stats['cache_hits']}")
+        if stats.get('duplicates', 0) > 0:
+            self.logger.info(f"Duplikaty: {stats['duplicates']} w {stats['duplicate_groups']} grupach "
+                             f"(dokładne: {stats['exact_duplicates']})")
+        if stats.get('prefiltered', 0) > 0:
+            share = stats['prefiltered'] / stats['total_images'] * 100
+            self.logger.info(f"Rozstrzygnięte przez filtr wstępny: {stats['prefiltered']} ({share:.1f}%)")
+        if stats.get('resumed', 0) > 0:
+            self.logger.info(f"Wznowione (pominięte): {stats['resumed']}")
+
+
+class _PipelineRun:
+    """Stan jednego przebiegu potoku współdzielony przez jego etapy"""
+
+    def __init__(self, config, classifier, folders, stats, progress, cache, journal, batch_size, max_in_flight):
+        self.config = config
+        self.classifier = classifier
+        self.folders = folders
+        self.stats = stats
+        self.progress = progress  # ProgressChannel
+        self.cache = cache
+        self.journal = journal
+        self.results = None  # ResultsStore
+        self.plan = None  # PlacementPlan (tryb planowania)
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.use_prefilter = False
+        self.placer = None
+        self.profiler = None
+        self.listing_done = False
+        self.duplicates = {}  # reprezentant -> [(nazwa, ścieżka, czy_dokładny)]
+        self.categories = {category.name: category for category in classifier.categories}
+
+        self.done = 0
+        self.stats_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self._in_flight = threading.Semaphore(max_in_flight)
+
+        # Ograniczona kolejka do etapu zapisu - backpressure dla inferencji
+        self.place_queue = queue.Queue(maxsize=batch_size * 2)
+
+        # Funkcje zwracające zaległości kolejek poszczególnych etapów
+        self.end_markers = 0  # znaczniki końca w place_queue nie są zaległymi plikami
+        self.backlog_sources = {'place': lambda: max(0, self.place_queue.qsize() - self.end_markers)}
+
+    def acquire_slot(self):
+        """Rezerwuje miejsce dla obrazu w toku; False, gdy potok zatrzymano w trakcie czekania"""
+        while not self.stop_event.is_set():
+            if self._in_flight.acquire(timeout=0.1):
+                return True
+        return False
+
+    def release_slots(self, count):
+        """Zwalnia miejsca obrazów, których wyniki opuściły etap inferencji"""
+        for _ in range(count):
+            self._in_flight.release()
+
+    def backlog(self):
+        """Zwraca bieżące zaległości kolejek etapów"""
+        return {stage: source() for stage, source in self.backlog_sources.items()}
+
+    def count_files(self, image_files):
+        """Przepuszcza strumień plików, licząc je w statystykach na bieżąco"""
+        for filename in image_files:
+            with self.stats_lock:
+                self.stats['total_images'] += 1
+            yield filename
+        self.listing_done = True
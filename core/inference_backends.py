@@ -0,0 +1,357 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import warnings
+
+import numpy as np
+
+# Dostępne backendy wieży wizyjnej
+BACKEND_PYTORCH = "pytorch"
+BACKEND_ONNX = "onnx"
+AVAILABLE_BACKENDS = (BACKEND_PYTORCH, BACKEND_ONNX)
+
+# Precyzja obliczeń wieży wizyjnej PyTorch (bf16 przez autocast na CPU)
+PRECISION_FP32 = "fp32"
+PRECISION_BF16 = "bf16"
+AVAILABLE_PRECISIONS = (PRECISION_FP32, PRECISION_BF16)
+
+# Kompilacja wieży wizyjnej PyTorch: brak, TorchScript (zapisywany w cache) albo torch.compile
+COMPILE_NONE = "none"
+COMPILE_TRACE = "trace"
+COMPILE_TORCH = "compile"
+AVAILABLE_COMPILE_MODES = (COMPILE_NONE, COMPILE_TRACE, COMPILE_TORCH)
+
+# Minimalne podobieństwo embeddingów szybkiej ścieżki i fp32 eager w teście startowym
+SELF_TEST_MIN_COSINE = 0.99
+
+# Domyślny folder na wyeksportowane modele
+DEFAULT_MODEL_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "clip_screenshot_filter")
+
+
+def vision_image_size(clip_model):
+    """Rozmiar wejścia wieży wizyjnej (CLIPModel albo CLIPVisionModelWithProjection)"""
+    config = clip_model.config
+    return getattr(config, 'vision_config', config).image_size
+
+
+def _build_vision_tower(clip_model):
+    """Wydziela wieżę wizyjną CLIP z projekcją jako osobny moduł (do eksportu)"""
+    import torch
+
+    class VisionTower(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.vision_model = model.vision_model
+            self.visual_projection = model.visual_projection
+
+        def forward(self, pixel_values):
+            pooled = self.vision_model(pixel_values=pixel_values).pooler_output
+            return self.visual_projection(pooled)
+
+    return VisionTower(clip_model).eval()
+
+
+def cpu_supports_bf16():
+    """Sprawdza czy CPU ma sprzętowe wsparcie bf16 (AVX512-BF16 / AMX / ARM BF16)"""
+    import torch
+
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        # Brak funkcji w tej wersji PyTorch - rozstrzygnie test startowy
+        return True
+
+
+class TorchVisionBackend:
+    """Domyślny backend - wieża wizyjna w PyTorch.
+
+    Domyślnie fp32 eager; opcjonalnie autocast bf16 na CPU oraz wieża
+    skompilowana przez torch.jit.trace (zapisywana w cache) lub torch.compile.
+    """
+
+    name = BACKEND_PYTORCH
+
+    def __init__(self, clip_model, precision=PRECISION_FP32, compile_mode=COMPILE_NONE, model_name=None,
+                 logger=None, cache_dir=None):
+        if precision not in AVAILABLE_PRECISIONS:
+            raise ValueError(f"Nieznana precyzja: {precision} (dostępne: {', '.join(AVAILABLE_PRECISIONS)})")
+        if compile_mode not in AVAILABLE_COMPILE_MODES:
+            raise ValueError(f"Nieznany tryb kompilacji: {compile_mode} "
+                             f"(dostępne: {', '.join(AVAILABLE_COMPILE_MODES)})")
+
+        self.clip_model = clip_model
+        self.precision = precision
+        self.compile_mode = compile_mode
+        self._forward = self._eager_forward
+        if compile_mode == COMPILE_TRACE:
+            self._forward = load_traced_vision_tower(clip_model, model_name, logger, cache_dir)
+        elif compile_mode == COMPILE_TORCH:
+            import torch
+
+            # Kompilacja następuje przy pierwszym wywołaniu; Inductor trzyma kernele w cache na dysku
+            self._forward = torch.compile(_build_vision_tower(clip_model))
+
+    @property
+    def signature(self):
+        """Identyfikator backendu uwzględniany w sygnaturze cache (kompilacja nie zmienia wyników)"""
+        return self.name if self.precision == PRECISION_FP32 else f"{self.name}-{self.precision}"
+
+    @property
+    def description(self):
+        """Opis ścieżki obliczeń do logów"""
+        return f"{self.signature} ({self.precision}, {self.compile_mode})"
+
+    def _eager_forward(self, pixel_values):
+        """Wieża wizyjna z projekcją w trybie eager"""
+        vision_outputs = self.clip_model.vision_model(pixel_values=pixel_values)
+        return self.clip_model.visual_projection(vision_outputs.pooler_output)
+
+    def encode(self, pixel_values):
+        """Zwraca (nieznormalizowane) embeddingi obrazów dla tensora pixel_values"""
+        import torch
+
+        with torch.inference_mode(), torch.autocast("cpu", dtype=torch.bfloat16,
+                                                    enabled=self.precision == PRECISION_BF16):
+            return self._forward(pixel_values).float()
+
+
+def model_cache_key(clip_model, model_name):
+    """Skrót nazwy modelu, wag wieży wizyjnej oraz wersji torch i transformers (klucz plików w cache)"""
+    import torch
+    import transformers
+
+    tower = _build_vision_tower(clip_model)
+    # Tani odcisk wag: zmiana lokalnego modelu pod tą samą nazwą wymusza ponowny eksport
+    checksum = sum(float(parameter.detach().double().sum()) for parameter in tower.parameters())
+    payload = json.dumps([model_name, torch.__version__, transformers.__version__, repr(checksum)])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class _atomic_output:
+    """Unikalna ścieżka tymczasowa obok pliku docelowego, podmieniana przez os.replace po sukcesie.
+
+    Równoległe procesy robocze z pustym cache nie zapisują do wspólnego pliku
+    tymczasowego; wygrywa ostatni kompletny plik.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path),
+                                             prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+        os.close(fd)
+        return self.tmp_path
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        elif os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        return False
+
+
+def _traced_model_path(clip_model, model_name, cache_dir=None):
+    """Ścieżka wieży TorchScript w cache - zależy od wersji bibliotek i wag modelu"""
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name or "model")
+    key = model_cache_key(clip_model, model_name)
+    return os.path.join(cache_dir or DEFAULT_MODEL_CACHE_DIR, f"{safe_name}-vision-{key}.pt")
+
+
+def load_traced_vision_tower(clip_model, model_name, logger, cache_dir=None):
+    """Zwraca wieżę wizyjną jako TorchScript: z cache albo śledzoną (torch.jit.trace) i zapisaną"""
+    import torch
+
+    path = _traced_model_path(clip_model, model_name, cache_dir)
+    if os.path.exists(path):
+        try:
+            with warnings.catch_warnings():
+                # Nowsze wersje PyTorch oznaczają TorchScript jako przestarzały
+                warnings.simplefilter("ignore", FutureWarning)
+                module = torch.jit.load(path)
+            logger.info(f"Wczytano wieżę wizyjną TorchScript: {path}")
+            return module
+        except (RuntimeError, OSError) as e:
+            logger.warning(f"Nie udało się wczytać wieży TorchScript ({e}), ponowne śledzenie...")
+
+    logger.info("Śledzenie wieży wizyjnej do TorchScript (jednorazowo)...")
+    image_size = vision_image_size(clip_model)
+    # Partia 2 - śledzenie nie może utrwalić rozmiaru partii 1
+    dummy = torch.zeros(2, 3, image_size, image_size)
+    with torch.no_grad(), warnings.catch_warnings():
+        warnings.simplefilter("ignore", torch.jit.TracerWarning)
+        warnings.simplefilter("ignore", FutureWarning)
+        module = torch.jit.freeze(torch.jit.trace(_build_vision_tower(clip_model), (dummy,), check_trace=False))
+
+        try:
+            with _atomic_output(path) as tmp_path:
+                torch.jit.save(module, tmp_path)
+        except OSError as e:
+            logger.warning(f"Nie udało się zapisać wieży TorchScript: {e}")
+    return module
+
+
+class OnnxVisionBackend:
+    """Wieża wizyjna wyeksportowana do ONNX i uruchamiana przez ONNX Runtime.
+
+    Eksport wykonywany jest raz i zapisywany w folderze cache; opcjonalnie
+    wagi są kwantyzowane dynamicznie do int8, co zwykle daje największe
+    przyspieszenie na CPU.
+    """
+
+    name = BACKEND_ONNX
+
+    def __init__(self, clip_model, model_name, logger, cache_dir=None, quantize=True, num_threads=0):
+        self.logger = logger
+        self.quantize = quantize
+        self.cache_dir = cache_dir or DEFAULT_MODEL_CACHE_DIR
+
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("Backend ONNX wymaga biblioteki onnxruntime: pip install onnxruntime")
+
+        self.onnxruntime_version = onnxruntime.__version__
+        model_path = self._ensure_exported(clip_model, model_name)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.logger.info(f"Backend ONNX Runtime gotowy: {model_path}")
+
+    @property
+    def signature(self):
+        """Identyfikator backendu uwzględniany w sygnaturze cache"""
+        return f"{self.name}-int8" if self.quantize else self.name
+
+    def _model_paths(self, clip_model, model_name):
+        """Zwraca ścieżki modelu fp32 i skwantyzowanego w folderze cache (zależne od wag i wersji bibliotek)"""
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        key = model_cache_key(clip_model, model_name)
+        base = os.path.join(self.cache_dir, f"{safe_name}-vision-{key}")
+        return base + ".onnx", f"{base}-int8-ort{self.onnxruntime_version}.onnx"
+
+    def _ensure_exported(self, clip_model, model_name):
+        """Eksportuje wieżę wizyjną do ONNX (i kwantyzuje), jeśli nie ma jej w cache"""
+        fp32_path, int8_path = self._model_paths(clip_model, model_name)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        if not os.path.exists(fp32_path):
+            self.logger.info("Eksport wieży wizyjnej do ONNX (jednorazowo)...")
+            export_onnx(clip_model, fp32_path)
+
+        if not self.quantize:
+            return fp32_path
+
+        if not os.path.exists(int8_path):
+            self.logger.info("Kwantyzacja dynamiczna int8 modelu ONNX (jednorazowo)...")
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+
+            # Kwantyzacja zapisuje pliki pośrednie obok wejścia - każdy proces pracuje we własnym folderze
+            with tempfile.TemporaryDirectory(dir=self.cache_dir) as work_dir:
+                source = os.path.join(work_dir, "vision.onnx")
+                shutil.copyfile(fp32_path, source)
+                with _atomic_output(int8_path) as tmp_path:
+                    quantize_dynamic(source, tmp_path, weight_type=QuantType.QInt8)
+
+        return int8_path
+
+    def encode(self, pixel_values):
+        """Zwraca (nieznormalizowane) embeddingi obrazów dla tensora pixel_values"""
+        import torch
+
+        outputs = self.session.run(None, {self.input_name: pixel_values.numpy()})
+        return torch.from_numpy(outputs[0])
+
+
+def export_onnx(clip_model, path, opset_version=14):
+    """Eksportuje wieżę wizyjną z projekcją do pliku ONNX z dynamicznym rozmiarem partii"""
+    import inspect
+    import torch
+
+    tower = _build_vision_tower(clip_model)
+    image_size = vision_image_size(clip_model)
+    dummy = torch.zeros(1, 3, image_size, image_size)
+
+    kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # Klasyczny eksporter TorchScript - nie wymaga dodatkowych zależności
+        kwargs["dynamo"] = False
+
+    with torch.no_grad(), _atomic_output(path) as tmp_path:
+        torch.onnx.export(
+            tower, (dummy,), tmp_path,
+            input_names=["pixel_values"],
+            output_names=["image_embeds"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+            opset_version=opset_version,
+            **kwargs
+        )
+
+
+def create_backend(name, clip_model, model_name, logger, cache_dir=None, quantize=True, num_threads=0,
+                   precision=PRECISION_FP32, compile_mode=COMPILE_NONE):
+    """Tworzy backend wieży wizyjnej o podanej nazwie (precyzja i kompilacja dotyczą PyTorch)"""
+    if name == BACKEND_PYTORCH:
+        return TorchVisionBackend(clip_model, precision=precision, compile_mode=compile_mode,
+                                  model_name=model_name, logger=logger, cache_dir=cache_dir)
+    if name == BACKEND_ONNX:
+        return OnnxVisionBackend(clip_model, model_name, logger, cache_dir=cache_dir, quantize=quantize,
+                                 num_threads=num_threads)
+    raise ValueError(f"Nieznany backend: {name} (dostępne: {', '.join(AVAILABLE_BACKENDS)})")
+
+
+def compare_backends(reference, candidate, pixel_batches, text_embeds, logit_scale, category_index,
+                     confidence_threshold=0.6):
+    """Porównuje decyzje dwóch backendów na próbce obrazów.
+
+    `pixel_batches` to iterowalna kolekcja tensorów pixel_values. Zwraca raport
+    ze zgodnością kategorii (zwycięska kategoria / niepewne), średnią i maksymalną
+    różnicą prawdopodobieństw oraz minimalnym podobieństwem cosinusowym embeddingów.
+    """
+    import torch
+
+    def decide(probs):
+        category, confidence = category_index.decide(category_index.reduce(probs.numpy()))
+        return torch.from_numpy(np.where(confidence >= confidence_threshold, category, -1))
+
+    total = 0
+    agree = 0
+    prob_diff_sum = 0.0
+    prob_diff_max = 0.0
+    min_cosine = 1.0
+
+    with torch.no_grad():
+        for pixel_values in pixel_batches:
+            ref = reference.encode(pixel_values).float()
+            cand = candidate.encode(pixel_values).float()
+
+            min_cosine = min(min_cosine, torch.nn.functional.cosine_similarity(ref, cand, dim=-1).min().item())
+
+            ref = ref / ref.norm(p=2, dim=-1, keepdim=True)
+            cand = cand / cand.norm(p=2, dim=-1, keepdim=True)
+            ref_probs = (logit_scale * ref @ text_embeds.t()).softmax(dim=1)
+            cand_probs = (logit_scale * cand @ text_embeds.t()).softmax(dim=1)
+
+            diff = (ref_probs - cand_probs).abs()
+            prob_diff_sum += diff.mean(dim=1).sum().item()
+            prob_diff_max = max(prob_diff_max, diff.max().item())
+
+            agree += (decide(ref_probs) == decide(cand_probs)).sum().item()
+            total += pixel_values.shape[0]
+
+    return {
+        'images': total,
+        'decision_agreement': agree / total if total else 1.0,
+        'mean_prob_diff': prob_diff_sum / total if total else 0.0,
+        'max_prob_diff': prob_diff_max,
+        'min_embedding_cosine': min_cosine
+    }
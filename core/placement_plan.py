@@ -0,0 +1,212 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .file_placement import FilePlacer, PLACEMENT_COPY, PLACEMENT_MOVE
+from .results_store import merge_plan_results
+
+# Wersja formatu pliku planu
+PLAN_VERSION = 1
+
+
+class PlacementPlan:
+    """Plan umieszczenia plików zapisywany zamiast kopiowania (tryb planowania).
+
+    Plik JSONL: nagłówek z folderami i sposobem umieszczania, a potem po
+    jednym wierszu na plik ze ścieżką źródłową (względem folderu wejściowego),
+    docelową (względem folderu wyjściowego), kategorią i pewnością. Wiersze są
+    sortowane według źródła, więc plany kolejnych przebiegów można porównywać
+    zwykłym diff. Plik pojawia się pod docelową nazwą dopiero po zakończeniu przebiegu.
+    """
+
+    def __init__(self, path, input_folder, output_folder, placement, logger):
+        self.path = os.path.abspath(path)
+        self.input_folder = os.path.abspath(input_folder)
+        self.output_folder = os.path.abspath(output_folder)
+        self.placement = placement
+        self.logger = logger
+        self.rows = 0
+
+        self._tmp_path = self.path + ".partial"
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self._tmp_path, 'w', encoding='utf-8')
+
+    def add(self, filename, dest_path, stat_key, label, confidence):
+        """Dopisuje plik do planu"""
+        row = {
+            'src': filename.replace(os.sep, "/"),
+            'dest': os.path.relpath(dest_path, self.output_folder).replace(os.sep, "/"),
+            'category': stat_key,
+            'label': label,
+            'confidence': round(float(confidence), 6)
+        }
+        line = json.dumps(row, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self.rows += 1
+
+    def finish(self):
+        """Sortuje wiersze, dopisuje nagłówek i zapisuje plan pod docelową nazwą"""
+        with self._lock:
+            self._file.close()
+            with open(self._tmp_path, 'r', encoding='utf-8') as f:
+                lines = sorted(f)
+
+            header = {
+                'version': PLAN_VERSION,
+                'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                'input_folder': self.input_folder,
+                'output_folder': self.output_folder,
+                'placement': self.placement,
+                'files': len(lines)
+            }
+            with open(self._tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(header, ensure_ascii=False) + "\n")
+                f.writelines(lines)
+            os.replace(self._tmp_path, self.path)
+        self.logger.info(f"Plan umieszczenia plików ({len(lines)}): {self.path}")
+
+    def close(self):
+        """Zamyka niedokończony plan (zostaje jako .partial)"""
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+                self.logger.warning(f"Przebieg przerwany - niepełny plan: {self._tmp_path}")
+
+
+def read_plan(path):
+    """Wczytuje plan: zwraca (nagłówek, lista wierszy)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline() or '{}')
+        if header.get('version') != PLAN_VERSION:
+            raise ValueError(f"{path} nie jest planem umieszczenia plików (wersja {PLAN_VERSION})")
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    # Ręcznie edytowany lub uszkodzony plan nie może pisać poza folder wyjściowy
+    for number, row in enumerate(rows, start=2):
+        for key in ('src', 'dest'):
+            value = row.get(key)
+            if not isinstance(value, str) or not _is_relative_inside(value):
+                raise ValueError(f"{path}, wiersz {number}: {key} musi być ścieżką względną "
+                                 f"bez '..' (jest {value!r})")
+    return header, rows
+
+
+def _is_relative_inside(path):
+    """Sprawdza czy ścieżka jest względna i nie wychodzi poza folder bazowy"""
+    normalized = path.replace("\\", "/")
+    if not normalized or os.path.isabs(path) or normalized.startswith("/") or os.path.splitdrive(path)[0]:
+        return False
+    return ".." not in normalized.split("/")
+
+
+def apply_plan(path, logger, input_folder=None, output_folder=None, placement=None, io_workers=8,
+               progress_callback=None):
+    """Wykonuje plan: tworzy foldery jednym przebiegiem, a potem umieszcza pliki pulą wątków.
+
+    Foldery wejściowy i wyjściowy oraz sposób umieszczania domyślnie pochodzą
+    z nagłówka planu (można je nadpisać, np. na innym komputerze). Plik już
+    obecny w miejscu docelowym (ten sam plik albo ten sam rozmiar i czas modyfikacji)
+    jest pomijany, więc plan można wykonać ponownie; inny plik o tej samej nazwie
+    nie jest nadpisywany - nowy dostaje przyrostek _1, _2... Wyniki zapisane
+    przy planowaniu trafiają do .run_results folderu wyjściowego z faktycznymi
+    miejscami docelowymi. Zwraca statystyki.
+    """
+    header, rows = read_plan(path)
+    input_folder = os.path.abspath(input_folder or header['input_folder'])
+    output_folder = os.path.abspath(output_folder or header['output_folder'])
+    placer = FilePlacer(placement or header.get('placement', PLACEMENT_COPY), logger)
+
+    jobs = [(os.path.join(input_folder, row['src']), os.path.normpath(os.path.join(output_folder, row['dest'])),
+             row['category']) for row in rows]
+    sources = {src: row['src'] for (src, _, _), row in zip(jobs, rows)}
+    stats = {'total_images': len(jobs), 'placed': 0, 'skipped': 0, 'renamed': 0, 'errors': 0}
+    for _, _, category in jobs:
+        stats.setdefault(category, 0)
+
+    # Jeden przebieg tworzenia folderów zamiast makedirs dla każdego pliku
+    folders = sorted({os.path.dirname(dest) for _, dest, _ in jobs})
+    for folder in folders:
+        os.makedirs(folder, exist_ok=True)
+    logger.info(f"Wykonanie planu: {len(jobs)} plików, {len(folders)} folderów, {io_workers} wątków "
+                f"({placer.mode})")
+
+    reserved = {dest for _, dest, _ in jobs}
+    lock = threading.Lock()
+
+    def place(src, dest):
+        """Umieszcza plik; zwraca (wynik, faktyczne miejsce docelowe)"""
+        if os.path.lexists(dest):
+            if _already_placed(src, dest, placer.mode):
+                return 'skipped', dest
+            with lock:
+                dest, placed = _free_name(src, dest, reserved, placer.mode)
+            if placed:
+                return 'skipped', dest
+            placer.place(src, dest)
+            return 'renamed', dest
+        placer.place(src, dest)
+        return 'placed', dest
+
+    placed_at = {}  # źródło z planu -> miejsce docelowe umieszczonego pliku
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, io_workers)) as executor:
+        futures = {executor.submit(place, src, dest): (src, category) for src, dest, category in jobs}
+        for future in as_completed(futures):
+            src, category = futures[future]
+            try:
+                outcome, dest = future.result()
+                placed_at[sources[src]] = dest
+                stats[outcome] += 1
+                stats[category] += 1
+            except Exception as e:
+                logger.error(f"Błąd umieszczania {src}: {e}")
+                stats['errors'] += 1
+
+            done += 1
+            if progress_callback is not None and (done % 500 == 0 or done == len(jobs)):
+                progress_callback(done / len(jobs) * 100, f"{done}/{len(jobs)}")
+
+    logger.info(f"Plan wykonany: umieszczono {stats['placed'] + stats['renamed']} "
+                f"(pod nową nazwą {stats['renamed']}), pominięto {stats['skipped']}, błędy {stats['errors']}")
+
+    # Pliki są już na miejscu - błąd zapisu wyników nie unieważnia wykonania planu
+    try:
+        merge_plan_results(path, output_folder, placed_at, logger)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Nie można zapisać wyników przebiegu z planu ({e})")
+    return stats
+
+
+def _already_placed(src, dest, mode):
+    """Sprawdza czy dest to już umieszczony plik src (ponowne wykonanie planu)"""
+    if not os.path.lexists(src):
+        # Po przeniesieniu źródło już nie istnieje
+        return mode == PLACEMENT_MOVE
+    try:
+        if os.path.samefile(src, dest):
+            return True
+        src_stat, dest_stat = os.stat(src), os.stat(dest)
+    except OSError:
+        return False
+    return src_stat.st_size == dest_stat.st_size and src_stat.st_mtime_ns == dest_stat.st_mtime_ns
+
+
+def _free_name(src, dest, reserved, mode):
+    """Zwraca (nazwa, czy_już_umieszczony): pierwsza wolna nazwa dest_1, dest_2... albo ta,
+    pod którą src umieszczono przy poprzednim wykonaniu planu (wywoływane pod blokadą)"""
+    base, extension = os.path.splitext(dest)
+    number = 1
+    while True:
+        candidate = f"{base}_{number}{extension}"
+        number += 1
+        if candidate in reserved:
+            continue
+        if not os.path.lexists(candidate):
+            reserved.add(candidate)
+            return candidate, False
+        if _already_placed(src, candidate, mode):
+            return candidate, True
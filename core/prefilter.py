@@ -0,0 +1,112 @@
+import numpy as np
+
+from .categories import CATEGORY_CLEAN, CATEGORY_CODE
+
+# Domyślne progi kaskady - obraz trafia do CLIP, jeśli nie spełnia żadnej reguły
+DEFAULT_PREFILTER_THRESHOLDS = {
+    # Rozmiar miniatury, na której liczone są cechy
+    'thumbnail_size': 192,
+    # Minimalna różnica jasności sąsiednich pikseli uznawana za krawędź
+    'edge_threshold': 24,
+    # Pewność przypisywana decyzjom kaskady (musi być >= progu pewności przebiegu)
+    'confidence': 0.95,
+    # Zdjęcie: bogaty histogram, brak dominującego tła
+    'photo_min_entropy': 8.5,
+    'photo_min_colors': 600,
+    'photo_max_background': 0.05,
+    # Screenshot kodu: jednolite ciemne tło, mało kolorów, umiarkowana gęstość krawędzi (tekst).
+    # Jasne tło (dokumenty, czaty, strony) rozstrzyga CLIP
+    'code_min_background': 0.6,
+    'code_max_background_luminance': 0.3,
+    'code_max_colors': 400,
+    'code_min_edge_density': 0.02,
+    'code_max_edge_density': 0.3
+}
+
+
+class PrefilterCascade:
+    """Tani pierwszy etap klasyfikacji oparty o cechy miniatury.
+
+    Dla miniatury liczy liczbę kolorów i entropię histogramu (kolory
+    kwantowane do 4 bitów na kanał), udział dominującego koloru tła oraz
+    gęstość krawędzi. Oczywiste zdjęcia i oczywiste screenshoty kodu
+    (ciemny motyw edytora lub terminala) rozstrzyga od razu; pozostałe
+    obrazy (None) trafiają do CLIP.
+    """
+
+    def __init__(self, thresholds=None):
+        self.thresholds = dict(DEFAULT_PREFILTER_THRESHOLDS)
+        if thresholds:
+            unknown = set(thresholds) - set(DEFAULT_PREFILTER_THRESHOLDS)
+            if unknown:
+                raise ValueError(f"Nieznane progi filtra wstępnego: {', '.join(sorted(unknown))}")
+            self.thresholds.update(thresholds)
+
+    @property
+    def confidence(self):
+        """Pewność przypisywana decyzjom kaskady"""
+        return self.thresholds['confidence']
+
+    def compute_features(self, image):
+        """Liczy cechy obrazu PIL na miniaturze"""
+        size = int(self.thresholds['thumbnail_size'])
+        thumbnail = image.convert('RGB')
+        thumbnail.thumbnail((size, size))
+        pixels = np.asarray(thumbnail, dtype=np.uint8)
+
+        # Kolory kwantowane do 4 bitów na kanał -> 4096 koszyków
+        quantized = pixels >> 4
+        color_index = ((quantized[..., 0].astype(np.int32) << 8)
+                       | (quantized[..., 1].astype(np.int32) << 4)
+                       | quantized[..., 2].astype(np.int32))
+        counts = np.bincount(color_index.ravel(), minlength=4096)
+        total = counts.sum()
+
+        nonzero = counts[counts > 0] / total
+        entropy = float(-(nonzero * np.log2(nonzero)).sum())
+        dominant = int(counts.argmax())
+
+        # Gęstość krawędzi na jasności (różnice poziome i pionowe)
+        edge_threshold = self.thresholds['edge_threshold']
+        gray = pixels.astype(np.int16).mean(axis=2)
+        horizontal = np.abs(np.diff(gray, axis=1)) > edge_threshold
+        vertical = np.abs(np.diff(gray, axis=0)) > edge_threshold
+        edge_density = float((horizontal.sum() + vertical.sum()) / max(1, horizontal.size + vertical.size))
+
+        return {
+            'colors': int(len(nonzero)),
+            'entropy': entropy,
+            'background_fraction': float(counts[dominant] / total),
+            'background_luminance': float(((dominant >> 8) * 0.299 + ((dominant >> 4) & 15) * 0.587
+                                           + (dominant & 15) * 0.114) * 17 / 255),
+            'edge_density': edge_density
+        }
+
+    def classify(self, image):
+        """Zwraca (is_code, confidence, details) dla oczywistych obrazów albo None"""
+        t = self.thresholds
+        features = self.compute_features(image)
+
+        is_code = None
+        if (features['background_fraction'] >= t['code_min_background']
+                and features['background_luminance'] <= t['code_max_background_luminance']
+                and features['colors'] <= t['code_max_colors']
+                and t['code_min_edge_density'] <= features['edge_density'] <= t['code_max_edge_density']):
+            is_code = True
+        elif (features['entropy'] >= t['photo_min_entropy']
+              and features['colors'] >= t['photo_min_colors']
+              and features['background_fraction'] <= t['photo_max_background']):
+            is_code = False
+
+        if is_code is None:
+            return None
+
+        confidence = t['confidence']
+        details = {
+            'category': CATEGORY_CODE if is_code else CATEGORY_CLEAN,
+            'code_prob': confidence if is_code else 1.0 - confidence,
+            'normal_prob': 1.0 - confidence if is_code else confidence,
+            'prefilter': True,
+            'features': features
+        }
+        return is_code, confidence, details
@@ -0,0 +1,108 @@
+import numpy as np
+from PIL import Image
+
+# Statystyki normalizacji CLIP (takie same jak w CLIPImageProcessor)
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+
+# Dopuszczalna różnica względem CLIPProcessor przy sprawdzaniu zgodności
+PARITY_TOLERANCE = 1e-4
+
+
+class ClipImagePreprocessor:
+    """Przetwarzanie obrazów dla CLIP bez wywołań CLIPProcessor per obraz.
+
+    Przetwarzanie dzieli się na dwa kroki:
+    - resize_and_crop: skalowanie krótszego boku (PIL, bicubic) i wycięcie
+      środka jako tablica uint8 - wykonywane w wątkach dekodujących,
+    - to_pixel_values: normalizacja całej partii naraz operacjami NumPy
+      i zamiana na tensor NCHW dla modelu.
+    Wynik odpowiada CLIPImageProcessor (resize, center crop, rescale, normalize).
+    """
+
+    def __init__(self, size=224, crop_size=224, mean=CLIP_MEAN, std=CLIP_STD,
+                 resample=Image.BICUBIC, rescale_factor=1 / 255):
+        self.size = size
+        self.crop_size = crop_size
+        self.resample = resample
+
+        # Skalowanie i normalizacja złożone w jedno mnożenie i odejmowanie
+        mean = np.asarray(mean, dtype=np.float32)
+        std = np.asarray(std, dtype=np.float32)
+        self._scale = (np.float32(rescale_factor) / std).astype(np.float32)
+        self._offset = (mean / std).astype(np.float32)
+
+    @classmethod
+    def from_processor(cls, processor):
+        """Tworzy preprocesor z ustawieniami CLIPProcessor / CLIPImageProcessor"""
+        image_processor = getattr(processor, 'image_processor', processor)
+
+        return cls(
+            size=_size_value(image_processor.size, 'shortest_edge', 'height'),
+            crop_size=_size_value(image_processor.crop_size, 'height'),
+            mean=image_processor.image_mean,
+            std=image_processor.image_std,
+            resample=getattr(image_processor, 'resample', Image.BICUBIC),
+            rescale_factor=getattr(image_processor, 'rescale_factor', 1 / 255)
+        )
+
+    def resize_and_crop(self, image):
+        """Skaluje krótszy bok do `size` i wycina środek - zwraca tablicę uint8 HxWx3"""
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        width, height = image.size
+        if width <= height:
+            new_width, new_height = self.size, int(self.size * height / width)
+        else:
+            new_width, new_height = int(self.size * width / height), self.size
+
+        if (new_width, new_height) != (width, height):
+            image = image.resize((new_width, new_height), resample=self.resample)
+
+        pixels = np.asarray(image)
+        top = (new_height - self.crop_size) // 2
+        left = (new_width - self.crop_size) // 2
+        if top < 0 or left < 0:
+            # Obraz mniejszy niż wycinek - dopełnij zerami jak CLIPImageProcessor
+            padded = np.zeros((max(new_height, self.crop_size), max(new_width, self.crop_size), 3), np.uint8)
+            pad_top, pad_left = max(-top, 0), max(-left, 0)
+            padded[pad_top:pad_top + new_height, pad_left:pad_left + new_width] = pixels
+            pixels, top, left = padded, max(top, 0), max(left, 0)
+
+        return np.ascontiguousarray(pixels[top:top + self.crop_size, left:left + self.crop_size])
+
+    def to_pixel_values(self, crops):
+        """Normalizuje partię wycinków uint8 jedną operacją i zwraca tensor NCHW float32"""
+        import torch
+
+        batch = np.stack(crops).astype(np.float32)
+        batch *= self._scale
+        batch -= self._offset
+        return torch.from_numpy(np.ascontiguousarray(batch.transpose(0, 3, 1, 2)))
+
+    def __call__(self, images):
+        """Przetwarza listę obrazów PIL do tensora pixel_values"""
+        return self.to_pixel_values([self.resize_and_crop(image) for image in images])
+
+
+def _size_value(size, *keys):
+    """Odczytuje rozmiar z int, dict lub SizeDict (różne wersje transformers)"""
+    if isinstance(size, int):
+        return size
+
+    for key in keys:
+        value = size.get(key) if isinstance(size, dict) else getattr(size, key, None)
+        if value is not None:
+            return int(value)
+
+    raise ValueError(f"Nieobsługiwany format rozmiaru: {size!r}")
+
+
+def check_processor_parity(preprocessor, processor, images):
+    """Zwraca maksymalną różnicę bezwzględną względem CLIPProcessor dla podanych obrazów"""
+    expected = processor(images=images, return_tensors="pt")['pixel_values']
+    actual = preprocessor(images)
+    if tuple(expected.shape) != tuple(actual.shape):
+        return float('inf')
+    return (expected.float() - actual).abs().max().item()
@@ -0,0 +1,192 @@
+import logging
+import multiprocessing
+import os
+import queue
+
+from .image_loader import DEFAULT_MAX_PIXELS
+from .inference_backends import COMPILE_NONE, PRECISION_FP32
+from .run_profile import RunProfiler
+
+# Komunikaty przesyłane z procesów roboczych
+_MSG_READY = "ready"
+_MSG_RESULT = "result"
+_MSG_ERROR = "error"
+
+# Znacznik wyniku rozstrzygniętego przez filtr wstępny (bez prawdopodobieństw promptów)
+PREFILTER_RESULT = "prefilter"
+
+
+def default_threads_per_worker(num_workers):
+    """Dzieli rdzenie CPU równo między procesy robocze"""
+    return max(1, (os.cpu_count() or 1) // max(1, num_workers))
+
+
+def _worker_main(options, num_threads, task_queue, result_queue):
+    """Pętla procesu roboczego: ładuje model raz i klasyfikuje otrzymane fragmenty listy plików"""
+    from .clip_classifier import CLIPClassifier
+
+    logger = logging.getLogger(f"{__name__}.worker{os.getpid()}")
+    try:
+        classifier = CLIPClassifier(
+            logger,
+            model_name=options['model_name'],
+            backend=options['backend'],
+            onnx_quantize=options['onnx_quantize'],
+            model_cache_dir=options['model_cache_dir'],
+            num_threads=num_threads,
+            fast_decode=options['fast_decode'],
+            prefilter=options.get('prefilter'),
+            categories=options['categories'],
+            lean=options.get('lean', False),
+            precision=options.get('precision', PRECISION_FP32),
+            compile_mode=options.get('compile_mode', COMPILE_NONE),
+            max_pixels=options.get('max_pixels', DEFAULT_MAX_PIXELS)
+        )
+        classifier.load_model_blocking()
+        if options.get('profile'):
+            classifier.profiler = RunProfiler()
+    except Exception as e:
+        result_queue.put((_MSG_ERROR, os.getpid(), f"{type(e).__name__}: {e}"))
+        return
+
+    result_queue.put((_MSG_READY, os.getpid(), None))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        shard_id, paths = task
+        results = classifier.classify_batch(paths, batch_size=len(paths), verbose=False)
+
+        # Do rodzica wracają tylko surowe wyniki - decyzję odtwarza on sam
+        payload = []
+        for is_code, confidence, details in results:
+            if details.get('prefilter'):
+                payload.append((PREFILTER_RESULT, (is_code, confidence, details)))
+            elif details.get('prompt_probs') is None:
+                payload.append(None)
+            else:
+                payload.append((details['prompt_probs'], details.get('embedding')))
+        # Czasy etapów od poprzedniego shardu - rodzic scala je w swoim profilu
+        profile = classifier.profiler.drain() if classifier.profiler is not None else None
+        result_queue.put((_MSG_RESULT, shard_id, (payload, profile)))
+
+
+class ProcessPoolClassifier:
+    """Pula procesów, z których każdy ładuje własną kopię modelu CLIP.
+
+    Rodzic wysyła fragmenty (shardy) listy plików, a procesy robocze
+    dekodują i klasyfikują je niezależnie, omijając GIL i słabe skalowanie
+    wątków PyTorch przy małych partiach. Wyniki wracają strumieniem
+    w kolejności ukończenia.
+    """
+
+    def __init__(self, classifier_options, num_workers, logger, threads_per_worker=None, profiler=None):
+        # Z profilerem procesy robocze mierzą etapy i odsyłają agregaty z wynikami
+        self.classifier_options = dict(classifier_options, profile=profiler is not None)
+        self.profiler = profiler
+        self.num_workers = max(1, int(num_workers))
+        self.threads_per_worker = threads_per_worker or default_threads_per_worker(self.num_workers)
+        self.logger = logger
+
+        # spawn - bezpieczne przy wątkach w procesie rodzica i z PyTorch
+        self._context = multiprocessing.get_context("spawn")
+        self._task_queue = self._context.Queue(maxsize=self.num_workers * 2)
+        self._result_queue = self._context.Queue()
+        self._processes = []
+
+    def start(self):
+        """Uruchamia procesy robocze i czeka aż każdy załaduje model"""
+        self.logger.info(f"Uruchamianie {self.num_workers} procesów roboczych "
+                         f"({self.threads_per_worker} wątków każdy)...")
+
+        for _ in range(self.num_workers):
+            process = self._context.Process(
+                target=_worker_main,
+                args=(self.classifier_options, self.threads_per_worker, self._task_queue, self._result_queue)
+            )
+            process.daemon = True
+            process.start()
+            self._processes.append(process)
+
+        ready = 0
+        while ready < self.num_workers:
+            kind, worker_id, error = self._get_message(timeout=None)
+            if kind == _MSG_ERROR:
+                self.close()
+                raise RuntimeError(f"Proces roboczy {worker_id} nie załadował modelu: {error}")
+            if kind == _MSG_READY:
+                ready += 1
+
+        self.logger.info("Procesy robocze gotowe")
+
+    def submit(self, shard_id, paths, timeout=None):
+        """Wysyła fragment listy plików do klasyfikacji (blokuje, gdy kolejka jest pełna)"""
+        self._task_queue.put((shard_id, list(paths)), timeout=timeout)
+
+    def get_result(self, timeout=0.5):
+        """Zwraca (shard_id, wyniki) lub None po upływie limitu czasu"""
+        message = self._get_message(timeout)
+        if message is None:
+            return None
+
+        kind, shard_id, payload = message
+        if kind == _MSG_ERROR:
+            raise RuntimeError(f"Błąd procesu roboczego {shard_id}: {payload}")
+
+        results, profile = payload
+        if self.profiler is not None:
+            self.profiler.merge(profile)
+        return shard_id, results
+
+    def _get_message(self, timeout):
+        """Odbiera komunikat, wykrywając awarię któregokolwiek procesu roboczego.
+
+        Kolejka jest czytana przed sprawdzeniem procesów: proces, który nie
+        załadował modelu, wysyła błąd i kończy się z kodem 0 - ważny jest jego
+        komunikat, nie kod wyjścia.
+        """
+        while True:
+            try:
+                return self._result_queue.get(timeout=0.5 if timeout is None else timeout)
+            except queue.Empty:
+                pass
+
+            process = self._exited_worker()
+            if process is not None:
+                try:
+                    # Komunikat wysłany tuż przed zakończeniem procesu mógł dotrzeć po odczycie powyżej
+                    return self._result_queue.get(timeout=0.1)
+                except queue.Empty:
+                    raise RuntimeError(f"Proces roboczy {process.pid} zakończył się nieoczekiwanie "
+                                       f"(kod wyjścia {process.exitcode})") from None
+            if timeout is not None:
+                return None
+
+    def _exited_worker(self):
+        """Zwraca proces roboczy, który zakończył się w trakcie pracy, albo None.
+
+        Shardy pobrane przez taki proces nigdy nie wrócą, więc czekanie na
+        wyniki zawiesiłoby przebieg.
+        """
+        for process in self._processes:
+            if process.exitcode is not None:
+                return process
+        return None
+
+    def close(self):
+        """Zatrzymuje procesy robocze"""
+        for process in self._processes:
+            if process.is_alive():
+                try:
+                    self._task_queue.put(None, timeout=1)
+                except queue.Full:
+                    pass
+
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+        self._processes = []
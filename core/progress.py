@@ -0,0 +1,187 @@
+import collections
+import queue
+import threading
+import time
+
+# Domyślna częstotliwość odświeżania interfejsu (klatki na sekundę)
+DEFAULT_UI_FPS = 15
+
+# Okno (w sekundach), z którego liczona jest bieżąca prędkość
+RATE_WINDOW = 5.0
+
+# Nazwy etapów w opisie zaległości kolejek
+_STAGE_NAMES = {'decode': "dekodowanie", 'inference': "inferencja", 'place': "zapis"}
+
+
+class ProgressSnapshot:
+    """Stan postępu w jednej chwili: licznik, prędkość, ETA i zaległości etapów"""
+
+    def __init__(self, done, total, listing_done, rate, elapsed, backlog):
+        self.done = done
+        self.total = total
+        self.listing_done = listing_done
+        self.rate = rate  # obrazy na sekundę (okno RATE_WINDOW)
+        self.elapsed = elapsed
+        self.backlog = backlog or {}
+
+    @property
+    def percent(self):
+        """Postęp w procentach (do końca skanowania nie więcej niż 99%)"""
+        if not self.total:
+            return 0.0
+        percent = self.done / self.total * 100
+        return percent if self.listing_done else min(99.0, percent)
+
+    @property
+    def eta(self):
+        """Szacowany pozostały czas w sekundach albo None, gdy nie da się go ocenić"""
+        if not self.listing_done or self.rate <= 0:
+            return None
+        return max(0, self.total - self.done) / self.rate
+
+    def status_text(self):
+        """Opis postępu do paska statusu i konsoli"""
+        total = f"{self.total}" if self.listing_done else f"{self.total}+"
+        text = f"Przetwarzanie: {self.done}/{total} | {self.rate:.1f} img/s"
+
+        eta = self.eta
+        if eta is not None:
+            text += f" | ETA {_format_duration(eta)}"
+        elif not self.listing_done:
+            text += " | skanowanie..."
+
+        queues = [f"{_STAGE_NAMES.get(stage, stage)} {size}" for stage, size in self.backlog.items() if size]
+        if queues:
+            text += f" | kolejki: {', '.join(queues)}"
+        return text
+
+
+class ProgressChannel:
+    """Bezpieczny wątkowo kanał postępu między silnikiem a interfejsem.
+
+    Silnik wywołuje publish() po każdym pliku - to tylko zapis najnowszego
+    stanu pod blokadą, więc nie spowalnia przetwarzania. Odbiorca albo
+    odpytuje kanał (poll, np. z root.after w wątku Tk), albo rejestruje
+    listener wywoływany co najwyżej raz na min_interval. Wywołania zlecone
+    przez post() wykonuje odbiorca w swoim wątku (run_pending).
+    """
+
+    def __init__(self, listener=None, min_interval=1 / DEFAULT_UI_FPS):
+        self.listener = listener
+        self.min_interval = min_interval
+
+        self._lock = threading.Lock()
+        self._state = None
+        self._version = 0
+        self._polled_version = 0
+        self._last_emit = 0.0
+        self._start = None
+        self._samples = collections.deque()  # (czas, done) do liczenia prędkości
+        self._calls = queue.Queue()
+
+    def publish(self, done, total, listing_done=True, backlog=None, force=False):
+        """Zapisuje bieżący stan; listener jest wywoływany z ograniczoną częstotliwością"""
+        now = time.time()
+        with self._lock:
+            if self._start is None:
+                self._start = now
+                self._samples.append((now, 0))
+
+            if now - self._samples[-1][0] >= 0.25:
+                self._samples.append((now, done))
+            while len(self._samples) > 2 and now - self._samples[0][0] > RATE_WINDOW:
+                self._samples.popleft()
+
+            self._state = (done, total, listing_done, backlog, now)
+            self._version += 1
+
+            emit = self.listener is not None and (force or now - self._last_emit >= self.min_interval)
+            if emit:
+                self._last_emit = now
+                snapshot = self._snapshot()
+
+        if emit:
+            self.listener(snapshot)
+
+    def reset(self):
+        """Zaczyna pomiar od nowa (np. kolejny przebieg na tym samym kanale) - prędkość i ETA bez przerw"""
+        with self._lock:
+            self._state = None
+            self._start = None
+            self._samples.clear()
+
+    def poll(self):
+        """Zwraca najnowszy stan, jeśli zmienił się od ostatniego odpytania, inaczej None"""
+        with self._lock:
+            if self._state is None or self._version == self._polled_version:
+                return None
+            self._polled_version = self._version
+            return self._snapshot()
+
+    def post(self, callback, *args):
+        """Zleca wywołanie callback(*args) w wątku odbiorcy"""
+        self._calls.put((callback, args))
+
+    def run_pending(self):
+        """Wykonuje zlecone wywołania (w wątku odbiorcy)"""
+        while True:
+            try:
+                callback, args = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            callback(*args)
+
+    def _snapshot(self):
+        """Buduje ProgressSnapshot z bieżącego stanu (wywoływane pod blokadą)"""
+        done, total, listing_done, backlog, now = self._state
+        first_time, first_done = self._samples[0]
+        window = now - first_time
+        rate = (done - first_done) / window if window > 0 else 0.0
+        return ProgressSnapshot(done, total, listing_done, rate, now - self._start, dict(backlog or {}))
+
+
+class TkProgressPump:
+    """Odpytuje kanał postępu w wątku Tk przez root.after ze stałą częstotliwością"""
+
+    def __init__(self, root, channel, on_snapshot, fps=DEFAULT_UI_FPS):
+        self.root = root
+        self.channel = channel
+        self.on_snapshot = on_snapshot
+        self.interval_ms = max(1, int(1000 / fps))
+        self._running = False
+
+    def start(self):
+        """Rozpoczyna cykliczne odświeżanie"""
+        self._running = True
+        self.root.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        """Zatrzymuje odświeżanie po bieżącym cyklu"""
+        self._running = False
+
+    def _tick(self):
+        """Jeden cykl odświeżania: najnowszy stan i zlecone wywołania"""
+        snapshot = self.channel.poll()
+        if snapshot is not None:
+            self.on_snapshot(snapshot)
+        self.channel.run_pending()
+
+        if self._running:
+            self.root.after(self.interval_ms, self._tick)
+
+
+def as_progress_channel(progress):
+    """Zwraca kanał postępu; zwykły callback (value, status_text) jest opakowywany w listener"""
+    if isinstance(progress, ProgressChannel):
+        return progress
+    return ProgressChannel(listener=lambda snapshot: progress(snapshot.percent, snapshot.status_text()))
+
+
+def _format_duration(seconds):
+    """Formatuje czas jako 1h02m, 3m05s lub 12s"""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+
+from .inference_backends import DEFAULT_MODEL_CACHE_DIR, model_cache_key
+
+
+def prompt_embeddings_path(clip_model, model_name, prompts, cache_dir=None):
+    """Ścieżka pliku z embeddingami promptów dla modelu (wagi, wersje bibliotek) i listy promptów"""
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+    # Ten sam klucz co pliki backendów: zmiana wag lokalnego modelu albo aktualizacja torch/transformers
+    # nie może zostawić starych embeddingów tekstu obok nowej wieży wizyjnej
+    key = model_cache_key(clip_model, model_name)
+    digest = hashlib.sha1(json.dumps([model_name, key, list(prompts)]).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir or DEFAULT_MODEL_CACHE_DIR, f"{safe_name}-prompts-{digest}.npz")
+
+
+def load_prompt_embeddings(path, prompts):
+    """Wczytuje (znormalizowane embeddingi, logit_scale) albo None, gdy pliku brak lub nie pasuje"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if data['prompts'].tolist() != list(prompts):
+                return None
+            return data['embeddings'].astype(np.float32), float(data['logit_scale'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def save_prompt_embeddings(path, prompts, embeddings, logit_scale):
+    """Zapisuje embeddingi promptów i logit_scale (atomowo)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unikalny plik tymczasowy - procesy robocze mogą zapisywać ten sam plik równocześnie
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".tmp", delete=False) as f:
+        tmp_path = f.name
+        try:
+            np.savez(f, prompts=np.array(list(prompts)), embeddings=np.asarray(embeddings, dtype=np.float32),
+                     logit_scale=np.float32(logit_scale))
+        except BaseException:
+            f.close()
+            os.remove(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+
+
+def encode_prompts(clip_model, clip_processor, prompts):
+    """Koduje prompty wieżą tekstową; zwraca (znormalizowane embeddingi, logit_scale)"""
+    import torch
+
+    inputs = clip_processor(text=list(prompts), return_tensors="pt", padding=True)
+    with torch.no_grad():
+        # Bezpośrednio przez wieżę i projekcję - stabilne między wersjami transformers
+        text_outputs = clip_model.text_model(input_ids=inputs['input_ids'],
+                                             attention_mask=inputs['attention_mask'])
+        text_embeds = clip_model.text_projection(text_outputs.pooler_output)
+    text_embeds = text_embeds / text_embeds.norm(p=2, dim=-1, keepdim=True)
+    return text_embeds, clip_model.logit_scale.exp().item()
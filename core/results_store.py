@@ -0,0 +1,419 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from .categories import UNCERTAIN_FOLDER, UNCERTAIN_KEY, CategoryIndex, build_categories
+
+# Folder z wynikami przebiegu (w folderze wyjściowym)
+RESULTS_DIRNAME = ".run_results"
+# Wyniki przebiegu planowania: folder obok pliku planu (plan.jsonl.results), dołączany przy wykonaniu planu
+PLAN_RESULTS_SUFFIX = ".results"
+MANIFEST_FILENAME = "manifest.json"
+FILES_FILENAME = "files.jsonl"
+
+# Kolumny binarne: nazwa pliku -> typ danych (wiersz = jeden obraz)
+_PROBS = "probs.f32"
+_EMBEDDINGS = "embeddings.f16"
+_CATEGORY = "category.i16"
+_CONFIDENCE = "confidence.f32"
+_DTYPES = {_PROBS: np.float32, _EMBEDDINGS: np.float16, _CATEGORY: np.int16, _CONFIDENCE: np.float32}
+
+FORMAT_VERSION = 1
+
+# Kompaktowanie przy otwarciu, gdy zapis urósł tyle razy od ostatniego kompaktowania -
+# rozmiar śledzi liczbę plików w bibliotece, a nie liczbę przebiegów
+COMPACT_GROWTH = 2
+COMPACT_MIN_ROWS = 10000
+
+
+class ResultsStore:
+    """Kolumnowy zapis wyników przebiegu pozwalający przesortować pliki bez ponownej inferencji.
+
+    Dla każdego umieszczonego obrazu dopisywane są: ścieżka względna i miejsce
+    docelowe (files.jsonl), prawdopodobieństwa promptów (float32), embedding
+    (float16) oraz podjęta decyzja. Kolumny to surowe pliki o stałej długości
+    wiersza, czytane przez np.memmap; manifest opisuje kategorie i wymiary.
+    Kolejne przebiegi z tym samym modelem i promptami dopisują wiersze
+    (przy odczycie obowiązuje ostatni wiersz pliku), zmiana sygnatury zaczyna zapis od nowa.
+    Manifest zapamiętuje liczbę wierszy i długość files.jsonl, więc otwarcie
+    czyta tylko wiersze dopisane po ostatnim zamknięciu; przestarzałe wiersze
+    są usuwane, gdy zapis podwoi się od ostatniego kompaktowania.
+    """
+
+    def __init__(self, output_folder, categories, signature, logger, folder=None):
+        self.output_folder = os.path.abspath(output_folder)
+        # Miejsca docelowe są zawsze względne wobec folderu wyjściowego, także gdy zapis leży gdzie indziej
+        self.folder = os.path.abspath(folder) if folder else os.path.join(self.output_folder, RESULTS_DIRNAME)
+        self.categories = list(categories)
+        self.signature = signature
+        self.logger = logger
+
+        self._index = {category.name: position for position, category in enumerate(self.categories)}
+        self._prompt_count = sum(len(category.prompts) for category in self.categories)
+        self._embedding_dim = 0
+        self._rows = 0
+        self._files_bytes = 0
+        self._compacted_rows = None
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def open(self, fresh=False):
+        """Otwiera zapis: dopisuje do zgodnych wyników albo (także przy fresh) zaczyna od nowa"""
+        os.makedirs(self.folder, exist_ok=True)
+        manifest = read_manifest(self.folder) if not fresh else None
+        if manifest is not None and manifest.get('signature') == self.signature \
+                and manifest.get('prompt_count') == self._prompt_count:
+            self._embedding_dim = manifest.get('embedding_dim', 0)
+            self._rows, self._files_bytes = _committed_rows(self.folder, manifest)
+            self._compacted_rows = manifest.get('compacted_rows', 0)
+            if self._rows >= max(COMPACT_MIN_ROWS, COMPACT_GROWTH * self._compacted_rows):
+                self._compact()
+            self.logger.info(f"Wyniki przebiegu: dopisywanie do {self._rows} zapisanych wierszy")
+        else:
+            if manifest is not None:
+                self.logger.info("Zmienił się model lub prompty - zapis wyników przebiegu od nowa")
+            self._rows = 0
+            self._files_bytes = 0
+
+        self._truncate_to_rows()
+        for name in (FILES_FILENAME,) + tuple(_DTYPES):
+            self._files[name] = open(os.path.join(self.folder, name), 'a' if name == FILES_FILENAME else 'ab',
+                                     **({'encoding': 'utf-8'} if name == FILES_FILENAME else {}))
+        return self._rows
+
+    def _compact(self):
+        """Zostawia tylko najnowszy wiersz każdego pliku"""
+        self.logger.info(f"Kompaktowanie wyników przebiegu ({self._rows} wierszy)...")
+        results = StoredResults(self.folder)
+        _rewrite(results, results.dests)
+        manifest = read_manifest(self.folder)
+        self._rows, self._files_bytes = manifest['rows'], manifest['files_bytes']
+        self._compacted_rows = self._rows
+
+    def _truncate_to_rows(self):
+        """Obcina kolumny i files.jsonl do wspólnej liczby pełnych wierszy (np. po awarii)"""
+        widths = {_PROBS: self._prompt_count, _EMBEDDINGS: self._embedding_dim, _CATEGORY: 1, _CONFIDENCE: 1}
+        for name, dtype in _DTYPES.items():
+            path = os.path.join(self.folder, name)
+            with open(path, 'ab') as f:
+                f.truncate(self._rows * widths[name] * np.dtype(dtype).itemsize)
+
+        with open(os.path.join(self.folder, FILES_FILENAME), 'ab') as f:
+            f.truncate(self._files_bytes)
+
+    def append(self, filename, dest_path, result):
+        """Dopisuje wynik umieszczonego pliku"""
+        _, confidence, details = result
+        probs = details.get('prompt_probs')
+        probs = (np.asarray(probs, dtype=np.float32) if probs is not None
+                 else np.full(self._prompt_count, np.nan, dtype=np.float32))
+        embedding = details.get('embedding')
+        embedding = np.asarray(embedding, dtype=np.float16).ravel() if embedding is not None else None
+        self.append_row(filename, dest_path, probs, embedding, self._index.get(details.get('category'), -1),
+                        confidence)
+
+    def append_row(self, filename, dest_path, probs, embedding, category, confidence):
+        """Dopisuje wiersz z gotowych kolumn (category - indeks kategorii albo -1)"""
+        row = json.dumps([filename, os.path.relpath(dest_path, self.output_folder)], ensure_ascii=False)
+
+        with self._lock:
+            if not self._files:
+                return
+            self._files[_PROBS].write(probs.tobytes())
+            self._write_embedding(embedding)
+            self._files[_CATEGORY].write(np.int16(category).tobytes())
+            self._files[_CONFIDENCE].write(np.float32(confidence).tobytes())
+            self._files[FILES_FILENAME].write(row + "\n")
+            self._rows += 1
+
+    def _write_embedding(self, embedding):
+        """Zapisuje embedding wiersza (NaN, gdy go brak); wymiar ustala pierwszy embedding"""
+        if not self._embedding_dim:
+            if embedding is None:
+                return
+            # Wcześniejsze wiersze nie mają embeddingu - uzupełnij je wartościami NaN
+            self._embedding_dim = embedding.size
+            self._files[_EMBEDDINGS].write(np.full(self._rows * self._embedding_dim, np.nan,
+                                                   dtype=np.float16).tobytes())
+        if embedding is None or embedding.size != self._embedding_dim:
+            embedding = np.full(self._embedding_dim, np.nan, dtype=np.float16)
+        self._files[_EMBEDDINGS].write(embedding.tobytes())
+
+    def close(self):
+        """Zapisuje kolumny i manifest"""
+        with self._lock:
+            if not self._files:
+                return
+            for f in self._files.values():
+                f.close()
+            self._files = {}
+            self._files_bytes = os.path.getsize(os.path.join(self.folder, FILES_FILENAME))
+            if self._compacted_rows is None:
+                # Zapis od zera - wiersze jednego przebiegu nie mają przestarzałych poprzedników
+                self._compacted_rows = self._rows
+            write_manifest(self.folder, self._manifest())
+
+    def _manifest(self):
+        """Opis zapisanych kolumn"""
+        return {
+            'version': FORMAT_VERSION,
+            'signature': self.signature,
+            'categories': [category.to_dict() for category in self.categories],
+            'prompt_count': self._prompt_count,
+            'embedding_dim': self._embedding_dim,
+            'rows': self._rows,
+            'files_bytes': self._files_bytes,
+            'compacted_rows': self._compacted_rows
+        }
+
+
+class StoredResults:
+    """Wyniki wczytane z folderu .run_results (kolumny jako np.memmap, ostatni wiersz pliku wygrywa)"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.manifest = read_manifest(folder)
+        if self.manifest is None:
+            raise FileNotFoundError(f"Brak zapisanych wyników przebiegu w {folder}")
+
+        self.categories = build_categories(self.manifest['categories'])
+        prompt_count = self.manifest['prompt_count']
+        embedding_dim = self.manifest['embedding_dim']
+        rows, _ = _committed_rows(folder, self.manifest)
+
+        entries = [json.loads(line) for line in _read_lines(os.path.join(folder, FILES_FILENAME))[:rows]]
+        latest = {}
+        for row, (filename, _) in enumerate(entries):
+            latest[filename] = row
+        self.rows = np.array(sorted(latest.values()), dtype=np.int64)
+        self.files = [entries[row][0] for row in self.rows]
+        self.dests = [entries[row][1] for row in self.rows]
+
+        self.probs = _memmap(folder, _PROBS, rows, prompt_count)
+        self.embeddings = _memmap(folder, _EMBEDDINGS, rows, embedding_dim)
+        self.category = _memmap(folder, _CATEGORY, rows)
+        self.confidence = _memmap(folder, _CONFIDENCE, rows)
+
+    def __len__(self):
+        return len(self.files)
+
+    def close(self):
+        """Zwalnia mapowania kolumn (wymagane przed podmianą plików, np. w Windows)"""
+        self.probs = self.embeddings = self.category = self.confidence = None
+
+    def decide(self, confidence_threshold, chunk_size=65536):
+        """Zwraca (indeks kategorii lub -1 dla niepewnych, pewność) dla każdego pliku"""
+        index = CategoryIndex(self.categories)
+        categories = np.empty(len(self.rows), dtype=np.int64)
+        confidences = np.empty(len(self.rows), dtype=np.float32)
+
+        # Fragmentami - memmap nie jest wczytywany w całości
+        for start in range(0, len(self.rows), chunk_size):
+            rows = self.rows[start:start + chunk_size]
+            probs = np.asarray(self.probs[rows])
+            chosen = np.asarray(self.category[rows], dtype=np.int64)
+            confidence = np.asarray(self.confidence[rows], dtype=np.float32)
+
+            # Wiersze z prawdopodobieństwami promptów - decyzja liczona od nowa;
+            # pozostałe (filtr wstępny, błędy) zachowują zapisaną decyzję
+            valid = ~np.isnan(probs).any(axis=1) if probs.shape[1] else np.zeros(len(rows), dtype=bool)
+            if valid.any():
+                winners, best = index.decide(index.reduce(probs[valid]))
+                chosen[valid] = winners
+                confidence[valid] = best
+
+            chosen[(confidence < confidence_threshold) | (chosen < 0)] = -1
+            categories[start:start + len(rows)] = chosen
+            confidences[start:start + len(rows)] = confidence
+        return categories, confidences
+
+
+def resort(output_folder, confidence_threshold, logger, folder_map=None, progress_callback=None):
+    """Przenosi pliki w folderze wyjściowym według nowego progu i mapowania kategorii na foldery.
+
+    Korzysta wyłącznie z zapisanych wyników (bez modelu). `folder_map` to
+    słownik {nazwa kategorii: folder względny}; kategorie mogą dzielić folder.
+    Zwraca statystyki: liczniki kategorii, 'moved' i 'missing'.
+    """
+    output_folder = os.path.abspath(output_folder)
+    folder = os.path.join(output_folder, RESULTS_DIRNAME)
+    results = StoredResults(folder)
+    folder_map = dict(folder_map or {})
+
+    unknown = set(folder_map) - {category.name for category in results.categories}
+    if unknown:
+        raise ValueError(f"Nieznane kategorie w mapowaniu: {', '.join(sorted(unknown))}")
+    targets = [folder_map.get(category.name, category.folder) for category in results.categories]
+    for target in targets:
+        if os.path.isabs(target) or ".." in target.replace("\\", "/").split("/"):
+            raise ValueError(f"Folder {target} musi być ścieżką względną w folderze wyjściowym")
+
+    categories, _ = results.decide(confidence_threshold)
+    stats = {category.stat_key: 0 for category in results.categories}
+    stats.update({UNCERTAIN_KEY: 0, 'total_images': len(results), 'moved': 0, 'missing': 0})
+    logger.info(f"Przesortowanie {len(results)} plików z progiem {confidence_threshold}")
+
+    dests = []
+    for position, (filename, dest, category) in enumerate(zip(results.files, results.dests, categories)):
+        if category >= 0:
+            stats[results.categories[category].stat_key] += 1
+            new_dest = os.path.join(targets[category], filename)
+        else:
+            stats[UNCERTAIN_KEY] += 1
+            new_dest = os.path.join(UNCERTAIN_FOLDER, filename)
+        new_dest = os.path.normpath(new_dest)
+
+        if new_dest != os.path.normpath(dest):
+            source = os.path.join(output_folder, dest)
+            target = os.path.join(output_folder, new_dest)
+            if os.path.lexists(source):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(source, target)
+                stats['moved'] += 1
+            else:
+                stats['missing'] += 1
+                new_dest = dest
+        dests.append(new_dest)
+
+        if progress_callback is not None and (position % 500 == 0 or position == len(results) - 1):
+            progress_callback((position + 1) / len(results) * 100, f"{position + 1}/{len(results)}")
+
+    _rewrite(results, dests)
+    logger.info(f"Przesortowano: przeniesiono {stats['moved']} plików, brakujących {stats['missing']}")
+    return stats
+
+
+def plan_results_folder(plan_path):
+    """Folder wyników zapisanych przez przebieg planowania"""
+    return os.path.abspath(plan_path) + PLAN_RESULTS_SUFFIX
+
+
+def merge_plan_results(plan_path, output_folder, placed, logger):
+    """Dopisuje wyniki przebiegu planowania do zapisu w folderze wyjściowym (po wykonaniu planu).
+
+    `placed` to słownik {źródło z planu: ścieżka, pod którą plik faktycznie
+    umieszczono}; pliki, których nie umieszczono, są pomijane. Zwraca liczbę
+    dopisanych wierszy albo None, gdy plan nie ma zapisanych wyników.
+    """
+    folder = plan_results_folder(plan_path)
+    if read_manifest(folder) is None:
+        return None
+
+    stored = StoredResults(folder)
+    store = ResultsStore(output_folder, stored.categories, stored.manifest['signature'], logger)
+    store.open()
+    added = 0
+    try:
+        for filename, row in zip(stored.files, stored.rows):
+            dest_path = placed.get(filename.replace(os.sep, "/"))
+            if dest_path is None:
+                continue
+            embedding = np.asarray(stored.embeddings[row]) if stored.embeddings.shape[1] else None
+            store.append_row(filename, dest_path, np.asarray(stored.probs[row]), embedding,
+                             int(stored.category[row]), float(stored.confidence[row]))
+            added += 1
+    finally:
+        store.close()
+        stored.close()
+    logger.info(f"Wyniki przebiegu z planu: {added} wierszy w {store.folder}")
+    return added
+
+
+def _rewrite(results, dests):
+    """Zapisuje wyniki od nowa: tylko aktualne wiersze z nowymi miejscami docelowymi"""
+    folder = results.folder
+    rows = results.rows
+    manifest = dict(results.manifest, rows=len(rows), compacted_rows=len(rows))
+
+    columns = {_PROBS: results.probs, _EMBEDDINGS: results.embeddings, _CATEGORY: results.category,
+               _CONFIDENCE: results.confidence}
+    for name, column in columns.items():
+        with open(os.path.join(folder, name + ".tmp"), 'wb') as f:
+            for start in range(0, len(rows), 65536):
+                f.write(np.ascontiguousarray(column[rows[start:start + 65536]]).tobytes())
+    columns.clear()
+    results.close()
+    for name in _DTYPES:
+        os.replace(os.path.join(folder, name + ".tmp"), os.path.join(folder, name))
+
+    tmp_path = os.path.join(folder, FILES_FILENAME + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for filename, dest in zip(results.files, dests):
+            f.write(json.dumps([filename, dest], ensure_ascii=False) + "\n")
+    manifest['files_bytes'] = os.path.getsize(tmp_path)
+    os.replace(tmp_path, os.path.join(folder, FILES_FILENAME))
+    write_manifest(folder, manifest)
+
+
+def read_manifest(folder):
+    """Wczytuje manifest wyników albo None"""
+    try:
+        with open(os.path.join(folder, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == FORMAT_VERSION else None
+
+
+def write_manifest(folder, manifest):
+    """Zapisuje manifest (atomowo)"""
+    path = os.path.join(folder, MANIFEST_FILENAME)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def _read_lines(path):
+    """Pełne linie pliku tekstowego (ucięta ostatnia linia jest pomijana)"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line[:-1] for line in f if line.endswith("\n")]
+
+
+def _column_rows(folder, name, width):
+    """Liczba pełnych wierszy w kolumnie binarnej"""
+    path = os.path.join(folder, name)
+    if not width or not os.path.exists(path):
+        return None
+    return os.path.getsize(path) // (width * np.dtype(_DTYPES[name]).itemsize)
+
+
+def _committed_rows(folder, manifest):
+    """Zwraca (liczba wierszy kompletnych we wszystkich kolumnach, długość files.jsonl w bajtach).
+
+    Zaczyna od stanu zapisanego w manifeście i czyta tylko dalszą część
+    files.jsonl (wiersze dopisane przez przerwany przebieg). Gdy pliki nie
+    zgadzają się z manifestem, przelicza wszystko od początku.
+    """
+    rows, offset = (manifest['rows'], manifest['files_bytes']) if 'files_bytes' in manifest else (0, 0)
+    limits = [_column_rows(folder, name, width) for name, width in
+              ((_PROBS, manifest['prompt_count']), (_EMBEDDINGS, manifest.get('embedding_dim', 0)),
+               (_CATEGORY, 1), (_CONFIDENCE, 1))]
+    limit = min((count for count in limits if count is not None), default=None)
+
+    path = os.path.join(folder, FILES_FILENAME)
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if offset and (size < offset or (limit is not None and limit < rows)):
+        return _committed_rows(folder, dict(manifest, rows=0, files_bytes=0))
+    if not size:
+        return 0, 0
+
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if (limit is not None and rows >= limit) or not line.endswith(b"\n"):
+                break
+            rows += 1
+            offset += len(line)
+    return rows, offset
+
+
+def _memmap(folder, name, rows, width=None):
+    """Kolumna jako np.memmap tylko do odczytu (pusta tablica, gdy nie ma danych)"""
+    shape = (rows, width) if width is not None else (rows,)
+    if not rows or width == 0:
+        return np.zeros(shape, dtype=_DTYPES[name])
+    return np.memmap(os.path.join(folder, name), dtype=_DTYPES[name], mode='r', shape=shape)
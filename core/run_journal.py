@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+
+# Nazwa pliku dziennika tworzonego w folderze wyjściowym
+JOURNAL_FILENAME = ".run_journal.jsonl"
+
+
+class RunJournal:
+    """Dziennik zakończonych plików pozwalający wznowić przerwany przebieg.
+
+    Każdy plik jest dopisywany po umieszczeniu go w folderze docelowym.
+    Kolejny przebieg dla tej samej pary folderów pomija pliki z dziennika,
+    o ile nie zmieniły się od tego czasu. Po udanym zakończeniu dziennik jest usuwany.
+    """
+
+    # Co ile wpisów wymuszać zapis na dysk (fsync)
+    SYNC_INTERVAL = 50
+
+    def __init__(self, input_folder, output_folder, logger):
+        self.input_folder = os.path.abspath(input_folder)
+        self.output_folder = os.path.abspath(output_folder)
+        self.logger = logger
+        self.journal_path = os.path.join(output_folder, JOURNAL_FILENAME)
+
+        self._completed = {}
+        self._file = None
+        self._lock = threading.Lock()
+        self._unsynced = 0
+
+    def load(self):
+        """Wczytuje dziennik poprzedniego przebiegu i otwiera go do dopisywania"""
+        self._completed = {}
+
+        if os.path.exists(self.journal_path):
+            try:
+                with open(self.journal_path, 'r', encoding='utf-8') as f:
+                    header = json.loads(f.readline() or '{}')
+                    if header.get('input_folder') == self.input_folder:
+                        for line in f:
+                            try:
+                                entry = json.loads(line)
+                            except json.JSONDecodeError:
+                                # Ostatnia linia mogła zostać ucięta przy awarii
+                                continue
+                            self._completed[entry['file']] = (entry['size'], entry['mtime_ns'])
+                    else:
+                        self.logger.info("Dziennik dotyczy innego folderu wejściowego - pomijam go")
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Nie można odczytać dziennika przebiegu: {e}")
+                self._completed = {}
+
+        if self._completed:
+            # Kontynuuj istniejący dziennik
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+            self.logger.info(f"Znaleziono dziennik przerwanego przebiegu: {len(self._completed)} plików gotowych")
+        else:
+            self._file = open(self.journal_path, 'w', encoding='utf-8')
+            self._file.write(json.dumps({'input_folder': self.input_folder,
+                                         'output_folder': self.output_folder}) + "\n")
+            self._sync()
+
+        return len(self._completed)
+
+    def is_completed(self, filename, file_path):
+        """Sprawdza czy plik został już przetworzony i od tego czasu się nie zmienił"""
+        recorded = self._completed.get(filename)
+        if recorded is None:
+            return False
+
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+
+        return recorded == (stat.st_size, stat.st_mtime_ns)
+
+    def record(self, filename, file_path, dest_path, category):
+        """Dopisuje plik umieszczony w folderze docelowym"""
+        try:
+            stat = os.stat(file_path)
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+        except OSError:
+            # Plik źródłowy mógł zostać przeniesiony - zapisz stan z pliku docelowego
+            stat = os.stat(dest_path)
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+
+        entry = {
+            'file': filename,
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'dest': os.path.relpath(dest_path, self.output_folder),
+            'category': category
+        }
+
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.SYNC_INTERVAL:
+                self._sync()
+
+    def _sync(self):
+        """Wymusza zapis dziennika na dysk"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        """Zamyka dziennik, zachowując go do wznowienia"""
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+    def finish(self):
+        """Zamyka i usuwa dziennik po udanym zakończeniu przebiegu"""
+        self.close()
+        try:
+            os.remove(self.journal_path)
+        except OSError as e:
+            self.logger.warning(f"Nie można usunąć dziennika przebiegu: {e}")
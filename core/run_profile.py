@@ -0,0 +1,250 @@
+import json
+import os
+import platform
+import threading
+import time
+
+# Nazwy plików profilu w folderze wyjściowym
+PROFILE_FILENAME = "run_profile.json"
+TRACE_BASENAME = "run_trace"
+
+# Rodzaje śladu wykonania (opcjonalne)
+TRACE_CPROFILE = "cprofile"
+TRACE_TORCH = "torch"
+TRACE_KINDS = (TRACE_CPROFILE, TRACE_TORCH)
+DEFAULT_TRACE_IMAGES = 32
+
+# Granice koszyków histogramu: 50 µs * 2^k (do ~52 s), ostatni koszyk bez górnej granicy
+_BUCKET_BOUNDS = tuple(50e-6 * 2 ** k for k in range(21))
+
+
+class _Measure:
+    """Kontekst mierzący czas jednego wywołania etapu"""
+
+    __slots__ = ('_profiler', '_stage', '_items', '_start')
+
+    def __init__(self, profiler, stage, items):
+        self._profiler = profiler
+        self._stage = stage
+        self._items = items
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._profiler.record(self._stage, time.perf_counter() - self._start, self._items)
+        return False
+
+
+class _NullMeasure:
+    """Pusty kontekst, gdy profilowanie jest wyłączone"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_MEASURE = _NullMeasure()
+
+
+def measure(profiler, stage, items=1):
+    """Zwraca kontekst mierzący etap albo pusty kontekst, gdy profiler to None"""
+    if profiler is None:
+        return _NULL_MEASURE
+    return _Measure(profiler, stage, items)
+
+
+class RunProfiler:
+    """Agreguje czasy etapów w histogramy przy pomijalnym narzucie.
+
+    Każdy wątek zapisuje pomiary we własnym słowniku (bez blokad na ścieżce
+    obrazu); snapshot() scala je przy odczycie. Dla etapu przechowywane są:
+    liczba wywołań, liczba obrazów, suma, minimum, maksimum i histogram
+    w koszykach wykładniczych.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def measure(self, stage, items=1):
+        """Kontekst mierzący jedno wywołanie etapu (items - liczba obrazów w wywołaniu)"""
+        return _Measure(self, stage, items)
+
+    def record(self, stage, seconds, items=1):
+        """Dopisuje pomiar etapu"""
+        shard = getattr(self._local, 'stages', None)
+        if shard is None:
+            shard = self._local.stages = {}
+            with self._lock:
+                self._shards.append(shard)
+
+        entry = shard.get(stage)
+        if entry is None:
+            entry = shard[stage] = [0, 0, 0.0, seconds, seconds, [0] * (len(_BUCKET_BOUNDS) + 1)]
+        entry[0] += 1
+        entry[1] += items
+        entry[2] += seconds
+        if seconds < entry[3]:
+            entry[3] = seconds
+        if seconds > entry[4]:
+            entry[4] = seconds
+        entry[5][_bucket_index(seconds)] += 1
+
+    def raw(self):
+        """Zwraca scalone surowe agregaty {etap: [wywołania, obrazy, suma, min, max, koszyki]}"""
+        with self._lock:
+            shards = list(self._shards)
+
+        merged = {}
+        for shard in shards:
+            for stage, entry in list(shard.items()):
+                merge_raw(merged, {stage: entry})
+        return merged
+
+    def drain(self):
+        """Zwraca surowe agregaty i zeruje licznik (do przesyłania z procesów roboczych)"""
+        with self._lock:
+            shards = self._shards
+            self._shards = []
+            self._local = threading.local()
+
+        merged = {}
+        for shard in shards:
+            merge_raw(merged, shard)
+        return merged
+
+    def merge(self, raw):
+        """Dołącza surowe agregaty z innego profilera (np. procesu roboczego)"""
+        if not raw:
+            return
+        shard = {}
+        merge_raw(shard, raw)
+        with self._lock:
+            self._shards.append(shard)
+
+    def snapshot(self):
+        """Zwraca podsumowanie etapów gotowe do zapisu w JSON"""
+        return {stage: _summarize(entry) for stage, entry in sorted(self.raw().items())}
+
+
+def merge_raw(target, raw):
+    """Scala surowe agregaty raw do słownika target"""
+    for stage, (calls, items, total, minimum, maximum, buckets) in raw.items():
+        entry = target.get(stage)
+        if entry is None:
+            target[stage] = [calls, items, total, minimum, maximum, list(buckets)]
+            continue
+        entry[0] += calls
+        entry[1] += items
+        entry[2] += total
+        entry[3] = min(entry[3], minimum)
+        entry[4] = max(entry[4], maximum)
+        entry[5] = [a + b for a, b in zip(entry[5], buckets)]
+
+
+def _bucket_index(seconds):
+    """Indeks koszyka histogramu dla czasu w sekundach"""
+    for index, bound in enumerate(_BUCKET_BOUNDS):
+        if seconds <= bound:
+            return index
+    return len(_BUCKET_BOUNDS)
+
+
+def _bucket_label(index):
+    """Etykieta koszyka, np. '<=0.8ms'"""
+    if index < len(_BUCKET_BOUNDS):
+        return f"<={_BUCKET_BOUNDS[index] * 1000:g}ms"
+    return f">{_BUCKET_BOUNDS[-1] * 1000:g}ms"
+
+
+def _summarize(entry):
+    """Zamienia surowy agregat etapu na słownik z percentylami (górne granice koszyków)"""
+    calls, items, total, minimum, maximum, buckets = entry
+    summary = {
+        'calls': calls,
+        'items': items,
+        'total_s': round(total, 6),
+        'mean_ms': round(total / calls * 1000, 4) if calls else 0.0,
+        'per_item_ms': round(total / items * 1000, 4) if items else 0.0,
+        'min_ms': round(minimum * 1000, 4),
+        'max_ms': round(maximum * 1000, 4)
+    }
+
+    for percentile in (50, 90, 99):
+        threshold = calls * percentile / 100
+        cumulative = 0
+        for index, count in enumerate(buckets):
+            cumulative += count
+            if cumulative >= threshold and count:
+                bound = _BUCKET_BOUNDS[index] if index < len(_BUCKET_BOUNDS) else maximum
+                summary[f'p{percentile}_ms'] = round(min(bound, maximum) * 1000, 4)
+                break
+
+    summary['histogram'] = {_bucket_label(index): count for index, count in enumerate(buckets) if count}
+    return summary
+
+
+def system_info():
+    """Informacje o maszynie przydatne przy porównywaniu przebiegów"""
+    info = {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count()
+    }
+    if hasattr(os, 'getloadavg'):
+        info['load_average'] = [round(value, 2) for value in os.getloadavg()]
+    try:
+        import torch
+        info['torch'] = torch.__version__
+        info['torch_threads'] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return info
+
+
+def write_profile(path, profile):
+    """Zapisuje profil przebiegu jako JSON (atomowo)"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def capture_trace(kind, classifier, image_paths, batch_size, output_folder, logger):
+    """Klasyfikuje próbkę obrazów pod cProfile lub torch.profiler i zapisuje ślad.
+
+    Zwraca ścieżkę pliku śladu. Próbka przechodzi pełną ścieżkę obrazu
+    (wczytanie, przygotowanie, inferencja) w bieżącym wątku.
+    """
+    if kind == TRACE_CPROFILE:
+        import cProfile
+
+        path = os.path.join(output_folder, TRACE_BASENAME + ".prof")
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            classifier.classify_batch(image_paths, batch_size=batch_size, verbose=False)
+        finally:
+            profiler.disable()
+        profiler.dump_stats(path)
+
+    elif kind == TRACE_TORCH:
+        from torch.profiler import profile, ProfilerActivity
+
+        path = os.path.join(output_folder, TRACE_BASENAME + ".json")
+        with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as profiler:
+            classifier.classify_batch(image_paths, batch_size=batch_size, verbose=False)
+        profiler.export_chrome_trace(path)
+
+    else:
+        raise ValueError(f"Nieznany rodzaj śladu: {kind} (dostępne: {', '.join(TRACE_KINDS)})")
+
+    logger.info(f"Zapisano ślad wykonania ({kind}, {len(image_paths)} obrazów): {path}")
+    return path
@@ -1,3 +1,4 @@
+import threading
 import tkinter as tk
 from tkinter import messagebox, filedialog
 
@@ -6,7 +7,16 @@ from utils.i18n import I18nManager
 from utils.settings_manager import SettingsManager
 
 from core.clip_classifier import CLIPClassifier
-from core.image_processor import ImageProcessor
+from core.inference_backends import BACKEND_PYTORCH, COMPILE_NONE, PRECISION_FP32
+from core.classification_cache import DEFAULT_MAX_ENTRIES
+from core.dedup import DEFAULT_MAX_DISTANCE
+from core.progress import ProgressChannel, TkProgressPump
+from core.run_profile import DEFAULT_TRACE_IMAGES
+from core.directory_scanner import DEFAULT_SCAN_BUFFER, SYMLINKS_FILES
+from core.file_placement import PLACEMENT_COPY
+from core.folder_watcher import DEFAULT_DEBOUNCE, DEFAULT_POLL_INTERVAL, WATCH_AUTO, FolderWatcher
+from core.image_loader import DEFAULT_MAX_PIXELS
+from core.image_processor import ImageProcessor, DEFAULT_DECODE_WORKERS, DEFAULT_IO_WORKERS
 from .ui_components import UIComponents
 
 
@@ -29,12 +39,25 @@ class CLIPScreenshotFilterGUI:
         self.output_path = tk.StringVar(value=self.settings.get('last_output_folder', ''))
         self.confidence_var = tk.DoubleVar(value=self.settings.get('confidence_threshold', 0.6))
         self.verbose_logs = tk.BooleanVar(value=self.settings.get('verbose_logs', True))
+        self.batch_size = tk.IntVar(value=self.settings.get('batch_size', 16))
+        self.watch_mode = tk.BooleanVar(value=self.settings.get('watch_mode', False))
         self.is_dark_theme = tk.BooleanVar(value=self.settings.get('dark_theme', True))
 
         # Komponenty
         self.ui = UIComponents(self.root, self)
-        self.classifier = CLIPClassifier(logger)
+        self.classifier = CLIPClassifier(logger,
+                                         backend=self.settings.get('inference_backend', BACKEND_PYTORCH),
+                                         onnx_quantize=self.settings.get('onnx_quantize', True),
+                                         fast_decode=self.settings.get('fast_decode', True),
+                                         lean=self.settings.get('lean_model', False),
+                                         precision=self.settings.get('precision', PRECISION_FP32),
+                                         compile_mode=self.settings.get('compile_mode', COMPILE_NONE),
+                                         max_pixels=self.settings.get('max_pixels', DEFAULT_MAX_PIXELS),
+                                         prefilter=self._prefilter_settings(),
+                                         categories=self.settings.get('categories'))
         self.processor = ImageProcessor(logger)
+        self._progress_pump = None
+        self.watcher = None
 
         # Zastosuj domyślny motyw
         self.apply_theme()
@@ -48,6 +71,12 @@ class CLIPScreenshotFilterGUI:
         # Bind zamykania okna
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
+    def _prefilter_settings(self):
+        """Zwraca progi filtra wstępnego z ustawień (None = filtr wyłączony)"""
+        if not self.settings.get('prefilter_enabled', False):
+            return None
+        return self.settings.get('prefilter_thresholds') or {}
+
     def apply_theme(self):
         """Aplikuje wybrany motyw"""
         try:
@@ -155,32 +184,118 @@ class CLIPScreenshotFilterGUI:
             'input_folder': self.folder_path.get(),
             'output_folder': self.output_path.get(),
             'confidence_threshold': self.confidence_var.get(),
-            'verbose_logs': self.verbose_logs.get()
+            'verbose_logs': self.verbose_logs.get(),
+            'batch_size': self.batch_size.get(),
+            'decode_workers': self.settings.get('decode_workers', DEFAULT_DECODE_WORKERS),
+            'io_workers': self.settings.get('io_workers', DEFAULT_IO_WORKERS),
+            'placement_mode': self.settings.get('placement_mode', PLACEMENT_COPY),
+            'include_patterns': self.settings.get('include_patterns', []),
+            'exclude_patterns': self.settings.get('exclude_patterns', []),
+            'symlinks': self.settings.get('symlinks', SYMLINKS_FILES),
+            'max_depth': self.settings.get('max_depth'),
+            'dedup': self.settings.get('dedup', False),
+            'dedup_distance': self.settings.get('dedup_distance', DEFAULT_MAX_DISTANCE),
+            'duplicates_folder': self.settings.get('duplicates_folder', False),
+            'use_cache': self.settings.get('use_cache', True),
+            'cache_max_entries': self.settings.get('cache_max_entries', DEFAULT_MAX_ENTRIES),
+            'cache_content_hash': self.settings.get('cache_content_hash', False),
+            'resume': self.settings.get('resume', True),
+            'save_results': self.settings.get('save_results', True),
+            'write_profile': self.settings.get('write_profile', True),
+            'profile_trace': self.settings.get('profile_trace'),
+            'profile_trace_images': self.settings.get('profile_trace_images', DEFAULT_TRACE_IMAGES),
+            'process_workers': self.settings.get('process_workers', 1),
+            'max_in_flight': self.settings.get('max_in_flight'),
+            'scan_buffer': self.settings.get('scan_buffer', DEFAULT_SCAN_BUFFER),
+            'threads_per_worker': self.settings.get('threads_per_worker')
         }
 
         # Zapisz ustawienia
         self.settings.set('confidence_threshold', self.confidence_var.get())
         self.settings.set('verbose_logs', self.verbose_logs.get())
+        self.settings.set('batch_size', self.batch_size.get())
+        self.settings.set('watch_mode', self.watch_mode.get())
+
+        # Rozpocznij przetwarzanie - postęp i wynik trafiają do wątku Tk przez kanał postępu
+        progress = ProgressChannel()
+        self._progress_pump = TkProgressPump(
+            self.root, progress,
+            lambda snapshot: self.ui.update_progress(snapshot.percent, snapshot.status_text())
+        )
+
+        self._progress_pump.start()
+        if self.watch_mode.get():
+            self._start_watching(config, progress)
+            return
 
-        # Rozpocznij przetwarzanie
         self.ui.start_processing()
         self.processor.process_images(
             config,
             self.classifier,
-            self.ui.update_progress,
-            self._on_processing_complete
+            progress,
+            lambda result: progress.post(self._on_processing_complete, result)
         )
 
     def _on_processing_complete(self, result):
-        """Callback po zakończeniu przetwarzania"""
+        """Callback po zakończeniu przetwarzania (w wątku Tk)"""
+        if self._progress_pump is not None:
+            self._progress_pump.stop()
+            self._progress_pump = None
         self.ui.finish_processing()
         messagebox.showinfo(self.i18n.get('classification_results'), result)
 
+    def _start_watching(self, config, progress):
+        """Uruchamia obserwację folderu w osobnym wątku (model pozostaje załadowany)"""
+        def on_batch(result, totals):
+            progress.post(self.ui.update_status,
+                          self.i18n.get('watching_folder').format(count=totals['total_images']), "green")
+
+        self.watcher = FolderWatcher(
+            self.processor, self.classifier, config, self.logger, progress_callback=progress,
+            poll_interval=self.settings.get('watch_poll_interval', DEFAULT_POLL_INTERVAL),
+            debounce=self.settings.get('watch_debounce', DEFAULT_DEBOUNCE),
+            backend=self.settings.get('watch_backend', WATCH_AUTO),
+            process_existing=self.settings.get('watch_process_existing', True),
+            on_batch=on_batch
+        )
+
+        def watch():
+            try:
+                self.watcher.run()
+                message = None
+            except Exception as e:
+                self.logger.error(f"Błąd trybu obserwacji: {e}")
+                message = f"Wystąpił błąd podczas obserwacji folderu: {e}"
+            progress.post(self._on_watch_stopped, message)
+
+        self.ui.start_watching()
+        thread = threading.Thread(target=watch)
+        thread.daemon = True
+        thread.start()
+
+    def stop_watching(self):
+        """Kończy obserwację folderu po bieżącej mikropartii"""
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.ui.disable_filter_button()
+
+    def _on_watch_stopped(self, error_message):
+        """Callback po zakończeniu obserwacji (w wątku Tk)"""
+        self.watcher = None
+        if self._progress_pump is not None:
+            self._progress_pump.stop()
+            self._progress_pump = None
+        self.ui.finish_processing()
+        if error_message:
+            messagebox.showerror(self.i18n.get('error'), error_message)
+
     def update_confidence_label(self, value):
         """Aktualizuje label z wartością progu pewności"""
         self.ui.update_confidence_display(float(value))
 
     def on_closing(self):
         """Obsługuje zamknięcie aplikacji"""
+        if self.watcher is not None:
+            self.watcher.stop()
         self.settings.save()
         self.root.destroy()
@@ -23,6 +23,8 @@ class UIComponents:
         self.description_label = None
         self.confidence_text_label = None
         self.verbose_check = None
+        self.batch_size_label = None
+        self.watch_check = None
         self.title_label = None
         self.subtitle_label = None
 
@@ -157,6 +159,19 @@ class UIComponents:
                                              variable=self.main_app.verbose_logs)
         self.verbose_check.grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=(10, 0))
 
+        # Rozmiar partii dla modelu
+        self.batch_size_label = ttk.Label(self.config_frame, text=self.main_app.i18n.get('batch_size'))
+        self.batch_size_label.grid(row=2, column=0, sticky=tk.W, pady=(10, 0))
+
+        batch_size_spinbox = ttk.Spinbox(self.config_frame, from_=1, to=256, width=6,
+                                         textvariable=self.main_app.batch_size)
+        batch_size_spinbox.grid(row=2, column=1, sticky=tk.W, padx=(10, 0), pady=(10, 0))
+
+        # Tryb obserwacji folderu
+        self.watch_check = ttk.Checkbutton(self.config_frame, text=self.main_app.i18n.get('watch_mode'),
+                                           variable=self.main_app.watch_mode)
+        self.watch_check.grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=(10, 0))
+
         return row + 1
 
     def _create_description(self, parent, row):
@@ -213,6 +228,10 @@ class UIComponents:
             self.confidence_text_label.config(text=self.main_app.i18n.get('confidence_threshold'))
         if self.verbose_check:
             self.verbose_check.config(text=self.main_app.i18n.get('verbose_logs'))
+        if self.batch_size_label:
+            self.batch_size_label.config(text=self.main_app.i18n.get('batch_size'))
+        if self.watch_check:
+            self.watch_check.config(text=self.main_app.i18n.get('watch_mode'))
 
         # Description
         if self.description_label:
@@ -220,7 +239,8 @@ class UIComponents:
 
         # Processing controls
         if self.filter_button:
-            self.filter_button.config(text=self.main_app.i18n.get('start_classification'))
+            button_text = 'stop_watching' if self.main_app.watcher is not None else 'start_classification'
+            self.filter_button.config(text=self.main_app.i18n.get(button_text))
 
         # Sprawdź czy model jest gotowy i zaktualizuj status
         if self.main_app.classifier.is_loaded():
@@ -266,9 +286,25 @@ class UIComponents:
             self.progress.configure(mode='determinate', value=0)
         self.update_status(self.main_app.i18n.get('analyzing_images'), "orange")
 
+    def start_watching(self):
+        """Ustawia interfejs w tryb obserwacji folderu - przycisk zatrzymuje obserwację"""
+        if self.filter_button:
+            self.filter_button.config(text=self.main_app.i18n.get('stop_watching'),
+                                      command=self.main_app.stop_watching, state="normal")
+        if self.watch_check:
+            self.watch_check.config(state="disabled")
+        if self.progress:
+            self.progress.configure(mode='determinate', value=0)
+        self.update_status(self.main_app.i18n.get('watching_folder').format(count=0), "green")
+
     def finish_processing(self):
         """Kończy tryb przetwarzania"""
         if self.progress:
             self.progress['value'] = 0
+        if self.filter_button:
+            self.filter_button.config(text=self.main_app.i18n.get('start_classification'),
+                                      command=self.main_app.start_filtering)
+        if self.watch_check:
+            self.watch_check.config(state="normal")
         self.enable_filter_button()
         self.update_status(self.main_app.i18n.get('ready_for_next'), "blue")
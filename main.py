@@ -1,12 +1,20 @@
 import logging
-import tkinter as tk
-
-from gui.main_window import CLIPScreenshotFilterGUI
-from utils.logger import setup_logging
+import sys
 
 
 def main():
     """Główna funkcja programu"""
+    # Tryb bez GUI - nie importuj Tkinter ani sv_ttk
+    if "--cli" in sys.argv[1:]:
+        from core.cli import main as cli_main
+        sys.exit(cli_main([arg for arg in sys.argv[1:] if arg != "--cli"]))
+
+    import tkinter as tk
+    from tkinter import messagebox
+
+    from gui.main_window import CLIPScreenshotFilterGUI
+    from utils.logger import setup_logging
+
     try:
         # Konfiguruj logowanie
         logger = setup_logging()
@@ -21,7 +29,7 @@ def main():
 
     except Exception as e:
         logging.error(f"Krytyczny błąd aplikacji: {e}")
-        tk.messagebox.showerror("Błąd krytyczny", f"Wystąpił nieoczekiwany błąd:\n{e}")
+        messagebox.showerror("Błąd krytyczny", f"Wystąpił nieoczekiwany błąd:\n{e}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,66 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from core.classification_server import ClassificationServer
+
+
+class _FakeClassifier:
+    """Klasyfikator zastępczy: wolne dekodowanie, zapisuje rozmiary partii"""
+
+    max_pixels = 0
+
+    def __init__(self, decode_seconds=0.02):
+        self.decode_seconds = decode_seconds
+        self.batch_sizes = []
+        self._lock = threading.Lock()
+
+    def prepare_or_prefilter(self, item, use_prefilter):
+        time.sleep(self.decode_seconds)  # dłużej niż okno łączenia partii
+        return item, None
+
+    def classify_prepared(self, prepared, names, verbose=False):
+        with self._lock:
+            self.batch_sizes.append(len(prepared))
+        return [(False, 0.9, {'prompt_probs': [0.1, 0.9]}) for _ in prepared]
+
+
+@pytest.fixture
+def server():
+    classifier = _FakeClassifier()
+    server = ClassificationServer(classifier, logging.getLogger("test"), address="127.0.0.1:0",
+                                  batch_size=8, decode_workers=4)
+    yield server
+    server.close()
+
+
+def test_request_images_share_forward_batches(server):
+    paths = [f"/obraz_{i}.png" for i in range(11)]
+    status, payload = server.handle_classify({'paths': paths})
+
+    assert status == 200
+    assert len(payload['results']) == len(paths)
+    assert all(result['prompt_probs'] == [0.1, 0.9] for result in payload['results'])
+    assert server.classifier.batch_sizes == [8, 3]
+
+
+def test_concurrent_requests_are_coalesced(server):
+    requests = [{'paths': [f"/r{r}_{i}.png" for i in range(3)]} for r in range(4)]
+    threads = [threading.Thread(target=server.handle_classify, args=(request,)) for request in requests]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(server.classifier.batch_sizes) == 12
+    assert len(server.classifier.batch_sizes) < 12
+
+
+@pytest.mark.parametrize("request_body", [[], "x", {'paths': "a.png"}, {'paths': [1, 2]},
+                                          {'images': ["@@nie base64@@"]}, {'images': {}}, {}])
+def test_malformed_requests_get_400(server, request_body):
+    status, payload = server.handle_classify(request_body)
+    assert status == 400
+    assert payload['error']
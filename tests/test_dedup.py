@@ -0,0 +1,48 @@
+import logging
+import random
+
+import pytest
+from PIL import Image
+
+from benchmarks.corpus import render_code_image
+from core.dedup import find_duplicates
+
+
+def _dark_code_screenshots(count, width=1280, height=720):
+    """Różne screenshoty kodu w ciemnych motywach (ten sam układ IDE, inny tekst)"""
+    images = []
+    seed = 0
+    while len(images) < count:
+        image = render_code_image(width, height, random.Random(seed))
+        seed += 1
+        if sum(image.getpixel((width - 1, height - 1))) < 3 * 64:
+            images.append(image)
+    return images
+
+
+@pytest.fixture
+def folder(tmp_path):
+    names = []
+    for index, image in enumerate(_dark_code_screenshots(12)):
+        name = f"code_{index:02d}.png"
+        image.save(tmp_path / name)
+        names.append(name)
+    return tmp_path, names
+
+
+def test_distinct_dark_code_screenshots_are_not_merged(folder):
+    path, names = folder
+    groups = find_duplicates(names, str(path), logging.getLogger("test"))
+
+    assert groups.duplicate_count == 0
+    assert groups.representatives == names
+
+
+def test_resized_copy_is_still_a_near_duplicate(folder):
+    path, names = folder
+    with Image.open(path / names[0]) as image:
+        image.resize((image.width // 2, image.height // 2)).save(path / "copy.jpg", quality=80)
+
+    groups = find_duplicates(names + ["copy.jpg"], str(path), logging.getLogger("test"))
+
+    assert groups.duplicates == {names[0]: [("copy.jpg", str(path / "copy.jpg"), False)]}
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from core.preprocessing import ClipImagePreprocessor, PARITY_TOLERANCE, check_processor_parity
+
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("torch")
+
+
+def _image(width, height, mode, seed=0):
+    """Obraz testowy: gradient z szumem (wykrywa różnice w skalowaniu i wycinaniu)"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 20, base.shape), 0, 255).astype(np.uint8)
+    image = Image.fromarray(pixels, 'RGB')
+
+    if mode == 'RGBA':
+        # Przezroczystość zmienna w poziomie - od pełnej do zerowej
+        alpha = np.broadcast_to(np.linspace(255, 0, width, dtype=np.float32), (height, width))
+        image.putalpha(Image.fromarray(alpha.astype(np.uint8)))
+    elif mode == 'P':
+        image = image.quantize(colors=64)
+    elif mode != 'RGB':
+        image = image.convert(mode)
+    return image
+
+
+@pytest.fixture(scope="module")
+def processor():
+    return transformers.CLIPImageProcessor()
+
+
+@pytest.mark.parametrize("size", [(224, 224), (317, 251), (251, 317), (1000, 200), (200, 1000), (100, 60),
+                                  (640, 480), (225, 224)])
+@pytest.mark.parametrize("mode", ['RGB', 'RGBA', 'P', 'L'])
+def test_matches_clip_image_processor(processor, size, mode):
+    preprocessor = ClipImagePreprocessor.from_processor(processor)
+    image = _image(*size, mode)
+    assert check_processor_parity(preprocessor, processor, [image]) <= PARITY_TOLERANCE
+
+
+def test_batch_matches_clip_image_processor(processor):
+    preprocessor = ClipImagePreprocessor.from_processor(processor)
+    images = [_image(317, 251, 'RGB', seed=1), _image(800, 600, 'L', seed=2), _image(120, 300, 'P', seed=3)]
+    assert check_processor_parity(preprocessor, processor, images) <= PARITY_TOLERANCE
+
+
+def test_custom_sizes_from_processor():
+    processor = transformers.CLIPImageProcessor(size={'shortest_edge': 256}, crop_size={'height': 240, 'width': 240})
+    preprocessor = ClipImagePreprocessor.from_processor(processor)
+    assert (preprocessor.size, preprocessor.crop_size) == (256, 240)
+    assert check_processor_parity(preprocessor, processor, [_image(500, 333, 'RGB')]) <= PARITY_TOLERANCE
@@ -0,0 +1,37 @@
+import logging
+import queue
+
+import pytest
+
+from core.process_pool import _MSG_ERROR, ProcessPoolClassifier
+
+
+class _ExitedProcess:
+    """Proces roboczy, który już się zakończył"""
+
+    pid = 1234
+
+    def __init__(self, exitcode):
+        self.exitcode = exitcode
+
+
+def _pool(exitcode, messages=()):
+    pool = ProcessPoolClassifier({}, 1, logging.getLogger("test"))
+    pool._processes = [_ExitedProcess(exitcode)]
+    pool._result_queue = queue.Queue()
+    for message in messages:
+        pool._result_queue.put(message)
+    return pool
+
+
+def test_worker_error_message_wins_over_exit_code():
+    pool = _pool(0, [(_MSG_ERROR, 1234, "OSError: brak modelu")])
+
+    assert pool._get_message(timeout=None) == (_MSG_ERROR, 1234, "OSError: brak modelu")
+
+
+def test_dead_worker_without_message_fails_the_run():
+    pool = _pool(-9)
+
+    with pytest.raises(RuntimeError, match="kod wyjścia -9"):
+        pool._get_message(timeout=None)
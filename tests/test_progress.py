@@ -0,0 +1,20 @@
+import time
+
+from core.progress import ProgressChannel
+
+
+def test_reset_excludes_idle_time_from_rate():
+    snapshots = []
+    channel = ProgressChannel(listener=snapshots.append, min_interval=0)
+    channel.publish(10, 10, force=True)
+
+    time.sleep(0.5)  # bezczynność między mikropartiami trybu obserwacji
+    channel.reset()
+    assert channel.poll() is None
+
+    channel.publish(0, 10, force=True)
+    time.sleep(0.3)
+    channel.publish(10, 10, force=True)
+
+    assert snapshots[-1].rate > 20
+    assert snapshots[-1].elapsed < 0.45
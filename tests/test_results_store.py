@@ -0,0 +1,43 @@
+import logging
+import os
+
+import numpy as np
+
+from core.categories import build_categories
+from core.results_store import (RESULTS_DIRNAME, ResultsStore, StoredResults, merge_plan_results,
+                                plan_results_folder)
+
+
+def _result(category, probs):
+    return True, max(probs), {'category': category, 'prompt_probs': probs, 'embedding': np.ones(4)}
+
+
+def test_plan_results_land_in_output_folder_with_actual_destinations(tmp_path):
+    logger = logging.getLogger("test")
+    categories = build_categories()
+    prompt_count = sum(len(category.prompts) for category in categories)
+    output = tmp_path / "out"
+    plan_path = tmp_path / "plan.jsonl"
+
+    store = ResultsStore(output, categories, "sig", logger, folder=plan_results_folder(plan_path))
+    store.open(fresh=True)
+    for name in ("a.png", os.path.join("sub", "b.png"), "c.png"):
+        store.append(name, os.path.join(output, "code_screenshots", name),
+                     _result("code", [0.9] + [0.01] * (prompt_count - 1)))
+    store.close()
+    assert not (output / RESULTS_DIRNAME).exists()
+
+    # b.png umieszczony pod nową nazwą, c.png nie został umieszczony
+    placed = {"a.png": str(output / "code_screenshots" / "a.png"),
+              "sub/b.png": str(output / "code_screenshots" / "sub" / "b_1.png")}
+    assert merge_plan_results(plan_path, output, placed, logger) == 2
+
+    stored = StoredResults(str(output / RESULTS_DIRNAME))
+    assert stored.files == ["a.png", os.path.join("sub", "b.png")]
+    assert stored.dests == [os.path.join("code_screenshots", "a.png"),
+                            os.path.join("code_screenshots", "sub", "b_1.png")]
+    assert np.allclose(stored.embeddings[stored.rows], 1.0)
+
+
+def test_merge_without_plan_results_is_a_no_op(tmp_path):
+    assert merge_plan_results(tmp_path / "plan.jsonl", tmp_path / "out", {}, logging.getLogger("test")) is None
@@ -25,6 +25,10 @@ class I18nManager:
                 'configuration': 'Konfiguracja',
                 'confidence_threshold': 'Próg pewności (0.0-1.0):',
                 'verbose_logs': 'Szczegółowe logi',
+                'batch_size': 'Rozmiar partii (obrazy na przebieg modelu):',
+                'watch_mode': 'Obserwuj folder (klasyfikuj nowe obrazy na bieżąco)',
+                'stop_watching': '⏹ Zatrzymaj obserwację',
+                'watching_folder': 'Obserwacja folderu... sklasyfikowano: {count}',
                 'toggle_theme': '🌓 Przełącz motyw',
                 'toggle_language': '🌐 EN',
                 'start_classification': '🚀 Uruchom klasyfikację AI',
@@ -71,6 +75,10 @@ class I18nManager:
                 'configuration': 'Configuration',
                 'confidence_threshold': 'Confidence threshold (0.0-1.0):',
                 'verbose_logs': 'Verbose logs',
+                'batch_size': 'Batch size (images per model pass):',
+                'watch_mode': 'Watch folder (classify new images as they arrive)',
+                'stop_watching': '⏹ Stop watching',
+                'watching_folder': 'Watching folder... classified: {count}',
                 'toggle_theme': '🌓 Toggle theme',
                 'toggle_language': '🌐 PL',
                 'start_classification': '🚀 Start AI classification',
@@ -3,20 +3,38 @@ import os
 from datetime import datetime
 
 
-def setup_logging():
-    """Konfiguruje system logowania"""
+class _ConsoleFilter(logging.Filter):
+    """Przepuszcza na konsolę komunikaty od poziomu konsoli oraz INFO z wybranych loggerów"""
+
+    def __init__(self, level, info_loggers):
+        super().__init__()
+        self.level = level
+        self.info_loggers = tuple(info_loggers)
+
+    def filter(self, record):
+        if record.levelno >= self.level:
+            return True
+        return record.levelno >= logging.INFO and record.name.startswith(self.info_loggers)
+
+
+def setup_logging(console_level=logging.INFO, console_info_loggers=()):
+    """Konfiguruje system logowania; console_info_loggers pokazują INFO na konsoli mimo wyższego poziomu"""
     # Utwórz folder logs jeśli nie istnieje
     if not os.path.exists("logs"):
         os.makedirs("logs")
 
     log_filename = os.path.join("logs", f"screenshot_filter_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
 
+    console_handler = logging.StreamHandler()  # Także do konsoli (stderr)
+    console_handler.setLevel(min(console_level, logging.INFO) if console_info_loggers else console_level)
+    console_handler.addFilter(_ConsoleFilter(console_level, console_info_loggers))
+
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(levelname)s - %(message)s',
         handlers=[
             logging.FileHandler(log_filename, encoding='utf-8'),
-            logging.StreamHandler()  # Także do konsoli
+            console_handler
         ]
     )
 